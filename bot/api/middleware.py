@@ -1,12 +1,18 @@
 """Middleware для API"""
 import asyncio
+import json
 import logging
 import os
 import time
-from collections import defaultdict
-from typing import Dict, Tuple, Set
+from collections import OrderedDict
+from typing import Tuple, Set
 from aiohttp import web
+from bot.utils import metrics
+from bot.utils.shared_state import get_shared_state
 from bot.utils.telegram_auth import validate_telegram_webapp_data
+from bot.utils.db_pool import PoolTimeoutError
+from bot.utils.database import set_db_writer
+from bot.services.user_service import UserService
 
 logger = logging.getLogger(__name__)
 
@@ -26,12 +32,15 @@ if RATE_LIMIT_WHITELIST:
     logger.info(f"Rate limit whitelist: {RATE_LIMIT_WHITELIST}")
 
 
-# Хранилище для rate limiting (в памяти)
-# Формат: {ip: [timestamp, ...]}
-_rate_limit_storage: Dict[str, list] = defaultdict(list)
+# Максимум IP в памяти rate limiter: при переполнении забываются давно не
+# обращавшиеся (их счетчики к этому моменту обычно уже обнулились бы)
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000))
 
-# asyncio.Lock для потокобезопасного доступа к _rate_limit_storage
-_rate_limit_lock = asyncio.Lock()
+_evictions = metrics.counter(
+    'rate_limiter_evictions',
+    'Rate limiter keys forgotten (reason=idle|capacity)'
+)
+_rejections = metrics.counter('rate_limiter_rejections', 'Requests rejected by the rate limiter')
 
 # Веса endpoints для дифференцированного rate limiting
 # Дорогие операции "стоят" больше запросов
@@ -48,21 +57,53 @@ ENDPOINT_COSTS = {
 DEFAULT_COST = 3  # Стоимость по умолчанию
 
 
+class _Window:
+    """Счетчики скользящего окна одного идентификатора"""
+    __slots__ = ('window', 'previous', 'current', 'last_seen')
+
+    def __init__(self, window: int, now: float):
+        self.window = window
+        self.previous = 0
+        self.current = 0
+        self.last_seen = now
+
+
 class RateLimiter:
-    """Rate limiter для ограничения запросов с поддержкой весов endpoints"""
+    """
+    Rate limiter со скользящим окном (sliding window counter) и весами endpoints
+
+    Для каждого идентификатора хранятся суммы стоимости за текущее и
+    предыдущее окно; нагрузка за последние window_seconds оценивается как
+    current + previous * (доля предыдущего окна, попадающая в скользящее).
+    Проверка - O(1) по времени и памяти на идентификатор.
+
+    Блокировки не нужны: is_allowed выполняется в event loop без await между
+    чтением и обновлением счетчиков. Идентификаторы хранятся в OrderedDict в
+    порядке последнего обращения, поэтому простаивающие (дольше двух окон,
+    счетчики которых уже нулевые) снимаются с начала словаря при каждом вызове
+    за амортизированное O(1), а при переполнении max_keys вытесняются самые
+    давние.
+
+    Если общее состояние разделяется между процессами (Redis), счетчики окон
+    хранятся в нем (ключи с TTL в два окна), и лимит общий для всех процессов.
+    При недоступности общего состояния используется локальный счетчик.
+    """
 
-    def __init__(self, max_requests: int = 100, window_seconds: int = 60):
+    def __init__(self, max_requests: int = 100, window_seconds: int = 60, max_keys: int = RATE_LIMIT_MAX_KEYS):
         """
         Args:
             max_requests: Максимум "единиц стоимости" в окне
             window_seconds: Размер окна в секундах
+            max_keys: Максимум идентификаторов в памяти
         """
         self.max_requests = max_requests
         self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self._windows: 'OrderedDict[str, _Window]' = OrderedDict()
 
     async def is_allowed(self, identifier: str, cost: int = 1) -> Tuple[bool, int]:
         """
-        Проверка, разрешен ли запрос (потокобезопасная версия)
+        Проверка, разрешен ли запрос
 
         Args:
             identifier: Идентификатор (обычно IP адрес)
@@ -71,32 +112,86 @@ class RateLimiter:
         Returns:
             Tuple[bool, int]: (разрешен ли запрос, оставшееся количество единиц)
         """
-        async with _rate_limit_lock:
-            now = time.time()
-            window_start = now - self.window_seconds
-
-            # Очищаем старые записи
-            _rate_limit_storage[identifier] = [
-                (ts, c) for ts, c in _rate_limit_storage[identifier]
-                if ts > window_start
-            ]
-
-            # Считаем текущую стоимость
-            current_cost = sum(c for _, c in _rate_limit_storage[identifier])
-
-            if current_cost + cost > self.max_requests:
-                return False, 0
-
-            # Добавляем текущий запрос с его стоимостью
-            _rate_limit_storage[identifier].append((now, cost))
-
-            remaining = self.max_requests - current_cost - cost
-            return True, remaining
+        now = time.time()
+        state = get_shared_state()
+        if state.shared:
+            try:
+                return await self._is_allowed_shared(state, identifier, cost, now)
+            except Exception as e:
+                logger.warning(f"Shared rate limit check failed, using local counters: {e}")
+        return self._is_allowed_local(identifier, cost, now)
+
+    async def _is_allowed_shared(self, state, identifier: str, cost: int, now: float) -> Tuple[bool, int]:
+        """Проверка по счетчикам окон в общем состоянии (два параллельных запроса)"""
+        window = int(now // self.window_seconds)
+        ttl = 2 * self.window_seconds
+        current, previous = await asyncio.gather(
+            state.incr(f"ratelimit:{identifier}:{window}", cost, ttl),
+            state.get(f"ratelimit:{identifier}:{window - 1}")
+        )
+        elapsed_fraction = (now % self.window_seconds) / self.window_seconds
+        used = int(previous or 0) * (1 - elapsed_fraction) + current - cost
+
+        if used + cost > self.max_requests:
+            # Отклоненный запрос не расходует лимит
+            await state.incr(f"ratelimit:{identifier}:{window}", -cost, ttl)
+            _rejections.inc()
+            return False, 0
+        return True, int(self.max_requests - used - cost)
+
+    def _is_allowed_local(self, identifier: str, cost: int, now: float) -> Tuple[bool, int]:
+        """Проверка по счетчикам в памяти процесса"""
+        window = int(now // self.window_seconds)
+        self._evict_idle(now)
+
+        state = self._windows.get(identifier)
+        if state is None:
+            state = self._windows[identifier] = _Window(window, now)
+            if len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+                _evictions.inc(reason='capacity')
+        else:
+            self._windows.move_to_end(identifier)
+            if state.window != window:
+                # Сдвиг окна: текущее становится предыдущим (если они соседние)
+                state.previous = state.current if state.window == window - 1 else 0
+                state.current = 0
+                state.window = window
+        state.last_seen = now
+
+        elapsed_fraction = (now % self.window_seconds) / self.window_seconds
+        used = state.previous * (1 - elapsed_fraction) + state.current
+
+        if used + cost > self.max_requests:
+            _rejections.inc()
+            return False, 0
+
+        state.current += cost
+        return True, int(self.max_requests - used - cost)
+
+    def _evict_idle(self, now: float) -> None:
+        """Удаление идентификаторов без запросов дольше двух окон"""
+        idle_before = now - 2 * self.window_seconds
+        while self._windows:
+            state = next(iter(self._windows.values()))
+            if state.last_seen >= idle_before:
+                break
+            self._windows.popitem(last=False)
+            _evictions.inc(reason='idle')
+
+    def __len__(self) -> int:
+        return len(self._windows)
 
 
 # Глобальный rate limiter (увеличен лимит для поддержки весов)
 rate_limiter = RateLimiter(max_requests=200, window_seconds=60)
 
+metrics.gauge(
+    'rate_limiter_keys',
+    'Identifiers tracked by the rate limiter',
+    lambda: {'keys': len(rate_limiter), 'max_keys': rate_limiter.max_keys}
+)
+
 
 @web.middleware
 async def rate_limit_middleware(request: web.Request, handler):
@@ -134,7 +229,7 @@ async def rate_limit_middleware(request: web.Request, handler):
             cost = endpoint_cost
             break
 
-    # Проверяем лимит (async версия с Lock)
+    # Проверяем лимит
     allowed, remaining = await rate_limiter.is_allowed(ip, cost)
 
     if not allowed:
@@ -177,6 +272,18 @@ async def error_handling_middleware(request: web.Request, handler):
         # Пропускаем HTTP исключения (они уже обработаны)
         raise
     
+    except PoolTimeoutError as e:
+        # Пул соединений с БД исчерпан - сервис перегружен, клиент может повторить
+        logger.warning(f"DB pool saturated: {e} | Path: {request.path}")
+        return web.json_response(
+            {
+                'error': 'Service overloaded',
+                'message': 'Server is busy. Please try again shortly.'
+            },
+            status=503,
+            headers={'Retry-After': '5'}
+        )
+    
     except ValueError as e:
         # Ошибки валидации
         logger.warning(f"Validation error: {e} | Path: {request.path}")
@@ -203,6 +310,30 @@ async def error_handling_middleware(request: web.Request, handler):
         )
 
 
+async def _attach_user(request: web.Request, init_data: dict) -> None:
+    """
+    Пользователь запроса для handlers (без отдельного запроса к БД в каждом)
+
+    request['telegram_user'] - данные пользователя Telegram из init data
+    (None, если их нет или они некорректны), request['user'] - снимок
+    пользователя из кэша идентификации (None, если его нет в БД).
+    """
+    request['telegram_user'] = None
+    request['user'] = None
+    try:
+        telegram_user = json.loads(init_data.get('user') or 'null')
+    except json.JSONDecodeError:
+        return
+    if not isinstance(telegram_user, dict) or not telegram_user.get('id'):
+        return
+    request['telegram_user'] = telegram_user
+    # Read-your-writes: после записи чтения этого пользователя идут в primary
+    set_db_writer(telegram_user['id'])
+    request['user'] = await UserService.resolve_telegram_user_async(
+        telegram_user['id'], telegram_user.get('username')
+    )
+
+
 @web.middleware
 async def telegram_auth_middleware(request: web.Request, handler):
     """
@@ -221,27 +352,18 @@ async def telegram_auth_middleware(request: web.Request, handler):
     # Получаем заголовок Authorization
     auth_header = request.headers.get('Authorization', '')
     
-    logger.info(f"Auth header present: {bool(auth_header)}, starts with 'tma ': {auth_header.startswith('tma ')}")
-    
     # Проверяем формат: "tma <initDataRaw>"
     if auth_header.startswith('tma '):
         init_data_raw = auth_header[4:]  # Убираем префикс "tma "
         
-        logger.info(f"Init data raw length: {len(init_data_raw)}")
-        logger.info(f"Init data raw: {init_data_raw[:100]}..." if len(init_data_raw) > 100 else f"Init data raw: {init_data_raw}")
-        
-        # Валидируем init data
+        # Валидируем init data (повторные запросы сессии - из кэша проверенных)
         is_valid, parsed_data = validate_telegram_webapp_data(init_data_raw)
         
-        logger.info(f"Validation result: is_valid={is_valid}, has_parsed_data={parsed_data is not None}")
-        if parsed_data:
-            logger.info(f"Parsed data keys: {list(parsed_data.keys())}")
-        
         if is_valid and parsed_data:
             # Сохраняем валидированные данные в request для использования в handlers
             request['init_data'] = parsed_data
             request['init_data_raw'] = init_data_raw
-            logger.info(f"Init data validated for user: {parsed_data.get('user', 'unknown')}")
+            await _attach_user(request, parsed_data)
         else:
             # Данные невалидны - отклоняем запрос
             logger.warning(f"Invalid init data from IP: {request.remote}")
@@ -1,67 +1,44 @@
 """API маршруты"""
+import hmac
 import json
 import logging
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
 from datetime import datetime, date, timedelta
 from aiohttp import web
-from bot.config import is_admin, YANDEX_MAPS_API_KEY, ALLOW_ADMIN_DESKTOP
-from bot.services.user_service import UserService
+from bot.config import (
+    is_admin, YANDEX_MAPS_API_KEY, ALLOW_ADMIN_DESKTOP, METRICS_TOKEN,
+    RESPONSE_CACHE_MAX_SIZE, RESPONSE_CACHE_STALE_TTL
+)
 from bot.services.record_service import RecordService
 from bot.services.report_generator import generate_discipline_report
+from bot.services.employees_board import get_board, refresh_board_entry
+from bot.services.today_board import today_board, record_read
 from bot.models.record import Record
 from bot.models.user import User
+from bot.models.daily_attendance import DailyAttendance
 from bot.utils.timezone import today_msk
+from bot.utils.geo import coordinates_label
+from bot.utils.metrics import get_metrics_snapshot
+from bot.utils.response_cache import ResponseCache, day_tag
 
 logger = logging.getLogger(__name__)
 
-# ThreadPoolExecutor для блокирующих операций (PDF, синхронные DB вызовы)
+# ThreadPoolExecutor для блокирующих операций (генерация PDF)
+# Синхронные DB вызовы выполняются через bot.utils.database.run_db
 # max_workers=10 - достаточно для 50-200 пользователей
 _executor = ThreadPoolExecutor(max_workers=10)
 
-# TTL кэш для get_employees_status
-# Формат: {date_str: (data, timestamp)}
-_employees_cache: dict = {}
-_CACHE_TTL = 60  # 60 секунд - данные меняются при создании записей
-
-
-def _get_cached_employees(target_date) -> list:
-    """Получение данных сотрудников с кэшированием"""
-    import time
-    cache_key = target_date.isoformat()
-
-    # Проверяем кэш
-    if cache_key in _employees_cache:
-        data, timestamp = _employees_cache[cache_key]
-        if time.time() - timestamp < _CACHE_TTL:
-            logger.debug(f"Cache hit for employees status on {cache_key}")
-            return data
-
-    # Запрос к БД
-    logger.debug(f"Cache miss for employees status on {cache_key}, fetching from DB")
-    data = RecordService.get_records_by_date(target_date)
-
-    # Сохраняем в кэш
-    _employees_cache[cache_key] = (data, time.time())
-
-    # Очищаем старые записи кэша (держим только последние 7 дней)
-    if len(_employees_cache) > 7:
-        oldest_key = min(_employees_cache.keys(), key=lambda k: _employees_cache[k][1])
-        del _employees_cache[oldest_key]
-
-    return data
-
-
-def invalidate_employees_cache(target_date=None):
-    """Инвалидация кэша (вызывается при создании записи)"""
-    if target_date:
-        cache_key = target_date.isoformat()
-        if cache_key in _employees_cache:
-            del _employees_cache[cache_key]
-            logger.debug(f"Cache invalidated for {cache_key}")
-    else:
-        _employees_cache.clear()
-        logger.debug("All employees cache invalidated")
+# Кэши ответов: изменения данных инвалидируют их по тегам
+# ('day:<дата>', 'record:<id>', 'user:<id>', 'users' - см. bot.utils.response_cache).
+# Дашборд сотрудников кэшируется в bot.services.employees_board
+_record_details_cache = ResponseCache(
+    'record_details', ttl=300, stale_ttl=RESPONSE_CACHE_STALE_TTL, max_size=RESPONSE_CACHE_MAX_SIZE
+)
+_employee_records_cache = ResponseCache(
+    'employee_records', ttl=60, stale_ttl=RESPONSE_CACHE_STALE_TTL, max_size=RESPONSE_CACHE_MAX_SIZE
+)
 
 
 async def auth_user(request: web.Request) -> web.Response:
@@ -74,60 +51,27 @@ async def auth_user(request: web.Request) -> web.Response:
     Returns:
         JSON ответ с данными пользователя
     """
-    # Init data уже валидированы в middleware и доступны в request
-    init_data = request.get('init_data')
-    
-    if not init_data:
-        return web.json_response(
-            {'error': 'Неверные данные аутентификации'},
-            status=401
-        )
-    
-    # Извлекаем user data из валидированных init_data
-    user_data_str = init_data.get('user')
-    if not user_data_str:
+    # Init data валидированы, а пользователь определен в middleware
+    telegram_user = request.get('telegram_user')
+    if not telegram_user:
         return web.json_response(
             {'error': 'Отсутствуют данные пользователя'},
             status=401
         )
     
-    # Парсим JSON с данными пользователя
-    try:
-        user_data = json.loads(user_data_str)
-        telegram_id = user_data.get('id')
-        username = user_data.get('username')  # Username из Telegram
-        photo_url = user_data.get('photo_url')  # URL аватарки из Telegram
-    except json.JSONDecodeError:
-        logger.error(f"Failed to parse user data from init_data: {user_data_str}")
-        return web.json_response(
-            {'error': 'Некорректные данные пользователя'},
-            status=401
-        )
-    
-    if not telegram_id:
-        raise ValueError('telegram_id обязателен')
-    
-    # Получаем пользователя из БД сначала по telegram_id
-    user = UserService.get_user_by_telegram_id(telegram_id)
-    
-    # Если не найден по telegram_id, пробуем найти по username
-    if not user and username:
-        telegram_handle = f"@{username}" if not username.startswith('@') else username
-        user = UserService.get_user_by_telegram_handle(telegram_handle)
-        
-        # Если найден по handle, обновляем telegram_id
-        if user and not user.telegram_id:
-            user.telegram_id = telegram_id
-            user = user.update()
-            logger.info(f"Updated telegram_id for user {user.name} (handle: {telegram_handle})")
+    telegram_id = telegram_user['id']
+    photo_url = telegram_user.get('photo_url')  # URL аватарки из Telegram
+    user = request.get('user')
     
     # Обновляем URL аватарки, если пользователь существует и есть photo_url
-    if user and photo_url:
-        # Проверяем, изменился ли URL аватарки
-        if user.avatar_url != photo_url:
-            user.avatar_url = photo_url
-            user = user.update()
-            logger.info(f"Updated avatar_url for user {telegram_id}")
+    if user and photo_url and user.avatar_url != photo_url:
+        # Снимок из кэша неизменяем - обновляем модель (кэш идентификации
+        # инвалидирует User.update); аватарка есть только в строке дашборда
+        updated = User.from_dict(asdict(user))
+        updated.avatar_url = photo_url
+        user = await updated.update_async()
+        await refresh_board_entry(user.id, today_msk())
+        logger.info(f"Updated avatar_url for user {telegram_id}")
     
     # Проверяем, является ли пользователь администратором
     is_user_admin = is_admin(telegram_id)
@@ -174,8 +118,15 @@ async def get_employees_status(request: web.Request) -> web.Response:
     if target_date < one_month_ago:
         raise ValueError('Дата не может быть старше 1 месяца')
     
+    # Сегодняшний дашборд отдается из in-memory доски (готовый JSON)
+    if target_date == today_msk():
+        ready = today_board.is_ready(target_date)
+        record_read('employees', ready)
+        if ready:
+            return web.Response(body=today_board.employees_body(), content_type='application/json')
+    
     # Получаем записи за дату (с кэшированием)
-    records_data = _get_cached_employees(target_date)
+    records_data = await get_board(target_date)
 
     return web.json_response({
         'date': target_date.isoformat(),
@@ -198,7 +149,11 @@ async def get_record_details(request: web.Request) -> web.Response:
     except (ValueError, TypeError):
         raise ValueError('Неверный ID записи')
     
-    record_details = RecordService.get_record_details(record_id)
+    record_details = await _record_details_cache.get_or_load(
+        record_id,
+        lambda: RecordService.get_record_details(record_id),
+        tags=(f"record:{record_id}", 'users')
+    )
     
     if not record_details:
         return web.json_response(
@@ -231,7 +186,7 @@ async def get_address(request: web.Request) -> web.Response:
     
     if not address_data:
         return web.json_response({
-            'formatted_address': f'Координаты: {latitude:.6f}, {longitude:.6f}'
+            'formatted_address': coordinates_label(latitude, longitude)
         })
     
     return web.json_response(address_data)
@@ -271,9 +226,6 @@ async def create_record(request: web.Request) -> web.Response:
         comment=comment
     )
 
-    # Инвалидируем кэш для сегодняшней даты
-    invalidate_employees_cache(today_msk())
-
     logger.info(f"Record created: user_id={user_id}, type={record_type}, id={record.id}")
     
     return web.json_response({
@@ -317,32 +269,13 @@ async def upload_photo(request: web.Request) -> web.Response:
             status=400
         )
     
-    # Получаем пользователя из init_data
-    init_data = request.get('init_data')
-    if not init_data:
-        return web.json_response(
-            {'error': 'Неверные данные аутентификации'},
-            status=401
-        )
-    
-    user_data_str = init_data.get('user')
-    if not user_data_str:
+    # Пользователь определен в middleware
+    if not request.get('telegram_user'):
         return web.json_response(
             {'error': 'Отсутствуют данные пользователя'},
             status=401
         )
-    
-    try:
-        user_data = json.loads(user_data_str)
-        telegram_id = user_data.get('id')
-    except json.JSONDecodeError:
-        return web.json_response(
-            {'error': 'Некорректные данные пользователя'},
-            status=401
-        )
-    
-    # Получаем пользователя из БД
-    user = UserService.get_user_by_telegram_id(telegram_id)
+    user = request.get('user')
     if not user:
         return web.json_response(
             {'error': 'Пользователь не найден'},
@@ -403,9 +336,15 @@ async def get_current_locations(request: web.Request) -> web.Response:
     Returns:
         JSON ответ со списком сотрудников и их текущими местоположениями
     """
-    # Получаем сегодняшние записи всех сотрудников (MSK)
+    # Из in-memory доски текущего дня, пока она не загружена - из кэша дашборда
+    ready = today_board.is_ready()
+    record_read('current_locations', ready)
+    if ready:
+        return web.Response(body=today_board.current_locations_body(), content_type='application/json')
+    
+    # Получаем сегодняшние записи всех сотрудников (MSK) - тот же кэш, что у дашборда
     today = today_msk()
-    employees_data = RecordService.get_records_by_date(today)
+    employees_data = await get_board(today)
     
     logger.info(f"Total employees with records today: {len(employees_data)}")
     
@@ -452,34 +391,13 @@ async def get_user_today_status(request: web.Request) -> web.Response:
             "departure_record": dict | None  # детали записи об уходе
         }
     """
-    # Init data уже валидированы в middleware
-    init_data = request.get('init_data')
-    
-    if not init_data:
-        return web.json_response(
-            {'error': 'Неверные данные аутентификации'},
-            status=401
-        )
-    
-    # Извлекаем user data
-    user_data_str = init_data.get('user')
-    if not user_data_str:
+    # Пользователь определен в middleware
+    if not request.get('telegram_user'):
         return web.json_response(
             {'error': 'Отсутствуют данные пользователя'},
             status=401
         )
-    
-    try:
-        user_data = json.loads(user_data_str)
-        telegram_id = user_data.get('id')
-    except json.JSONDecodeError:
-        return web.json_response(
-            {'error': 'Некорректные данные пользователя'},
-            status=401
-        )
-    
-    # Получаем пользователя из БД
-    user = UserService.get_user_by_telegram_id(telegram_id)
+    user = request.get('user')
     
     if not user:
         return web.json_response(
@@ -487,14 +405,15 @@ async def get_user_today_status(request: web.Request) -> web.Response:
             status=404
         )
     
-    # Получаем записи за сегодня с адресами (MSK)
-    today = today_msk()
-    records_today = Record.get_by_user_and_date_with_addresses(user.id, today)
+    # Статус из in-memory доски текущего дня (админов на доске нет - для них запрос к БД)
+    response_data = today_board.user_status(user.id) if today_board.is_ready() else None
+    record_read('today_status', response_data is not None)
+    if response_data is not None:
+        return web.json_response(response_data)
     
-    # Временная отладка
-    logger.info(f"User {user.id} records for {today}: {len(records_today)} records found")
-    for i, record_data in enumerate(records_today):
-        logger.info(f"Record {i}: type={record_data['record']['record_type']}, time={record_data['record']['timestamp']}, address={record_data['address']}")
+    # Сводка пользователя за сегодня (MSK): одна строка daily_attendance по первичному ключу
+    today = today_msk()
+    day_status = await DailyAttendance.get_user_day_async(user.id, today)
     
     response_data = {
         'has_arrival': False,
@@ -504,61 +423,20 @@ async def get_user_today_status(request: web.Request) -> web.Response:
         'departure_record': None
     }
     
-    if records_today:
-        # Сортируем по времени (самая последняя первая)
-        records_today.sort(key=lambda x: x['record']['timestamp'], reverse=True)
-        
-        # Устанавливаем тип последней записи
-        response_data['last_record_type'] = records_today[0]['record']['record_type']
+    if day_status:
+        response_data['last_record_type'] = day_status['last_record_type']
         
-        # Ищем записи о приходе и уходе
-        for record_data in records_today:
-            record = record_data['record']
-            address = record_data['address']
-            
-            if record['record_type'] == Record.ARRIVAL and not response_data['has_arrival']:
-                response_data['has_arrival'] = True
-                # Извлекаем время из ISO формата (например, "2025-01-15T09:30:00" -> "09:30")
-                time_str = None
-                if record['timestamp']:
-                    try:
-                        # Если timestamp в формате ISO, извлекаем время
-                        if 'T' in record['timestamp']:
-                            time_str = record['timestamp'].split('T')[1][:5]  # HH:MM
-                        else:
-                            time_str = record['timestamp'][:5]  # Fallback
-                        logger.info(f"Extracted time for arrival: {time_str} from {record['timestamp']}")
-                    except Exception as e:
-                        logger.error(f"Error extracting time from {record['timestamp']}: {e}")
-                        time_str = None
-                
-                response_data['arrival_record'] = {
-                    'time': time_str,
-                    'address': address if address else None
-                }
-            elif record['record_type'] == Record.DEPARTURE and not response_data['has_departure']:
-                response_data['has_departure'] = True
-                # Извлекаем время из ISO формата (например, "2025-01-15T09:30:00" -> "09:30")
-                time_str = None
-                if record['timestamp']:
-                    try:
-                        # Если timestamp в формате ISO, извлекаем время
-                        if 'T' in record['timestamp']:
-                            time_str = record['timestamp'].split('T')[1][:5]  # HH:MM
-                        else:
-                            time_str = record['timestamp'][:5]  # Fallback
-                        logger.info(f"Extracted time for departure: {time_str} from {record['timestamp']}")
-                    except Exception as e:
-                        logger.error(f"Error extracting time from {record['timestamp']}: {e}")
-                        time_str = None
-                
-                response_data['departure_record'] = {
-                    'time': time_str,
-                    'address': address if address else None
-                }
-    
-    # Временная отладка
-    logger.info(f"Final response for user {user.id}: {response_data}")
+        for record_type in (Record.ARRIVAL, Record.DEPARTURE):
+            day_record = day_status[record_type]
+            if not day_record:
+                continue
+            response_data[f'has_{record_type}'] = True
+            response_data[f'{record_type}_record'] = {
+                # Время в формате HH:MM
+                'time': day_record['timestamp'].strftime('%H:%M') if day_record['timestamp'] else None,
+                'address': day_record['address']
+            }
+    
     return web.json_response(response_data)
 
 
@@ -603,7 +481,7 @@ async def get_employee_records(request: web.Request) -> web.Response:
         )
     
     # Получаем пользователя
-    user = User.get_by_id(user_id)
+    user = await User.get_by_id_async(user_id)
     if not user:
         return web.json_response(
             {'error': 'Пользователь не найден'},
@@ -611,7 +489,11 @@ async def get_employee_records(request: web.Request) -> web.Response:
         )
     
     # Получаем записи за дату
-    records_data = RecordService.get_user_records_by_date(user_id, target_date)
+    records_data = await _employee_records_cache.get_or_load(
+        (user_id, target_date),
+        lambda: RecordService.get_user_records_by_date(user_id, target_date),
+        tags=(day_tag(target_date), f"user:{user_id}")
+    )
     
     return web.json_response({
         'date': target_date.isoformat(),
@@ -751,13 +633,40 @@ async def load_test_db(request: web.Request) -> web.Response:
         return web.json_response({'error': 'Load testing disabled'}, status=403)
 
     # Реальный запрос к БД - получаем всех пользователей
-    users = User.get_all()
+    users = await User.get_all_async()
     return web.json_response({
         'users_count': len(users),
         'timestamp': datetime.now().isoformat()
     })
 
 
+async def get_metrics(request: web.Request) -> web.Response:
+    """
+    Метрики процесса (пул БД, запросы, кэши) для мониторинга
+
+    Доступ по заголовку Authorization: Bearer <METRICS_TOKEN>.
+    Если METRICS_TOKEN не задан, endpoint отключен.
+
+    Args:
+        request: HTTP запрос
+
+    Returns:
+        JSON ответ со снимком метрик
+    """
+    if not METRICS_TOKEN:
+        return web.json_response({'error': 'Metrics disabled'}, status=404)
+
+    # Сравнение за постоянное время (bytes: заголовок может содержать не-ASCII)
+    authorization = request.headers.get('Authorization', '').encode()
+    if not hmac.compare_digest(authorization, f'Bearer {METRICS_TOKEN}'.encode()):
+        return web.json_response({'error': 'Authorization required'}, status=401)
+
+    return web.json_response({
+        'timestamp': datetime.now().isoformat(),
+        'metrics': get_metrics_snapshot()
+    })
+
+
 def setup_routes(app: web.Application):
     """
     Настройка маршрутов API
@@ -776,6 +685,8 @@ def setup_routes(app: web.Application):
     app.router.add_get('/api/current-locations', get_current_locations)
     app.router.add_get('/api/user/today-status', get_user_today_status)
     app.router.add_get('/api/reports/discipline', generate_report)
+    # Метрики для мониторинга (вне /api/, без Telegram аутентификации)
+    app.router.add_get('/metrics', get_metrics)
     # Load testing endpoint (удалить после теста!)
     app.router.add_get('/api/load-test-db', load_test_db)
 
@@ -8,6 +8,8 @@ load_dotenv()
 # Telegram Bot Configuration
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_ADMIN_IDS = [int(id.strip()) for id in os.getenv('TELEGRAM_ADMIN_IDS', '').split(',') if id.strip()]
+# Сколько проверенных init data Mini App помнить (повторная проверка без HMAC)
+TELEGRAM_AUTH_CACHE_SIZE = int(os.getenv('TELEGRAM_AUTH_CACHE_SIZE', 10000))
 
 # Webhook Configuration
 WEBHOOK_URL = os.getenv('WEBHOOK_URL')
@@ -22,9 +24,97 @@ DB_USER = os.getenv('DB_USER', 'postgres')
 DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_SCHEMA = os.getenv('DB_SCHEMA', 'public')
 
+# Database pool
+# Максимальное время ожидания свободного соединения из пула (секунды)
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', 10))
+# Интервал фоновой проверки простаивающих соединений пула (секунды)
+DB_HEALTH_CHECK_INTERVAL = int(os.getenv('DB_HEALTH_CHECK_INTERVAL', 30))
+
+# Slow query log: запросы дольше порога (мс) логируются, опционально с EXPLAIN
+DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', 200))
+DB_SLOW_QUERY_EXPLAIN = os.getenv('DB_SLOW_QUERY_EXPLAIN', 'false').lower() == 'true'
+
+# Месячные партиции таблицы records
+# Сколько месяцев вперед держать созданными партиции
+RECORDS_PARTITIONS_AHEAD = int(os.getenv('RECORDS_PARTITIONS_AHEAD', 3))
+# Хранение: партиции старше N месяцев отсоединяются (0 - хранить все)
+RECORDS_RETENTION_MONTHS = int(os.getenv('RECORDS_RETENTION_MONTHS', 0))
+# Удалять отсоединенные партиции (иначе остаются отдельными таблицами)
+RECORDS_RETENTION_DROP = os.getenv('RECORDS_RETENTION_DROP', 'false').lower() == 'true'
+# Интервал фонового обслуживания партиций (секунды)
+PARTITION_MAINTENANCE_INTERVAL = int(os.getenv('PARTITION_MAINTENANCE_INTERVAL', 6 * 3600))
+
+# Metrics endpoint (/metrics). Без токена endpoint отключен
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
 # Yandex Maps API
 YANDEX_MAPS_API_KEY = os.getenv('YANDEX_MAPS_API_KEY')
 
+# In-memory индекс адресов: точка в пределах радиуса (метры) считается
+# известным адресом без запроса к БД и геокодеру
+ADDRESS_INDEX_RADIUS_M = float(os.getenv('ADDRESS_INDEX_RADIUS_M', 15))
+ADDRESS_INDEX_MAX_ENTRIES = int(os.getenv('ADDRESS_INDEX_MAX_ENTRIES', 10000))
+
+# Общая HTTP-сессия для внешних API (геокодер)
+HTTP_POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', 20))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', 10))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', 30))
+HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', 300))
+# Таймауты (секунды): установка соединения, ожидание данных ответа и весь запрос
+# целиком (включая ожидание свободного соединения и медленную отдачу тела ответа)
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 5))
+HTTP_TOTAL_TIMEOUT = float(os.getenv('HTTP_TOTAL_TIMEOUT', 10))
+
+# Кэш геокодирования (в памяти + таблица geocode_cache): время жизни (секунды) и размер
+GEOCODE_CACHE_TTL = float(os.getenv('GEOCODE_CACHE_TTL', 7 * 86400))
+GEOCODE_CACHE_MAX_SIZE = int(os.getenv('GEOCODE_CACHE_MAX_SIZE', 5000))
+
+# Геокодер: кэш неудачных ответов и circuit breaker
+# Сколько секунд помнить неудачный/пустой ответ для координат
+GEOCODE_NEGATIVE_TTL = float(os.getenv('GEOCODE_NEGATIVE_TTL', 60))
+# Неудач подряд до размыкания, время размыкания (секунды), порог медленного ответа (мс)
+GEOCODER_BREAKER_FAILURES = int(os.getenv('GEOCODER_BREAKER_FAILURES', 5))
+GEOCODER_BREAKER_RESET_SECONDS = float(os.getenv('GEOCODER_BREAKER_RESET_SECONDS', 30))
+GEOCODER_SLOW_CALL_MS = float(os.getenv('GEOCODER_SLOW_CALL_MS', 2000))
+
+# Кэш ответов API (дашборд, записи): размер и сколько секунд после истечения
+# отдавать прежний ответ, обновляя его в фоне
+RESPONSE_CACHE_MAX_SIZE = int(os.getenv('RESPONSE_CACHE_MAX_SIZE', 1000))
+RESPONSE_CACHE_STALE_TTL = float(os.getenv('RESPONSE_CACHE_STALE_TTL', 30))
+# Дашборд сотрудников обновляется точечно при записи; полная пересборка
+# (в фоне) - не чаще раза в EMPLOYEES_BOARD_TTL секунд
+EMPLOYEES_BOARD_TTL = float(os.getenv('EMPLOYEES_BOARD_TTL', 3600))
+
+# Кэш идентификации (telegram_id -> пользователь) для запросов Mini App и бота:
+# время жизни снимка, время жизни отметки о неизвестном id (секунды) и размер
+IDENTITY_CACHE_TTL = float(os.getenv('IDENTITY_CACHE_TTL', 300))
+IDENTITY_CACHE_NEGATIVE_TTL = float(os.getenv('IDENTITY_CACHE_NEGATIVE_TTL', 30))
+IDENTITY_CACHE_MAX_SIZE = int(os.getenv('IDENTITY_CACHE_MAX_SIZE', 5000))
+
+# Снимок горячих кэшей на диске: восстанавливается при запуске, чтобы первые
+# минуты после деплоя не шли мимо кэша. Пустой путь отключает снимки
+CACHE_SNAPSHOT_PATH = os.getenv('CACHE_SNAPSHOT_PATH', 'var/cache_snapshot.bin')
+# Интервал периодического сохранения и максимальный возраст снимка (секунды)
+CACHE_SNAPSHOT_INTERVAL = float(os.getenv('CACHE_SNAPSHOT_INTERVAL', 300))
+CACHE_SNAPSHOT_MAX_AGE = float(os.getenv('CACHE_SNAPSHOT_MAX_AGE', 3600))
+
+# Общее состояние нескольких процессов приложения (Redis): rate limiting,
+# состояние диалогов бота и рассылка инвалидаций кэшей. Без URL состояние
+# хранится в памяти процесса - допустим только один процесс
+SHARED_STATE_URL = os.getenv('SHARED_STATE_URL', '')
+# Префикс ключей и каналов (несколько окружений на одном сервере Redis)
+SHARED_STATE_PREFIX = os.getenv('SHARED_STATE_PREFIX', 'istra-geo:')
+
+# Фоновое геокодирование отметок (очередь geocode_queue)
+# Интервал опроса очереди (секунды) и размер пачки
+GEOCODE_QUEUE_INTERVAL = float(os.getenv('GEOCODE_QUEUE_INTERVAL', 5))
+GEOCODE_QUEUE_BATCH_SIZE = int(os.getenv('GEOCODE_QUEUE_BATCH_SIZE', 20))
+# Попыток до отказа, первая задержка повтора и ее предел (секунды, экспоненциальный рост)
+GEOCODE_QUEUE_MAX_ATTEMPTS = int(os.getenv('GEOCODE_QUEUE_MAX_ATTEMPTS', 10))
+GEOCODE_QUEUE_RETRY_BASE = float(os.getenv('GEOCODE_QUEUE_RETRY_BASE', 30))
+GEOCODE_QUEUE_RETRY_MAX = float(os.getenv('GEOCODE_QUEUE_RETRY_MAX', 3600))
+
 # Mini App Configuration
 MINI_APP_URL = os.getenv('MINI_APP_URL')
 
@@ -56,6 +146,20 @@ encoded_password = quote_plus(DB_PASSWORD) if DB_PASSWORD else ''
 DATABASE_URL = f"postgresql://{DB_USER}:{encoded_password}@{DB_HOST}:{DB_PORT}/{DB_NAME}?sslmode=prefer&connect_timeout=10&keepalives=1&keepalives_idle=30&keepalives_interval=10&keepalives_count=5"
 
 
+# Read-only реплика (опционально): дашборды и отчеты читают с нее
+DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST')
+DB_REPLICA_PORT = int(os.getenv('DB_REPLICA_PORT', DB_PORT))
+# Сколько секунд после записи пользователя его чтения идут в primary (read-your-writes)
+DB_REPLICA_RYW_SECONDS = float(os.getenv('DB_REPLICA_RYW_SECONDS', 5))
+# Ожидание свободного соединения реплики, секунды: при занятом пуле чтение
+# сразу уходит в primary, а не ждет DB_POOL_ACQUIRE_TIMEOUT
+DB_REPLICA_ACQUIRE_TIMEOUT = float(os.getenv('DB_REPLICA_ACQUIRE_TIMEOUT', 0.05))
+DATABASE_REPLICA_URL = (
+    f"postgresql://{DB_USER}:{encoded_password}@{DB_REPLICA_HOST}:{DB_REPLICA_PORT}/{DB_NAME}?sslmode=prefer&connect_timeout=10&keepalives=1&keepalives_idle=30&keepalives_interval=10&keepalives_count=5"
+    if DB_REPLICA_HOST else None
+)
+
+
 def is_admin(user_id: int) -> bool:
     """Проверка, является ли пользователь администратором"""
     return user_id in TELEGRAM_ADMIN_IDS
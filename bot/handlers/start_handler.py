@@ -20,20 +20,14 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not user:
         return
     
+    # Пользователь из кэша идентификации: по telegram_id, затем по username
+    # (найденному по handle записывается telegram_id)
+    db_user = await UserService.resolve_telegram_user_async(user.id, user.username)
+    
     # Проверяем, является ли пользователь администратором
+    # (запись администратора могла быть загружена через Excel - telegram_id
+    # записывается, чтобы он не попадал в отчеты)
     if is_admin(user.id):
-        # Проверяем, есть ли запись администратора в БД (мог быть загружен через Excel)
-        # Если есть - обновляем telegram_id, чтобы он не попадал в отчеты
-        db_user = UserService.get_user_by_telegram_id(user.id)
-        
-        if not db_user and user.username:
-            db_user = UserService.get_user_by_telegram_handle(user.username)
-            
-            if db_user and not db_user.telegram_id:
-                print(f"DEBUG: Обновляем telegram_id для администратора {db_user.name}")
-                db_user.telegram_id = user.id
-                db_user.update()
-        
         message = (
             f"Добро пожаловать, {user.first_name}! 👋\n\n"
             "🛡️Вы вошли как администратор\n\n"
@@ -44,21 +38,6 @@ async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Отправляем сообщение с inline клавиатурой
         await update.message.reply_text(message, reply_markup=get_admin_keyboard())
     else:
-        # Проверяем, существует ли пользователь в базе сначала по telegram_id
-        db_user = UserService.get_user_by_telegram_id(user.id)
-        
-        # Если не найден по telegram_id, пробуем найти по username
-        if not db_user and user.username:
-            print(f"DEBUG: Ищем пользователя по username: {user.username}")
-            db_user = UserService.get_user_by_telegram_handle(user.username)
-            print(f"DEBUG: Найден пользователь: {db_user}")
-            
-            # Если найден по handle, обновляем telegram_id
-            if db_user and not db_user.telegram_id:
-                print(f"DEBUG: Обновляем telegram_id для пользователя {db_user.name}")
-                db_user.telegram_id = user.id
-                db_user.update()
-        
         if not db_user:
             message = (
                 f"Привет, {user.first_name}! 👋\n\n"
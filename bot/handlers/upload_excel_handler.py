@@ -7,6 +7,8 @@ from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import ContextTypes
 from bot.config import is_admin
 from bot.services.user_service import UserService
+from bot.utils.response_cache import invalidate_tags
+from bot.utils.shared_state import get_shared_state
 
 # Executor для блокирующих операций с Excel
 _excel_executor = ThreadPoolExecutor(max_workers=3)
@@ -16,6 +18,28 @@ _excel_executor = ThreadPoolExecutor(max_workers=3)
 WAITING_FOR_FILE = 'waiting_for_excel'
 WAITING_FOR_TEMPLATE = 'waiting_for_template'
 
+# Сколько секунд ждать файл после нажатия кнопки
+_WAITING_TTL = 3600
+
+
+async def _set_waiting_for_file(user_id: int, waiting: bool) -> None:
+    """
+    Состояние ожидания файла от администратора
+
+    Хранится в общем состоянии, а не в context.user_data: следующее сообщение
+    администратора может обработать другой процесс приложения.
+    """
+    key = f"bot:{WAITING_FOR_FILE}:{user_id}"
+    if waiting:
+        await get_shared_state().set(key, b'1', ttl=_WAITING_TTL)
+    else:
+        await get_shared_state().delete(key)
+
+
+async def _is_waiting_for_file(user_id: int) -> bool:
+    """Ожидается ли файл от администратора"""
+    return await get_shared_state().get(f"bot:{WAITING_FOR_FILE}:{user_id}") is not None
+
 
 async def upload_excel_button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
@@ -32,7 +56,7 @@ async def upload_excel_button_handler(update: Update, context: ContextTypes.DEFA
         return
     
     # Устанавливаем состояние ожидания файла
-    context.user_data[WAITING_FOR_FILE] = True
+    await _set_waiting_for_file(user.id, True)
     
     message = (
         "📤 Загрузка сотрудников\n\n"
@@ -62,7 +86,7 @@ async def excel_file_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
     
     # Проверяем, ожидаем ли мы файл
-    if not context.user_data.get(WAITING_FOR_FILE):
+    if not await _is_waiting_for_file(user.id):
         return
     
     document = update.message.document
@@ -100,6 +124,10 @@ async def excel_file_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         # Удаляем временный файл
         os.unlink(temp_path)
         
+        # Список сотрудников на дашборде изменился
+        if result.get('added') or result.get('updated'):
+            invalidate_tags('users')
+        
         # Формируем сообщение с результатами
         if result['success']:
             message_parts = ["✅ Обработка завершена!"]
@@ -132,7 +160,7 @@ async def excel_file_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     finally:
         # Сбрасываем состояние
-        context.user_data[WAITING_FOR_FILE] = False
+        await _set_waiting_for_file(user.id, False)
 
 
 async def add_employees_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -183,7 +211,7 @@ async def download_template_handler(update: Update, context: ContextTypes.DEFAUL
         return
     
     # Устанавливаем состояние ожидания файла
-    context.user_data[WAITING_FOR_FILE] = True
+    await _set_waiting_for_file(user.id, True)
     
     message = (
         "📄 Шаблон для загрузки сотрудников\n\n"
@@ -222,8 +250,8 @@ async def cancel_waiting_handler(update: Update, context: ContextTypes.DEFAULT_T
         return
     
     # Если мы ожидаем файл, но получили что-то другое - сбрасываем состояние
-    if context.user_data.get(WAITING_FOR_FILE):
-        context.user_data[WAITING_FOR_FILE] = False
+    if await _is_waiting_for_file(user.id):
+        await _set_waiting_for_file(user.id, False)
         # Возвращаем основную клавиатуру
         from bot.keyboards.admin_keyboard import get_admin_keyboard
         await update.message.reply_text(
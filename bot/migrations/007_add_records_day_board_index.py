@@ -0,0 +1,14 @@
+"""Индекс для выборки записей за день (дашборд сотрудников) - заменен миграцией 008"""
+
+
+def up(cursor):
+    """
+    Ничего не делает: индекс idx_records_day_board заменен покрывающим
+    idx_records_day_covering из миграции 008, которая также удаляет
+    idx_records_day_board, если он уже был создан прежней версией этой миграции.
+    Файл сохранен, чтобы нумерация миграций оставалась непрерывной.
+    """
+
+
+def down(cursor):
+    """Откат миграции (ничего не делает)"""
@@ -0,0 +1,64 @@
+"""Составные и покрывающие индексы для записей под реальные запросы"""
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь для импорта
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from bot.utils.database import qualified_table_name, get_schema
+
+# CREATE/DROP INDEX CONCURRENTLY нельзя выполнять внутри транзакции
+TRANSACTIONAL = False
+
+
+def _drop_invalid_index(cursor, index_name):
+    """
+    Удаление невалидного индекса, оставшегося после прерванного CONCURRENTLY
+
+    IF NOT EXISTS такой индекс не пересоздаст, поэтому его нужно удалить заранее.
+    """
+    cursor.execute("""
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = %s AND NOT i.indisvalid
+    """, (get_schema(), index_name))
+    if cursor.fetchone():
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {qualified_table_name(index_name)};")
+
+
+def _create_index(cursor, index_name, definition):
+    """Создание индекса без блокировки записи в таблицу"""
+    _drop_invalid_index(cursor, index_name)
+    cursor.execute(
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+        f"ON {qualified_table_name('records')} {definition};"
+    )
+
+
+def up(cursor):
+    """
+    Индексы под запросы по диапазону timestamp:
+    - (user_id, record_type, timestamp DESC) - последняя запись пользователя
+      нужного типа (ORDER BY timestamp DESC LIMIT 1)
+    - покрывающий (timestamp, user_id, record_type) INCLUDE (id) - выбор
+      последних записей дня для дашборда через index-only scan
+
+    Удаляется неиспользуемый индекс по выражению DATE(timestamp), а также
+    idx_records_day_board, если он остался от прежней версии миграции 007
+    (покрывающий индекс его заменяет).
+    """
+    _create_index(cursor, 'idx_records_user_type_ts', '(user_id, record_type, timestamp DESC)')
+    _create_index(cursor, 'idx_records_day_covering', '(timestamp, user_id, record_type) INCLUDE (id)')
+
+    cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {qualified_table_name('idx_records_user_date')};")
+    cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {qualified_table_name('idx_records_day_board')};")
+
+
+def down(cursor):
+    """Откат миграции"""
+    _create_index(cursor, 'idx_records_user_date', '(user_id, DATE(timestamp))')
+
+    cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {qualified_table_name('idx_records_day_covering')};")
+    cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {qualified_table_name('idx_records_user_type_ts')};")
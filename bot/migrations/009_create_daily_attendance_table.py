@@ -0,0 +1,105 @@
+"""Создание таблицы дневной сводки посещаемости"""
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь для импорта
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from bot.utils.database import qualified_table_name
+
+
+def up(cursor):
+    """
+    Сводка по пользователю за день (MSK): первый приход, последний уход,
+    тип последней записи и счетчики. Обновляется в транзакции записи
+    (Record.create/update). История заполняется здесь же, в транзакции
+    миграции: чтения переключены на сводку и не должны видеть пустую таблицу.
+    scripts/backfill_daily_attendance.py пересчитывает период повторно
+    (например, записи, созданные предыдущей версией во время выкладки).
+
+    Ссылки на записи хранятся без внешних ключей: записи идентифицируются
+    парой (id, timestamp), время хранится рядом с id.
+    """
+    users_table = qualified_table_name('users')
+    
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {qualified_table_name('daily_attendance')} (
+            user_id INTEGER NOT NULL REFERENCES {users_table}(id) ON DELETE CASCADE,
+            day DATE NOT NULL,
+            arrival_record_id INTEGER,
+            arrival_at TIMESTAMP,
+            arrival_address_id INTEGER,
+            arrival_has_photo BOOLEAN NOT NULL DEFAULT FALSE,
+            departure_record_id INTEGER,
+            departure_at TIMESTAMP,
+            departure_address_id INTEGER,
+            departure_has_photo BOOLEAN NOT NULL DEFAULT FALSE,
+            last_record_type VARCHAR(20),
+            records_count INTEGER NOT NULL DEFAULT 0,
+            photo_count INTEGER NOT NULL DEFAULT 0,
+            comment_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (user_id, day)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_daily_attendance_day
+        ON {qualified_table_name('daily_attendance')}(day);
+    """)
+    
+    # Вся история одним проходом. SQL зафиксирован здесь, а не взят из модели:
+    # последующие изменения модели не должны менять уже выпущенную миграцию
+    cursor.execute(f"""
+        WITH day_records AS (
+            SELECT
+                id, user_id, record_type, timestamp, address_id, photo_url, comment,
+                (timestamp AT TIME ZONE 'UTC' AT TIME ZONE 'Europe/Moscow')::date AS day
+            FROM {qualified_table_name('records')}
+        ),
+        stats AS (
+            SELECT
+                user_id, day,
+                COUNT(*) AS records_count,
+                COUNT(NULLIF(photo_url, '')) AS photo_count,
+                COUNT(NULLIF(comment, '')) AS comment_count
+            FROM day_records
+            GROUP BY user_id, day
+        ),
+        arr AS (
+            SELECT DISTINCT ON (user_id, day) *
+            FROM day_records WHERE record_type = 'arrival'
+            ORDER BY user_id, day, timestamp, id
+        ),
+        dep AS (
+            SELECT DISTINCT ON (user_id, day) *
+            FROM day_records WHERE record_type = 'departure'
+            ORDER BY user_id, day, timestamp DESC, id DESC
+        ),
+        latest AS (
+            SELECT DISTINCT ON (user_id, day) user_id, day, record_type
+            FROM day_records
+            ORDER BY user_id, day, timestamp DESC, id DESC
+        )
+        INSERT INTO {qualified_table_name('daily_attendance')} (
+            user_id, day,
+            arrival_record_id, arrival_at, arrival_address_id, arrival_has_photo,
+            departure_record_id, departure_at, departure_address_id, departure_has_photo,
+            last_record_type, records_count, photo_count, comment_count, updated_at
+        )
+        SELECT
+            s.user_id, s.day,
+            arr.id, arr.timestamp, arr.address_id, COALESCE(arr.photo_url, '') <> '',
+            dep.id, dep.timestamp, dep.address_id, COALESCE(dep.photo_url, '') <> '',
+            latest.record_type, s.records_count, s.photo_count, s.comment_count, NOW()
+        FROM stats s
+        JOIN latest ON latest.user_id = s.user_id AND latest.day = s.day
+        LEFT JOIN arr ON arr.user_id = s.user_id AND arr.day = s.day
+        LEFT JOIN dep ON dep.user_id = s.user_id AND dep.day = s.day
+        ON CONFLICT (user_id, day) DO NOTHING;
+    """)
+
+
+def down(cursor):
+    """Откат миграции"""
+    cursor.execute(f"""
+        DROP TABLE IF EXISTS {qualified_table_name('daily_attendance')} CASCADE;
+    """)
@@ -0,0 +1,218 @@
+"""Перевод таблицы records на месячное партиционирование по timestamp"""
+import re
+import sys
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+# Добавляем корневую директорию в путь для импорта
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from bot.utils.database import qualified_table_name, get_schema
+
+# Долгие шаги (VALIDATE, CREATE INDEX CONCURRENTLY) выполняются без
+# транзакции, чтобы не блокировать запись; переключение - в одной короткой транзакции
+TRANSACTIONAL = False
+
+# Значения и SQL зафиксированы в миграции, а не взяты из bot.utils.partitions и
+# конфигурации: повторный запуск не должен зависеть от текущего кода приложения
+MSK = timezone(timedelta(hours=3))
+# Месячные партиции вперед от текущего месяца при переключении
+PARTITIONS_AHEAD = 3
+
+_BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+# Индексы records: (имя, определение). У прежней таблицы они переименовываются
+# в records_legacy_*, а на партиционированной создаются с прежними именами -
+# при ATTACH совпадающие индексы прежней таблицы подключаются без перестроения
+RECORDS_INDEXES = [
+    ('idx_records_user_id', 'records_legacy_user_id_idx', '(user_id)'),
+    ('idx_records_timestamp', 'records_legacy_timestamp_idx', '(timestamp)'),
+    ('idx_records_user_type_ts', 'records_legacy_user_type_ts_idx', '(user_id, record_type, timestamp DESC)'),
+    ('idx_records_day_covering', 'records_legacy_day_covering_idx', '(timestamp, user_id, record_type) INCLUDE (id)'),
+    ('idx_records_with_photo', 'records_legacy_with_photo_idx', '(photo_url) WHERE photo_url IS NOT NULL'),
+]
+
+
+def _add_months(month, months):
+    """Первое число месяца, отстоящего от month на months месяцев"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _bound(month):
+    """Граница партиции: полночь первого числа месяца по MSK, литерал UTC"""
+    start_msk = datetime(month.year, month.month, 1, tzinfo=MSK)
+    return start_msk.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _current_month():
+    return datetime.now(MSK).date().replace(day=1)
+
+
+def _is_partitioned(cursor):
+    """Является ли records партиционированной таблицей"""
+    cursor.execute("""
+        SELECT c.relkind
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = 'records'
+    """, (get_schema(),))
+    result = cursor.fetchone()
+    return bool(result) and result['relkind'] == 'p'
+
+
+def _create_partition(cursor, month):
+    """Месячная партиция records_YYYY_MM (индексы создаются по родительской таблице)"""
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {qualified_table_name(f'records_{month.year:04d}_{month.month:02d}')}
+        PARTITION OF {qualified_table_name('records')}
+        FOR VALUES FROM ('{_bound(month)}') TO ('{_bound(_add_months(month, 1))}')
+    """)
+
+
+def _range_partitions(cursor):
+    """Имена партиций records с диапазоном значений (без DEFAULT)"""
+    cursor.execute("""
+        SELECT child.relname AS name, pg_get_expr(child.relpartbound, child.oid) AS bound
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = parent.relnamespace
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE n.nspname = %s AND parent.relname = 'records'
+    """, (get_schema(),))
+    return [row['name'] for row in cursor.fetchall() if _BOUND_RE.search(row['bound'])]
+
+
+def _drop_invalid_index(cursor, index_name):
+    """Удаление невалидного индекса, оставшегося после прерванного CONCURRENTLY"""
+    cursor.execute("""
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = %s AND NOT i.indisvalid
+    """, (get_schema(), index_name))
+    if cursor.fetchone():
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {qualified_table_name(index_name)};")
+
+
+def _in_transaction(cursor, statements):
+    """Выполнение шагов в одной транзакции (курсор в режиме autocommit)"""
+    cursor.execute("BEGIN")
+    try:
+        for statement in statements:
+            if callable(statement):
+                statement()
+            else:
+                cursor.execute(statement)
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+
+
+def up(cursor):
+    """
+    Онлайн-конвертация records в партиционированную таблицу:
+    1. CHECK (timestamp < граница) NOT VALID + VALIDATE - без блокировки записи
+    2. Уникальный индекс (id, timestamp) CONCURRENTLY - будущий первичный ключ
+    3. В короткой транзакции: прежняя таблица переименовывается в records_legacy,
+       создается партиционированная records с теми же колонками и индексами,
+       records_legacy подключается как партиция (MINVALUE, граница) без
+       проверки строк (ее доказывает CHECK), создаются месячные партиции дальше
+
+    Граница - начало месяца через один от текущего (MSK), чтобы записи,
+    пришедшие во время миграции, гарантированно проходили CHECK.
+    """
+    if _is_partitioned(cursor):
+        return
+
+    records = qualified_table_name('records')
+    legacy = qualified_table_name('records_legacy')
+    legacy_until = _add_months(_current_month(), 2)
+    bound = _bound(legacy_until)
+
+    # 1. Ограничение диапазона прежней таблицы
+    cursor.execute(f"ALTER TABLE {records} DROP CONSTRAINT IF EXISTS records_legacy_bound;")
+    cursor.execute(f"""
+        ALTER TABLE {records}
+        ADD CONSTRAINT records_legacy_bound CHECK (timestamp < '{bound}') NOT VALID;
+    """)
+    cursor.execute(f"ALTER TABLE {records} VALIDATE CONSTRAINT records_legacy_bound;")
+
+    # 2. Первичный ключ партиционированной таблицы должен включать timestamp
+    _drop_invalid_index(cursor, 'records_legacy_pkey')
+    cursor.execute(
+        f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS records_legacy_pkey ON {records}(id, timestamp);"
+    )
+
+    # 3. Переключение
+    statements = [
+        f"LOCK TABLE {records} IN ACCESS EXCLUSIVE MODE;",
+        f"ALTER TABLE {records} DROP CONSTRAINT records_pkey;",
+        f"ALTER TABLE {records} ADD CONSTRAINT records_legacy_pkey PRIMARY KEY USING INDEX records_legacy_pkey;",
+        f"ALTER TABLE {records} RENAME TO records_legacy;",
+    ]
+    for index_name, legacy_name, _ in RECORDS_INDEXES:
+        statements.append(f"ALTER INDEX IF EXISTS {qualified_table_name(index_name)} RENAME TO {legacy_name};")
+
+    statements += [
+        f"""
+        CREATE TABLE {records} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING COMMENTS)
+        PARTITION BY RANGE (timestamp);
+        """,
+        f"""
+        ALTER TABLE {records}
+        ADD CONSTRAINT records_record_type_check CHECK (record_type IN ('arrival', 'departure')),
+        ADD CONSTRAINT records_pkey PRIMARY KEY (id, timestamp),
+        ADD FOREIGN KEY (user_id) REFERENCES {qualified_table_name('users')}(id) ON DELETE CASCADE,
+        ADD FOREIGN KEY (address_id) REFERENCES {qualified_table_name('addresses')}(id) ON DELETE SET NULL;
+        """,
+    ]
+    for index_name, _, definition in RECORDS_INDEXES:
+        statements.append(f"CREATE INDEX {index_name} ON {records} {definition};")
+
+    statements += [
+        # Последовательность id не должна удаляться вместе с прежней таблицей
+        f"ALTER SEQUENCE {qualified_table_name('records_id_seq')} OWNED BY {records}.id;",
+        f"ALTER TABLE {records} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO ('{bound}');",
+        f"ALTER TABLE {legacy} DROP CONSTRAINT records_legacy_bound;",
+    ]
+    last_month = _add_months(_current_month(), PARTITIONS_AHEAD)
+    month = legacy_until
+    while month <= last_month:
+        statements.append(lambda month=month: _create_partition(cursor, month))
+        month = _add_months(month, 1)
+
+    _in_transaction(cursor, statements)
+
+
+def down(cursor):
+    """
+    Откат миграции: строки месячных партиций переносятся в records_legacy,
+    которая снова становится обычной таблицей records
+    """
+    if not _is_partitioned(cursor):
+        return
+
+    records = qualified_table_name('records')
+    legacy = qualified_table_name('records_legacy')
+    partitions = [name for name in _range_partitions(cursor) if name != 'records_legacy']
+
+    statements = [
+        f"LOCK TABLE {records} IN ACCESS EXCLUSIVE MODE;",
+        f"ALTER TABLE {records} DETACH PARTITION {legacy};",
+    ]
+    for name in partitions:
+        statements.append(f"INSERT INTO {legacy} SELECT * FROM {qualified_table_name(name)};")
+    statements += [
+        f"ALTER SEQUENCE {qualified_table_name('records_id_seq')} OWNED BY {legacy}.id;",
+        f"DROP TABLE {records} CASCADE;",
+        f"ALTER TABLE {legacy} RENAME TO records;",
+        f"ALTER TABLE {records} DROP CONSTRAINT records_legacy_pkey;",
+        f"ALTER TABLE {records} ADD CONSTRAINT records_pkey PRIMARY KEY (id);",
+    ]
+    for index_name, legacy_name, _ in RECORDS_INDEXES:
+        statements.append(f"ALTER INDEX IF EXISTS {qualified_table_name(legacy_name)} RENAME TO {index_name};")
+
+    _in_transaction(cursor, statements)
@@ -0,0 +1,48 @@
+"""Ячейка сетки для индексируемого поиска адресов по координатам"""
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь для импорта
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from bot.utils.database import qualified_table_name
+from bot.utils.geo import GEO_CELL_SQL
+
+
+def up(cursor):
+    """
+    Колонка geo_cell с уникальным индексом вместо индекса (latitude, longitude),
+    который не использовался условием ABS(latitude - x) < precision
+
+    Для уже накопившихся дублей ячейка заполняется только у самого раннего
+    адреса, остальные остаются с geo_cell = NULL (на них по-прежнему
+    ссылаются старые записи, но в поиск они больше не попадают).
+    """
+    addresses_table = qualified_table_name('addresses')
+    
+    cursor.execute(f"""
+        ALTER TABLE {addresses_table} ADD COLUMN IF NOT EXISTS geo_cell BIGINT;
+        
+        UPDATE {addresses_table} a
+        SET geo_cell = first_in_cell.cell
+        FROM (
+            SELECT DISTINCT ON (cell) id, cell
+            FROM (SELECT id, {GEO_CELL_SQL} AS cell FROM {addresses_table}) cells
+            ORDER BY cell, id
+        ) first_in_cell
+        WHERE a.id = first_in_cell.id;
+        
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_addresses_geo_cell ON {addresses_table}(geo_cell);
+        DROP INDEX IF EXISTS {qualified_table_name('idx_addresses_coordinates')};
+    """)
+
+
+def down(cursor):
+    """Откат миграции"""
+    addresses_table = qualified_table_name('addresses')
+    
+    cursor.execute(f"""
+        CREATE INDEX IF NOT EXISTS idx_addresses_coordinates ON {addresses_table}(latitude, longitude);
+        DROP INDEX IF EXISTS {qualified_table_name('idx_addresses_geo_cell')};
+        ALTER TABLE {addresses_table} DROP COLUMN IF EXISTS geo_cell;
+    """)
@@ -0,0 +1,32 @@
+"""Создание таблицы постоянного кэша геокодирования"""
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь для импорта
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from bot.utils.database import qualified_table_name
+
+
+def up(cursor):
+    """
+    Кэш ответов геокодера по округленным координатам: переживает перезапуск,
+    при старте приложения свежие записи загружаются в память
+    """
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {qualified_table_name('geocode_cache')} (
+            cache_key VARCHAR(64) PRIMARY KEY,
+            data JSONB NOT NULL,
+            cached_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_geocode_cache_cached_at
+        ON {qualified_table_name('geocode_cache')}(cached_at);
+    """)
+
+
+def down(cursor):
+    """Откат миграции"""
+    cursor.execute(f"""
+        DROP TABLE IF EXISTS {qualified_table_name('geocode_cache')};
+    """)
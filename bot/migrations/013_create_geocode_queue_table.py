@@ -0,0 +1,38 @@
+"""Создание очереди отложенного геокодирования записей"""
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь для импорта
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from bot.utils.database import qualified_table_name
+
+
+def up(cursor):
+    """
+    Очередь записей без адреса: запись создается сразу, адрес по координатам
+    определяет фоновый обработчик. record_timestamp - ключ партиции records,
+    по нему обновление адреса затрагивает одну партицию.
+    """
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {qualified_table_name('geocode_queue')} (
+            record_id INTEGER PRIMARY KEY,
+            record_timestamp TIMESTAMP NOT NULL,
+            latitude DOUBLE PRECISION NOT NULL,
+            longitude DOUBLE PRECISION NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW(),
+            last_error TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT NOW()
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_geocode_queue_next_attempt
+        ON {qualified_table_name('geocode_queue')}(next_attempt_at);
+    """)
+
+
+def down(cursor):
+    """Откат миграции"""
+    cursor.execute(f"""
+        DROP TABLE IF EXISTS {qualified_table_name('geocode_queue')};
+    """)
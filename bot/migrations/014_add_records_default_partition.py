@@ -0,0 +1,53 @@
+"""DEFAULT-партиция records для записей вне месячных партиций"""
+import sys
+from pathlib import Path
+
+# Добавляем корневую директорию в путь для импорта
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from bot.utils.database import qualified_table_name, get_schema
+
+# Имена зафиксированы в миграции (не берутся из bot.utils.partitions)
+DEFAULT_PARTITION = 'records_default'
+
+
+def _is_partitioned(cursor):
+    """Является ли records партиционированной таблицей"""
+    cursor.execute("""
+        SELECT c.relkind
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = 'records'
+    """, (get_schema(),))
+    result = cursor.fetchone()
+    return bool(result) and result['relkind'] == 'p'
+
+
+def up(cursor):
+    """
+    Без DEFAULT-партиции вставка записи, для месяца которой партиция еще не
+    создана (время устройства ушло вперед, обслуживание не запускалось),
+    завершается ошибкой. Такие строки попадают в records_default, обслуживание
+    партиций переносит их в месячные (bot.utils.partitions.split_default_partition).
+    """
+    if not _is_partitioned(cursor):
+        return
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {qualified_table_name(DEFAULT_PARTITION)}
+        PARTITION OF {qualified_table_name('records')} DEFAULT;
+    """)
+
+
+def down(cursor):
+    """Откат миграции (только пустой DEFAULT-партиции: ее строкам некуда перейти)"""
+    default = qualified_table_name(DEFAULT_PARTITION)
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL AS exists", (default,))
+    if not cursor.fetchone()['exists']:
+        return
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {default}) AS found")
+    if cursor.fetchone()['found']:
+        raise RuntimeError(
+            f"{DEFAULT_PARTITION} is not empty: run partition maintenance to move its rows first"
+        )
+    cursor.execute(f"DROP TABLE {default};")
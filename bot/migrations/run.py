@@ -7,7 +7,10 @@ from pathlib import Path
 # Добавляем корневую директорию в путь для импорта
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
-from bot.utils.database import get_db_connection, get_db_cursor, set_search_path, qualified_table_name
+from bot.utils.database import (
+    get_db_connection, get_db_cursor, get_autocommit_cursor, is_transactional,
+    qualified_table_name
+)
 
 
 def get_migration_files():
@@ -32,7 +35,6 @@ def ensure_migrations_table():
     """Создание таблицы миграций, если она не существует"""
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             migrations_table = qualified_table_name('migrations')
             cursor.execute(f"""
                 CREATE TABLE IF NOT EXISTS {migrations_table} (
@@ -48,17 +50,44 @@ def get_applied_migrations():
     ensure_migrations_table()
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             migrations_table = qualified_table_name('migrations')
             cursor.execute(f"SELECT name FROM {migrations_table} ORDER BY name")
             return [row['name'] for row in cursor.fetchall()]
 
 
+def _record_migration(migration_name):
+    """Запись о применении миграции"""
+    with get_db_connection() as conn:
+        with get_db_cursor(conn) as cursor:
+            cursor.execute(
+                f"INSERT INTO {qualified_table_name('migrations')} (name) VALUES (%s)",
+                (migration_name,)
+            )
+
+
+def _forget_migration(migration_name):
+    """Удаление записи о применении миграции"""
+    with get_db_connection() as conn:
+        with get_db_cursor(conn) as cursor:
+            cursor.execute(
+                f"DELETE FROM {qualified_table_name('migrations')} WHERE name = %s",
+                (migration_name,)
+            )
+
+
 def apply_migration(migration_name, migration_module):
     """Применение миграции"""
+    if not is_transactional(migration_module):
+        # CREATE INDEX CONCURRENTLY и т.п. нельзя выполнять в транзакции
+        print(f"Применение миграции (без транзакции): {migration_name}")
+        with get_autocommit_cursor() as cursor:
+            migration_module.up(cursor)
+        _record_migration(migration_name)
+        print(f"✓ Миграция {migration_name} применена")
+        return
+
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             print(f"Применение миграции: {migration_name}")
             migration_module.up(cursor)
             migrations_table = qualified_table_name('migrations')
@@ -71,9 +100,16 @@ def apply_migration(migration_name, migration_module):
 
 def rollback_migration(migration_name, migration_module):
     """Откат миграции"""
+    if not is_transactional(migration_module):
+        print(f"Откат миграции (без транзакции): {migration_name}")
+        with get_autocommit_cursor() as cursor:
+            migration_module.down(cursor)
+        _forget_migration(migration_name)
+        print(f"✓ Миграция {migration_name} откачена")
+        return
+
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             print(f"Откат миграции: {migration_name}")
             migration_module.down(cursor)
             migrations_table = qualified_table_name('migrations')
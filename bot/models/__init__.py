@@ -2,6 +2,8 @@
 from bot.models.user import User
 from bot.models.record import Record
 from bot.models.address import Address
+from bot.models.daily_attendance import DailyAttendance
+from bot.models.geocode_cache import GeocodeCacheStore
 
-__all__ = ['User', 'Record', 'Address']
+__all__ = ['User', 'Record', 'Address', 'DailyAttendance', 'GeocodeCacheStore']
 
@@ -1,6 +1,36 @@
 """Модель адреса"""
-from typing import Optional, Dict, Any
-from bot.utils.database import get_db_connection, get_db_cursor, set_search_path, qualified_table_name
+from typing import Optional, Dict, Any, Iterable, List
+from bot.utils.database import (
+    get_db_connection, get_db_cursor, qualified_table_name, run_db,
+    prepared_statement, execute_prepared
+)
+from bot.utils.geo import geo_cell, neighbour_cells
+
+# Prepared statements для горячих запросов (PREPARE один раз на соединение)
+_GET_BY_ID = prepared_statement(
+    'address_get_by_id',
+    f"SELECT * FROM {qualified_table_name('addresses')} WHERE id = $1",
+    ('integer',)
+)
+# Поиск по ячейке точки и соседним ячейкам через уникальный индекс geo_cell,
+# точное условие по координатам проверяется только для найденных строк
+_GET_BY_COORDINATES = prepared_statement(
+    'address_get_by_coordinates',
+    f"""
+    SELECT * FROM {qualified_table_name('addresses')}
+    WHERE geo_cell = ANY($1)
+    AND ABS(latitude - $2) < $3
+    AND ABS(longitude - $4) < $3
+    ORDER BY (latitude - $2) ^ 2 + (longitude - $4) ^ 2
+    LIMIT 1
+    """,
+    ('bigint[]', 'double precision', 'double precision', 'double precision')
+)
+_GET_BY_GEO_CELL = prepared_statement(
+    'address_get_by_geo_cell',
+    f"SELECT * FROM {qualified_table_name('addresses')} WHERE geo_cell = $1",
+    ('bigint',)
+)
 
 
 class Address:
@@ -16,7 +46,8 @@ class Address:
         city: Optional[str] = None,
         street: Optional[str] = None,
         building: Optional[str] = None,
-        created_at: Optional[str] = None
+        created_at: Optional[str] = None,
+        geo_cell: Optional[int] = None
     ):
         self.id = id
         self.formatted_address = formatted_address
@@ -27,6 +58,7 @@ class Address:
         self.street = street
         self.building = building
         self.created_at = created_at
+        self.geo_cell = geo_cell
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Address':
@@ -57,20 +89,30 @@ class Address:
         street: Optional[str] = None,
         building: Optional[str] = None
     ) -> 'Address':
-        """Создание нового адреса"""
+        """
+        Создание нового адреса
+        
+        Адрес уникален в пределах ячейки сетки: если параллельный запрос уже
+        создал адрес в той же ячейке, возвращается существующий.
+        """
+        cell = geo_cell(latitude, longitude)
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 addresses_table = qualified_table_name('addresses')
                 cursor.execute(
                     f"""
-                    INSERT INTO {addresses_table} (formatted_address, latitude, longitude, country, city, street, building)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    INSERT INTO {addresses_table} (formatted_address, latitude, longitude, country, city, street, building, geo_cell)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (geo_cell) DO NOTHING
                     RETURNING *
                     """,
-                    (formatted_address, latitude, longitude, country, city, street, building)
+                    (formatted_address, latitude, longitude, country, city, street, building, cell)
                 )
                 result = cursor.fetchone()
+                if result is None:
+                    # Ячейка уже занята (в том числе параллельной вставкой)
+                    execute_prepared(cursor, _GET_BY_GEO_CELL, (cell,))
+                    result = cursor.fetchone()
                 return Address.from_dict(dict(result))
     
     @staticmethod
@@ -78,28 +120,72 @@ class Address:
         """Получение адреса по ID"""
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
-                addresses_table = qualified_table_name('addresses')
-                cursor.execute(f"SELECT * FROM {addresses_table} WHERE id = %s", (address_id,))
+                execute_prepared(cursor, _GET_BY_ID, (address_id,))
                 result = cursor.fetchone()
                 return Address.from_dict(dict(result)) if result else None
     
+    @staticmethod
+    def get_by_ids(address_ids: Iterable[int]) -> List['Address']:
+        """Получение адресов по списку ID (одним запросом)"""
+        address_ids = list(set(address_ids))
+        if not address_ids:
+            return []
+        with get_db_connection(read_only=True) as conn:
+            with get_db_cursor(conn) as cursor:
+                cursor.execute(
+                    f"SELECT * FROM {qualified_table_name('addresses')} WHERE id = ANY(%s)",
+                    (address_ids,)
+                )
+                return [Address.from_dict(dict(row)) for row in cursor.fetchall()]
+    
     @staticmethod
     def get_by_coordinates(latitude: float, longitude: float, precision: float = 0.0001) -> Optional['Address']:
         """Получение адреса по координатам (с учетом погрешности)"""
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
-                addresses_table = qualified_table_name('addresses')
-                cursor.execute(
-                    f"""
-                    SELECT * FROM {addresses_table} 
-                    WHERE ABS(latitude - %s) < %s 
-                    AND ABS(longitude - %s) < %s
-                    LIMIT 1
-                    """,
-                    (latitude, precision, longitude, precision)
+                execute_prepared(
+                    cursor,
+                    _GET_BY_COORDINATES,
+                    (neighbour_cells(latitude, longitude, precision), latitude, precision, longitude)
                 )
                 result = cursor.fetchone()
                 return Address.from_dict(dict(result)) if result else None
 
+    # === Асинхронные версии для aiohttp handlers (не блокируют event loop) ===
+
+    @staticmethod
+    async def create_async(
+        formatted_address: str,
+        latitude: float,
+        longitude: float,
+        country: Optional[str] = None,
+        city: Optional[str] = None,
+        street: Optional[str] = None,
+        building: Optional[str] = None
+    ) -> 'Address':
+        """Асинхронное создание нового адреса"""
+        return await run_db(
+            Address.create,
+            formatted_address=formatted_address,
+            latitude=latitude,
+            longitude=longitude,
+            country=country,
+            city=city,
+            street=street,
+            building=building
+        )
+
+    @staticmethod
+    async def get_by_id_async(address_id: int) -> Optional['Address']:
+        """Асинхронное получение адреса по ID"""
+        return await run_db(Address.get_by_id, address_id)
+
+    @staticmethod
+    async def get_by_ids_async(address_ids: Iterable[int]) -> List['Address']:
+        """Асинхронное получение адресов по списку ID"""
+        return await run_db(Address.get_by_ids, address_ids)
+
+    @staticmethod
+    async def get_by_coordinates_async(latitude: float, longitude: float, precision: float = 0.0001) -> Optional['Address']:
+        """Асинхронное получение адреса по координатам (с учетом погрешности)"""
+        return await run_db(Address.get_by_coordinates, latitude, longitude, precision)
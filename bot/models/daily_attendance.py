@@ -0,0 +1,482 @@
+"""Модель дневной сводки посещаемости"""
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+from datetime import date, datetime
+from bot.utils.database import (
+    get_db_connection, get_db_cursor, qualified_table_name, run_db,
+    prepared_statement, execute_prepared
+)
+from bot.utils.timezone import to_msk, msk_date_range_utc
+from bot.utils.geo import coordinates_label
+from bot.config import TELEGRAM_ADMIN_IDS
+
+_users_table = qualified_table_name('users')
+_records_table = qualified_table_name('records')
+_addresses_table = qualified_table_name('addresses')
+_daily_table = qualified_table_name('daily_attendance')
+
+# Пространство ключей advisory lock для пересчета сводки (второй ключ - user_id)
+_REFRESH_LOCK_NAMESPACE = 10010
+
+# Пересчет строки сводки по записям пользователя за день (MSK).
+# Записей одного пользователя за день единицы, поэтому строка целиком
+# пересчитывается из индекса (user_id, record_type, timestamp DESC)
+_REFRESH_SQL = f"""
+    WITH day_records AS (
+        SELECT id, record_type, timestamp, address_id, photo_url, comment
+        FROM {_records_table}
+        WHERE user_id = %(user_id)s
+        AND timestamp >= %(start)s AND timestamp <= %(end)s
+    )
+    INSERT INTO {_daily_table} (
+        user_id, day,
+        arrival_record_id, arrival_at, arrival_address_id, arrival_has_photo,
+        departure_record_id, departure_at, departure_address_id, departure_has_photo,
+        last_record_type, records_count, photo_count, comment_count, updated_at
+    )
+    SELECT
+        %(user_id)s, %(day)s,
+        arr.id, arr.timestamp, arr.address_id, COALESCE(arr.photo_url, '') <> '',
+        dep.id, dep.timestamp, dep.address_id, COALESCE(dep.photo_url, '') <> '',
+        latest.record_type, stats.records_count, stats.photo_count, stats.comment_count, NOW()
+    FROM (
+        SELECT
+            COUNT(*) AS records_count,
+            COUNT(NULLIF(photo_url, '')) AS photo_count,
+            COUNT(NULLIF(comment, '')) AS comment_count
+        FROM day_records
+    ) stats
+    LEFT JOIN LATERAL (
+        SELECT * FROM day_records WHERE record_type = 'arrival'
+        ORDER BY timestamp, id LIMIT 1
+    ) arr ON true
+    LEFT JOIN LATERAL (
+        SELECT * FROM day_records WHERE record_type = 'departure'
+        ORDER BY timestamp DESC, id DESC LIMIT 1
+    ) dep ON true
+    LEFT JOIN LATERAL (
+        SELECT * FROM day_records ORDER BY timestamp DESC, id DESC LIMIT 1
+    ) latest ON true
+    WHERE stats.records_count > 0
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        arrival_record_id = EXCLUDED.arrival_record_id,
+        arrival_at = EXCLUDED.arrival_at,
+        arrival_address_id = EXCLUDED.arrival_address_id,
+        arrival_has_photo = EXCLUDED.arrival_has_photo,
+        departure_record_id = EXCLUDED.departure_record_id,
+        departure_at = EXCLUDED.departure_at,
+        departure_address_id = EXCLUDED.departure_address_id,
+        departure_has_photo = EXCLUDED.departure_has_photo,
+        last_record_type = EXCLUDED.last_record_type,
+        records_count = EXCLUDED.records_count,
+        photo_count = EXCLUDED.photo_count,
+        comment_count = EXCLUDED.comment_count,
+        updated_at = EXCLUDED.updated_at
+"""
+
+# Заполнение сводки по всем записям за диапазон дат (MSK) одним проходом
+_BACKFILL_SQL = f"""
+    WITH day_records AS (
+        SELECT
+            id, user_id, record_type, timestamp, address_id, photo_url, comment,
+            (timestamp AT TIME ZONE 'UTC' AT TIME ZONE 'Europe/Moscow')::date AS day
+        FROM {_records_table}
+        WHERE timestamp >= %(start)s AND timestamp < %(end)s
+    ),
+    stats AS (
+        SELECT
+            user_id, day,
+            COUNT(*) AS records_count,
+            COUNT(NULLIF(photo_url, '')) AS photo_count,
+            COUNT(NULLIF(comment, '')) AS comment_count
+        FROM day_records
+        GROUP BY user_id, day
+    ),
+    arr AS (
+        SELECT DISTINCT ON (user_id, day) *
+        FROM day_records WHERE record_type = 'arrival'
+        ORDER BY user_id, day, timestamp, id
+    ),
+    dep AS (
+        SELECT DISTINCT ON (user_id, day) *
+        FROM day_records WHERE record_type = 'departure'
+        ORDER BY user_id, day, timestamp DESC, id DESC
+    ),
+    latest AS (
+        SELECT DISTINCT ON (user_id, day) user_id, day, record_type
+        FROM day_records
+        ORDER BY user_id, day, timestamp DESC, id DESC
+    )
+    INSERT INTO {_daily_table} (
+        user_id, day,
+        arrival_record_id, arrival_at, arrival_address_id, arrival_has_photo,
+        departure_record_id, departure_at, departure_address_id, departure_has_photo,
+        last_record_type, records_count, photo_count, comment_count, updated_at
+    )
+    SELECT
+        s.user_id, s.day,
+        arr.id, arr.timestamp, arr.address_id, COALESCE(arr.photo_url, '') <> '',
+        dep.id, dep.timestamp, dep.address_id, COALESCE(dep.photo_url, '') <> '',
+        latest.record_type, s.records_count, s.photo_count, s.comment_count, NOW()
+    FROM stats s
+    JOIN latest ON latest.user_id = s.user_id AND latest.day = s.day
+    LEFT JOIN arr ON arr.user_id = s.user_id AND arr.day = s.day
+    LEFT JOIN dep ON dep.user_id = s.user_id AND dep.day = s.day
+    ON CONFLICT (user_id, day) DO UPDATE SET
+        arrival_record_id = EXCLUDED.arrival_record_id,
+        arrival_at = EXCLUDED.arrival_at,
+        arrival_address_id = EXCLUDED.arrival_address_id,
+        arrival_has_photo = EXCLUDED.arrival_has_photo,
+        departure_record_id = EXCLUDED.departure_record_id,
+        departure_at = EXCLUDED.departure_at,
+        departure_address_id = EXCLUDED.departure_address_id,
+        departure_has_photo = EXCLUDED.departure_has_photo,
+        last_record_type = EXCLUDED.last_record_type,
+        records_count = EXCLUDED.records_count,
+        photo_count = EXCLUDED.photo_count,
+        comment_count = EXCLUDED.comment_count,
+        updated_at = EXCLUDED.updated_at
+"""
+
+# Дашборд за день: строка сводки по первичному ключу (user_id, day),
+# детали записей и адресов - по первичным ключам
+_BOARD_SELECT = f"""
+    SELECT
+        u.id as user_id,
+        u.name as user_name,
+        u.email as user_email,
+        u.telegram_handle as user_telegram_handle,
+        u.telegram_id as user_telegram_id,
+        u.phone as user_phone,
+        u.avatar_url as user_avatar_url,
+        u.created_at as user_created_at,
+        u.updated_at as user_updated_at,
+        -- Arrival record
+        arr.id as arrival_id,
+        arr.timestamp as arrival_timestamp,
+        arr.comment as arrival_comment,
+        arr.latitude as arrival_latitude,
+        arr.longitude as arrival_longitude,
+        arr.photo_url as arrival_photo_url,
+        arr_a.formatted_address as arrival_address,
+        da.arrival_address_id,
+        -- Departure record
+        dep.id as departure_id,
+        dep.timestamp as departure_timestamp,
+        dep.comment as departure_comment,
+        dep.latitude as departure_latitude,
+        dep.longitude as departure_longitude,
+        dep.photo_url as departure_photo_url,
+        dep_a.formatted_address as departure_address,
+        da.departure_address_id,
+        da.last_record_type
+    FROM {_users_table} u
+    LEFT JOIN {_daily_table} da ON da.user_id = u.id AND da.day = $1
+    LEFT JOIN {_records_table} arr ON arr.id = da.arrival_record_id AND arr.timestamp = da.arrival_at
+    LEFT JOIN {_addresses_table} arr_a ON arr_a.id = da.arrival_address_id
+    LEFT JOIN {_records_table} dep ON dep.id = da.departure_record_id AND dep.timestamp = da.departure_at
+    LEFT JOIN {_addresses_table} dep_a ON dep_a.id = da.departure_address_id
+"""
+
+_GET_BOARD_BY_DATE = prepared_statement(
+    'daily_attendance_get_board_by_date',
+    f"""
+    {_BOARD_SELECT}
+    WHERE u.telegram_id IS NULL OR u.telegram_id <> ALL($2)
+    ORDER BY u.name
+    """,
+    ('date', 'bigint[]')
+)
+
+# Строка дашборда одного сотрудника (для точечного обновления кэша дашборда)
+_GET_BOARD_ENTRY = prepared_statement(
+    'daily_attendance_get_board_entry',
+    f"""
+    {_BOARD_SELECT}
+    WHERE u.id = $3 AND (u.telegram_id IS NULL OR u.telegram_id <> ALL($2))
+    """,
+    ('date', 'bigint[]', 'integer')
+)
+
+_GET_USER_DAY = prepared_statement(
+    'daily_attendance_get_user_day',
+    f"""
+    SELECT
+        da.*,
+        arr_a.formatted_address as arrival_formatted_address,
+        arr_a.latitude as arrival_address_latitude,
+        arr_a.longitude as arrival_address_longitude,
+        arr_a.country as arrival_country,
+        arr_a.city as arrival_city,
+        arr_a.street as arrival_street,
+        arr_a.building as arrival_building,
+        arr_a.created_at as arrival_address_created_at,
+        dep_a.formatted_address as departure_formatted_address,
+        dep_a.latitude as departure_address_latitude,
+        dep_a.longitude as departure_address_longitude,
+        dep_a.country as departure_country,
+        dep_a.city as departure_city,
+        dep_a.street as departure_street,
+        dep_a.building as departure_building,
+        dep_a.created_at as departure_address_created_at
+    FROM {_daily_table} da
+    LEFT JOIN {_addresses_table} arr_a ON arr_a.id = da.arrival_address_id
+    LEFT JOIN {_addresses_table} dep_a ON dep_a.id = da.departure_address_id
+    WHERE da.user_id = $1 AND da.day = $2
+    """,
+    ('integer', 'date')
+)
+
+
+def attendance_day(timestamp: datetime) -> date:
+    """День сводки (MSK) для времени записи из БД"""
+    return to_msk(timestamp).date()
+
+
+class DailyAttendance:
+    """Дневная сводка посещаемости пользователя (первый приход / последний уход)"""
+
+    @staticmethod
+    def refresh(cursor, keys: Iterable[Tuple[int, date]]) -> None:
+        """
+        Пересчет сводки в текущей транзакции записи
+
+        Пересчет идет под advisory lock пользователя: параллельные записи того же
+        пользователя пересчитывают сводку по очереди, и последний видит все
+        закоммиченные записи дня.
+
+        Args:
+            cursor: Курсор транзакции, изменившей записи
+            keys: Пары (user_id, день MSK)
+        """
+        # Фиксированный порядок блокировок исключает взаимоблокировки
+        for user_id, day in sorted(set(keys)):
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(%s, %s)",
+                (_REFRESH_LOCK_NAMESPACE, user_id)
+            )
+            start_utc, end_utc = msk_date_range_utc(day)
+            cursor.execute(
+                _REFRESH_SQL,
+                {'user_id': user_id, 'day': day, 'start': start_utc, 'end': end_utc}
+            )
+            if cursor.rowcount == 0:
+                # Записей за день не осталось
+                cursor.execute(
+                    f"DELETE FROM {_daily_table} WHERE user_id = %s AND day = %s",
+                    (user_id, day)
+                )
+
+    @staticmethod
+    def backfill(start_utc: datetime, end_utc: datetime) -> int:
+        """
+        Заполнение сводки по записям в диапазоне [start_utc, end_utc)
+
+        Returns:
+            Количество записанных строк сводки
+        """
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                cursor.execute(_BACKFILL_SQL, {'start': start_utc, 'end': end_utc})
+                return cursor.rowcount
+
+    @staticmethod
+    def delete_by_user(cursor, user_id: int) -> None:
+        """Удаление сводки пользователя (в транзакции удаления его записей)"""
+        cursor.execute(f"DELETE FROM {_daily_table} WHERE user_id = %s", (user_id,))
+
+    @staticmethod
+    def get_board_by_date(target_date: date) -> List[Dict[str, Any]]:
+        """
+        Все пользователи с записями прихода и ухода за дату (MSK) из сводки
+
+        Args:
+            target_date: Целевая дата (MSK)
+
+        Returns:
+            Список словарей с пользователями, их arrival_record и departure_record
+        """
+        with get_db_connection(read_only=True) as conn:
+            with get_db_cursor(conn) as cursor:
+                execute_prepared(
+                    cursor,
+                    _GET_BOARD_BY_DATE,
+                    (target_date, list(TELEGRAM_ADMIN_IDS))
+                )
+                return [DailyAttendance._board_entry(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def get_board_entry(user_id: int, target_date: date) -> Optional[Dict[str, Any]]:
+        """
+        Строка дашборда одного сотрудника за дату (MSK)
+
+        Читается с primary: вызывается сразу после записи.
+
+        Returns:
+            Словарь как в get_board_by_date или None (нет пользователя или это админ)
+        """
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                execute_prepared(
+                    cursor,
+                    _GET_BOARD_ENTRY,
+                    (target_date, list(TELEGRAM_ADMIN_IDS), user_id)
+                )
+                row = cursor.fetchone()
+                return DailyAttendance._board_entry(row) if row else None
+
+    @staticmethod
+    def _board_entry(row: Dict[str, Any]) -> Dict[str, Any]:
+        """Сотрудник с записями прихода и ухода из строки дашборда"""
+        user_data = {
+            'id': row['user_id'],
+            'name': row['user_name'],
+            'email': row['user_email'],
+            'telegram_handle': row['user_telegram_handle'],
+            'telegram_id': row['user_telegram_id'],
+            'phone': row['user_phone'],
+            'avatar_url': row['user_avatar_url'],
+            'created_at': row['user_created_at'].isoformat() if row['user_created_at'] else None,
+            'updated_at': row['user_updated_at'].isoformat() if row['user_updated_at'] else None
+        }
+
+        return {
+            'user': user_data,
+            'arrival_record': DailyAttendance._board_record(row, 'arrival'),
+            'departure_record': DailyAttendance._board_record(row, 'departure'),
+            'last_record_type': row['last_record_type']
+        }
+
+    @staticmethod
+    def _board_record(row: Dict[str, Any], record_type: str) -> Optional[Dict[str, Any]]:
+        """Запись прихода/ухода из строки дашборда"""
+        if not row[f'{record_type}_id']:
+            return None
+        timestamp = row[f'{record_type}_timestamp']
+        address = row[f'{record_type}_address']
+        latitude, longitude = row[f'{record_type}_latitude'], row[f'{record_type}_longitude']
+        return {
+            'id': row[f'{record_type}_id'],
+            'record_type': record_type,
+            'timestamp': timestamp.isoformat() if timestamp else None,
+            'comment': row[f'{record_type}_comment'],
+            'latitude': row[f'{record_type}_latitude'],
+            'longitude': row[f'{record_type}_longitude'],
+            # Пока фоновое геокодирование не завершено, показываем координаты
+            'address': address if address is not None else coordinates_label(latitude, longitude),
+            'address_pending': address is None,
+            'address_id': row[f'{record_type}_address_id'],
+            'photo_url': row[f'{record_type}_photo_url'],
+            'has_photo': bool(row[f'{record_type}_photo_url'])
+        }
+
+    @staticmethod
+    def get_user_day(user_id: int, target_date: date) -> Optional[Dict[str, Any]]:
+        """
+        Сводка пользователя за дату (MSK) с адресами прихода и ухода
+
+        Returns:
+            Словарь {'last_record_type', 'arrival', 'departure'} или None, если записей нет.
+            arrival/departure: {'record_id', 'timestamp', 'has_photo', 'address'} или None
+        """
+        with get_db_connection(read_only=True) as conn:
+            with get_db_cursor(conn) as cursor:
+                execute_prepared(cursor, _GET_USER_DAY, (user_id, target_date))
+                row = cursor.fetchone()
+                if not row:
+                    return None
+
+                return {
+                    'last_record_type': row['last_record_type'],
+                    'records_count': row['records_count'],
+                    'arrival': DailyAttendance._day_record(row, 'arrival'),
+                    'departure': DailyAttendance._day_record(row, 'departure')
+                }
+
+    @staticmethod
+    def _day_record(row: Dict[str, Any], record_type: str) -> Optional[Dict[str, Any]]:
+        """Приход/уход из строки сводки пользователя"""
+        if not row[f'{record_type}_record_id']:
+            return None
+
+        address_data = None
+        address_id = row[f'{record_type}_address_id']
+        if address_id and row[f'{record_type}_formatted_address'] is not None:
+            created_at = row[f'{record_type}_address_created_at']
+            address_data = {
+                'id': address_id,
+                'formatted_address': row[f'{record_type}_formatted_address'],
+                'latitude': row[f'{record_type}_address_latitude'],
+                'longitude': row[f'{record_type}_address_longitude'],
+                'country': row[f'{record_type}_country'],
+                'city': row[f'{record_type}_city'],
+                'street': row[f'{record_type}_street'],
+                'building': row[f'{record_type}_building'],
+                'created_at': created_at.isoformat() if created_at else None
+            }
+
+        return {
+            'record_id': row[f'{record_type}_record_id'],
+            'timestamp': row[f'{record_type}_at'],
+            'has_photo': row[f'{record_type}_has_photo'],
+            'address': address_data
+        }
+
+    @staticmethod
+    def get_by_period(date_from: date, date_to: date) -> List[Dict[str, Any]]:
+        """
+        Сводки всех сотрудников (без админов) за период дат (MSK)
+
+        Returns:
+            Список {'id', 'name', 'days': [строки сводки]} в порядке имен
+        """
+        with get_db_connection(read_only=True) as conn:
+            with get_db_cursor(conn) as cursor:
+                cursor.execute(
+                    f"""
+                    SELECT
+                        u.id, u.name,
+                        da.day, da.arrival_at, da.departure_at,
+                        da.records_count, da.photo_count, da.comment_count
+                    FROM {_users_table} u
+                    LEFT JOIN {_daily_table} da ON da.user_id = u.id
+                        AND da.day >= %s AND da.day <= %s
+                    WHERE u.telegram_id IS NULL OR u.telegram_id <> ALL(%s::bigint[])
+                    ORDER BY u.name, u.id, da.day
+                    """,
+                    (date_from, date_to, list(TELEGRAM_ADMIN_IDS))
+                )
+
+                employees = {}
+                for row in cursor.fetchall():
+                    employee = employees.get(row['id'])
+                    if employee is None:
+                        employee = {'id': row['id'], 'name': row['name'], 'days': []}
+                        employees[row['id']] = employee
+                    if row['day']:
+                        employee['days'].append({
+                            'day': row['day'],
+                            'arrival_at': row['arrival_at'],
+                            'departure_at': row['departure_at'],
+                            'records_count': row['records_count'],
+                            'photo_count': row['photo_count'],
+                            'comment_count': row['comment_count']
+                        })
+
+                return list(employees.values())
+
+    # === Асинхронные версии для aiohttp handlers (не блокируют event loop) ===
+
+    @staticmethod
+    async def get_board_by_date_async(target_date: date) -> List[Dict[str, Any]]:
+        """Асинхронное получение дашборда за дату"""
+        return await run_db(DailyAttendance.get_board_by_date, target_date)
+
+    @staticmethod
+    async def get_board_entry_async(user_id: int, target_date: date) -> Optional[Dict[str, Any]]:
+        """Асинхронное получение строки дашборда сотрудника"""
+        return await run_db(DailyAttendance.get_board_entry, user_id, target_date)
+
+    @staticmethod
+    async def get_user_day_async(user_id: int, target_date: date) -> Optional[Dict[str, Any]]:
+        """Асинхронное получение сводки пользователя за дату"""
+        return await run_db(DailyAttendance.get_user_day, user_id, target_date)
@@ -0,0 +1,80 @@
+"""Модель постоянного кэша геокодирования"""
+import time
+from typing import Any, Dict, List, Tuple
+from psycopg2.extras import Json
+from bot.utils.database import get_db_connection, get_db_cursor, qualified_table_name, run_db
+
+_geocode_cache_table = qualified_table_name('geocode_cache')
+
+
+class GeocodeCacheStore:
+    """Постоянное хранилище ответов геокодера (таблица geocode_cache)"""
+
+    @staticmethod
+    def save(cache_key: str, data: Dict[str, Any]) -> None:
+        """Сохранение (или обновление) ответа для координат"""
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {_geocode_cache_table} (cache_key, data, cached_at)
+                    VALUES (%s, %s, NOW())
+                    ON CONFLICT (cache_key) DO UPDATE SET
+                        data = EXCLUDED.data,
+                        cached_at = EXCLUDED.cached_at
+                    """,
+                    (cache_key, Json(data))
+                )
+
+    @staticmethod
+    def load_recent(ttl_seconds: float, limit: int) -> List[Tuple[str, Dict[str, Any], float]]:
+        """
+        Свежие записи кэша, самые новые первыми
+
+        Args:
+            ttl_seconds: Время жизни записи
+            limit: Максимальное количество записей
+
+        Returns:
+            Список (ключ, данные, время сохранения в unix time)
+        """
+        with get_db_connection(read_only=True) as conn:
+            with get_db_cursor(conn) as cursor:
+                cursor.execute(
+                    f"""
+                    SELECT cache_key, data, EXTRACT(EPOCH FROM NOW() - cached_at) AS age_seconds
+                    FROM {_geocode_cache_table}
+                    WHERE cached_at > NOW() - %s * INTERVAL '1 second'
+                    ORDER BY cached_at DESC
+                    LIMIT %s
+                    """,
+                    (ttl_seconds, limit)
+                )
+                now = time.time()
+                return [
+                    (row['cache_key'], row['data'], now - float(row['age_seconds']))
+                    for row in cursor.fetchall()
+                ]
+
+    @staticmethod
+    def purge_expired(ttl_seconds: float) -> int:
+        """
+        Удаление просроченных записей
+
+        Returns:
+            Количество удаленных записей
+        """
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                cursor.execute(
+                    f"DELETE FROM {_geocode_cache_table} WHERE cached_at <= NOW() - %s * INTERVAL '1 second'",
+                    (ttl_seconds,)
+                )
+                return cursor.rowcount
+
+    # === Асинхронные версии для aiohttp handlers (не блокируют event loop) ===
+
+    @staticmethod
+    async def save_async(cache_key: str, data: Dict[str, Any]) -> None:
+        """Асинхронное сохранение ответа"""
+        await run_db(GeocodeCacheStore.save, cache_key, data)
@@ -0,0 +1,137 @@
+"""Модель очереди отложенного геокодирования записей"""
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+from bot.utils.database import (
+    get_db_connection, get_db_cursor, qualified_table_name, run_db,
+    mark_primary_write
+)
+from bot.models.daily_attendance import DailyAttendance, attendance_day
+
+_records_table = qualified_table_name('records')
+_queue_table = qualified_table_name('geocode_queue')
+
+# Сколько секунд задача принадлежит взявшему ее обработчику. Если процесс
+# упал посреди обработки, задача снова станет доступна по истечении срока
+_CLAIM_LEASE_SECONDS = 300
+
+
+class GeocodeQueue:
+    """Очередь записей, ожидающих определения адреса (таблица geocode_queue)"""
+
+    @staticmethod
+    def enqueue(cursor, record_id: int, record_timestamp: datetime, latitude: float, longitude: float) -> None:
+        """
+        Постановка записи в очередь (в транзакции создания записи)
+
+        Args:
+            cursor: Курсор транзакции, создавшей запись
+            record_id: ID записи
+            record_timestamp: Время записи (ключ партиции records)
+            latitude: Широта
+            longitude: Долгота
+        """
+        cursor.execute(
+            f"""
+            INSERT INTO {_queue_table} (record_id, record_timestamp, latitude, longitude)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (record_id) DO NOTHING
+            """,
+            (record_id, record_timestamp, latitude, longitude)
+        )
+
+    @staticmethod
+    def claim_batch(limit: int) -> List[Dict[str, Any]]:
+        """
+        Захват пачки задач, у которых наступило время попытки
+
+        SKIP LOCKED позволяет нескольким процессам разбирать очередь без
+        конфликтов; захваченные задачи откладываются на срок аренды, а счетчик
+        попыток увеличивается сразу.
+
+        Returns:
+            Список задач (record_id, record_timestamp, latitude, longitude, attempts)
+        """
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                cursor.execute(
+                    f"""
+                    UPDATE {_queue_table} q
+                    SET attempts = q.attempts + 1,
+                        next_attempt_at = NOW() + %s * INTERVAL '1 second'
+                    WHERE q.record_id IN (
+                        SELECT record_id FROM {_queue_table}
+                        WHERE next_attempt_at <= NOW()
+                        ORDER BY next_attempt_at
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING q.record_id, q.record_timestamp, q.latitude, q.longitude, q.attempts
+                    """,
+                    (_CLAIM_LEASE_SECONDS, limit)
+                )
+                return [dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def complete(record_id: int, record_timestamp: datetime, address_id: Optional[int]) -> Optional[int]:
+        """
+        Запись найденного адреса и удаление задачи (одна транзакция)
+
+        Адрес записывается, только если он еще не задан (например, вручную),
+        дневная сводка пересчитывается, чтобы дашборд показал адрес.
+
+        Returns:
+            ID пользователя записи, если адрес обновлен, иначе None
+        """
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                updated = None
+                if address_id is not None:
+                    cursor.execute(
+                        f"""
+                        UPDATE {_records_table}
+                        SET address_id = %s
+                        WHERE id = %s AND timestamp = %s AND address_id IS NULL
+                        RETURNING user_id, timestamp
+                        """,
+                        (address_id, record_id, record_timestamp)
+                    )
+                    updated = cursor.fetchone()
+                    if updated:
+                        DailyAttendance.refresh(
+                            cursor, [(updated['user_id'], attendance_day(updated['timestamp']))]
+                        )
+                cursor.execute(f"DELETE FROM {_queue_table} WHERE record_id = %s", (record_id,))
+                mark_primary_write()
+                return updated['user_id'] if updated else None
+
+    @staticmethod
+    def retry(record_id: int, delay_seconds: float, error: str) -> None:
+        """Перенос следующей попытки на delay_seconds с сохранением причины"""
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                cursor.execute(
+                    f"""
+                    UPDATE {_queue_table}
+                    SET next_attempt_at = NOW() + %s * INTERVAL '1 second',
+                        last_error = %s
+                    WHERE record_id = %s
+                    """,
+                    (delay_seconds, error, record_id)
+                )
+
+    # === Асинхронные версии для фонового обработчика (не блокируют event loop) ===
+
+    @staticmethod
+    async def claim_batch_async(limit: int) -> List[Dict[str, Any]]:
+        """Асинхронный захват пачки задач"""
+        return await run_db(GeocodeQueue.claim_batch, limit)
+
+    @staticmethod
+    async def complete_async(record_id: int, record_timestamp: datetime, address_id: Optional[int]) -> Optional[int]:
+        """Асинхронное завершение задачи"""
+        return await run_db(GeocodeQueue.complete, record_id, record_timestamp, address_id)
+
+    @staticmethod
+    async def retry_async(record_id: int, delay_seconds: float, error: str) -> None:
+        """Асинхронный перенос попытки"""
+        await run_db(GeocodeQueue.retry, record_id, delay_seconds, error)
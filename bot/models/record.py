@@ -1,10 +1,94 @@
 """Модель записи о приходе/уходе"""
 from typing import Optional, List, Dict, Any
 from datetime import datetime, date
-from bot.utils.database import get_db_connection, get_db_cursor, set_search_path, qualified_table_name
+from bot.utils.database import (
+    get_db_connection, get_db_cursor, qualified_table_name, run_db,
+    prepared_statement, execute_prepared, mark_primary_write
+)
 from bot.utils.timezone import now_msk, today_msk, msk_date_range_utc
-from bot.config import TELEGRAM_ADMIN_IDS
+from bot.models.daily_attendance import DailyAttendance, attendance_day
+from bot.models.geocode_queue import GeocodeQueue
 
+_users_table = qualified_table_name('users')
+_records_table = qualified_table_name('records')
+_addresses_table = qualified_table_name('addresses')
+
+# Prepared statements для горячих запросов (PREPARE один раз на соединение)
+_GET_BY_ID = prepared_statement(
+    'record_get_by_id',
+    f"SELECT * FROM {_records_table} WHERE id = $1",
+    ('integer',)
+)
+
+_GET_BY_ID_WITH_DETAILS = prepared_statement(
+    'record_get_by_id_with_details',
+    f"""
+    SELECT 
+        r.id as record_id,
+        r.user_id,
+        r.record_type,
+        r.timestamp,
+        r.comment,
+        r.latitude as record_latitude,
+        r.longitude as record_longitude,
+        r.address_id,
+        r.created_at as record_created_at,
+        r.photo_url,
+        r.photo_uploaded_at,
+        u.name as user_name,
+        u.email as user_email,
+        u.telegram_handle as user_telegram_handle,
+        u.telegram_id as user_telegram_id,
+        u.phone as user_phone,
+        u.avatar_url as user_avatar_url,
+        u.created_at as user_created_at,
+        u.updated_at as user_updated_at,
+        a.formatted_address,
+        a.latitude as address_latitude,
+        a.longitude as address_longitude,
+        a.country,
+        a.city,
+        a.street,
+        a.building,
+        a.created_at as address_created_at
+    FROM {_records_table} r
+    LEFT JOIN {_users_table} u ON r.user_id = u.id
+    LEFT JOIN {_addresses_table} a ON r.address_id = a.id
+    WHERE r.id = $1
+    """,
+    ('integer',)
+)
+
+_GET_BY_USER_AND_DATE_WITH_ADDRESSES = prepared_statement(
+    'record_get_by_user_and_date_with_addresses',
+    f"""
+    SELECT 
+        r.id as record_id,
+        r.user_id,
+        r.record_type,
+        r.timestamp,
+        r.comment,
+        r.latitude as record_latitude,
+        r.longitude as record_longitude,
+        r.address_id,
+        r.created_at as record_created_at,
+        r.photo_url,
+        a.formatted_address,
+        a.latitude as address_latitude,
+        a.longitude as address_longitude,
+        a.country,
+        a.city,
+        a.street,
+        a.building,
+        a.created_at as address_created_at
+    FROM {_records_table} r
+    LEFT JOIN {_addresses_table} a ON r.address_id = a.id
+    WHERE r.user_id = $1
+    AND r.timestamp >= $2 AND r.timestamp <= $3
+    ORDER BY r.timestamp DESC
+    """,
+    ('integer', 'timestamptz', 'timestamptz')
+)
 
 class Record:
     """Модель записи о приходе/уходе"""
@@ -68,15 +152,21 @@ class Record:
         longitude: float,
         address_id: Optional[int] = None,
         comment: Optional[str] = None,
-        timestamp: Optional[datetime] = None
+        timestamp: Optional[datetime] = None,
+        geocode_pending: bool = False
     ) -> 'Record':
-        """Создание новой записи"""
+        """
+        Создание новой записи
+        
+        Args:
+            geocode_pending: Адрес не найден - поставить запись в очередь
+                фонового геокодирования (в той же транзакции)
+        """
         if timestamp is None:
             timestamp = now_msk()  # Используем московское время
         
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 records_table = qualified_table_name('records')
                 cursor.execute(
                     f"""
@@ -87,6 +177,15 @@ class Record:
                     (user_id, record_type, timestamp, comment, latitude, longitude, address_id)
                 )
                 result = cursor.fetchone()
+                # Сводка за день обновляется в той же транзакции
+                DailyAttendance.refresh(
+                    cursor, [(result['user_id'], attendance_day(result['timestamp']))]
+                )
+                if geocode_pending and address_id is None:
+                    GeocodeQueue.enqueue(
+                        cursor, result['id'], result['timestamp'], latitude, longitude
+                    )
+                mark_primary_write()
                 return Record.from_dict(dict(result))
     
     @staticmethod
@@ -94,9 +193,7 @@ class Record:
         """Получение записи по ID"""
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
-                records_table = qualified_table_name('records')
-                cursor.execute(f"SELECT * FROM {records_table} WHERE id = %s", (record_id,))
+                execute_prepared(cursor, _GET_BY_ID, (record_id,))
                 result = cursor.fetchone()
                 return Record.from_dict(dict(result)) if result else None
     
@@ -104,8 +201,13 @@ class Record:
         """Обновление записи в базе данных"""
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 records_table = qualified_table_name('records')
+                # Прежние пользователь и день нужны для пересчета сводки, если они изменились
+                cursor.execute(
+                    f"SELECT user_id, timestamp FROM {records_table} WHERE id = %s FOR UPDATE",
+                    (self.id,)
+                )
+                previous = cursor.fetchone()
                 cursor.execute(
                     f"""
                     UPDATE {records_table}
@@ -126,6 +228,12 @@ class Record:
                      self.photo_url, self.photo_uploaded_at, self.id)
                 )
                 result = cursor.fetchone()
+                if result:
+                    keys = [(result['user_id'], attendance_day(result['timestamp']))]
+                    if previous:
+                        keys.append((previous['user_id'], attendance_day(previous['timestamp'])))
+                    DailyAttendance.refresh(cursor, keys)
+                mark_primary_write()
                 return Record.from_dict(dict(result)) if result else self
     
     @staticmethod
@@ -135,7 +243,6 @@ class Record:
         
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 records_table = qualified_table_name('records')
                 cursor.execute(
                     f"""
@@ -150,23 +257,35 @@ class Record:
                 return [Record.from_dict(dict(row)) for row in results]
     
     @staticmethod
-    def get_latest_by_user_and_date(user_id: int, target_date: date) -> Optional['Record']:
-        """Получение последней записи пользователя за определенную дату (MSK)"""
+    def get_latest_by_user_and_date(
+        user_id: int,
+        target_date: date,
+        record_type: Optional[str] = None
+    ) -> Optional['Record']:
+        """
+        Получение последней записи пользователя за определенную дату (MSK)
+        
+        Args:
+            user_id: ID пользователя
+            target_date: Дата (MSK)
+            record_type: Тип записи (arrival/departure), None - любой
+        """
         start_utc, end_utc = msk_date_range_utc(target_date)
         
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 records_table = qualified_table_name('records')
+                type_filter = "AND record_type = %s" if record_type else ""
+                params = (user_id, record_type) if record_type else (user_id,)
                 cursor.execute(
                     f"""
                     SELECT * FROM {records_table} 
-                    WHERE user_id = %s 
+                    WHERE user_id = %s {type_filter}
                     AND timestamp >= %s AND timestamp <= %s
                     ORDER BY timestamp DESC
                     LIMIT 1
                     """,
-                    (user_id, start_utc, end_utc)
+                    params + (start_utc, end_utc)
                 )
                 result = cursor.fetchone()
                 return Record.from_dict(dict(result)) if result else None
@@ -178,7 +297,6 @@ class Record:
         
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 records_table = qualified_table_name('records')
                 cursor.execute(
                     f"""
@@ -196,7 +314,6 @@ class Record:
         """Получение записей пользователя"""
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 records_table = qualified_table_name('records')
                 cursor.execute(
                     f"""
@@ -223,9 +340,8 @@ class Record:
         """
         start_utc, end_utc = msk_date_range_utc(target_date)
         
-        with get_db_connection() as conn:
+        with get_db_connection(read_only=True) as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 users_table = qualified_table_name('users')
                 records_table = qualified_table_name('records')
                 addresses_table = qualified_table_name('addresses')
@@ -319,50 +435,9 @@ class Record:
         Returns:
             Словарь с полной информацией о записи или None
         """
-        with get_db_connection() as conn:
+        with get_db_connection(read_only=True) as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
-                users_table = qualified_table_name('users')
-                records_table = qualified_table_name('records')
-                addresses_table = qualified_table_name('addresses')
-                
-                cursor.execute(
-                    f"""
-                    SELECT 
-                        r.id as record_id,
-                        r.user_id,
-                        r.record_type,
-                        r.timestamp,
-                        r.comment,
-                        r.latitude as record_latitude,
-                        r.longitude as record_longitude,
-                        r.address_id,
-                        r.created_at as record_created_at,
-                        r.photo_url,
-                        r.photo_uploaded_at,
-                        u.name as user_name,
-                        u.email as user_email,
-                        u.telegram_handle as user_telegram_handle,
-                        u.telegram_id as user_telegram_id,
-                        u.phone as user_phone,
-                        u.avatar_url as user_avatar_url,
-                        u.created_at as user_created_at,
-                        u.updated_at as user_updated_at,
-                        a.formatted_address,
-                        a.latitude as address_latitude,
-                        a.longitude as address_longitude,
-                        a.country,
-                        a.city,
-                        a.street,
-                        a.building,
-                        a.created_at as address_created_at
-                    FROM {records_table} r
-                    LEFT JOIN {users_table} u ON r.user_id = u.id
-                    LEFT JOIN {addresses_table} a ON r.address_id = a.id
-                    WHERE r.id = %s
-                    """,
-                    (record_id,)
-                )
+                execute_prepared(cursor, _GET_BY_ID_WITH_DETAILS, (record_id,))
                 result = cursor.fetchone()
                 
                 if not result:
@@ -429,9 +504,8 @@ class Record:
         Returns:
             Список словарей с записями и адресами
         """
-        with get_db_connection() as conn:
+        with get_db_connection(read_only=True) as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 records_table = qualified_table_name('records')
                 addresses_table = qualified_table_name('addresses')
                 
@@ -516,39 +590,11 @@ class Record:
         """
         start_utc, end_utc = msk_date_range_utc(target_date)
         
-        with get_db_connection() as conn:
+        with get_db_connection(read_only=True) as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
-                records_table = qualified_table_name('records')
-                addresses_table = qualified_table_name('addresses')
-                
-                cursor.execute(
-                    f"""
-                    SELECT 
-                        r.id as record_id,
-                        r.user_id,
-                        r.record_type,
-                        r.timestamp,
-                        r.comment,
-                        r.latitude as record_latitude,
-                        r.longitude as record_longitude,
-                        r.address_id,
-                        r.created_at as record_created_at,
-                        r.photo_url,
-                        a.formatted_address,
-                        a.latitude as address_latitude,
-                        a.longitude as address_longitude,
-                        a.country,
-                        a.city,
-                        a.street,
-                        a.building,
-                        a.created_at as address_created_at
-                    FROM {records_table} r
-                    LEFT JOIN {addresses_table} a ON r.address_id = a.id
-                    WHERE r.user_id = %s
-                    AND r.timestamp >= %s AND r.timestamp <= %s
-                    ORDER BY r.timestamp DESC
-                    """,
+                execute_prepared(
+                    cursor,
+                    _GET_BY_USER_AND_DATE_WITH_ADDRESSES,
                     (user_id, start_utc, end_utc)
                 )
                 results = cursor.fetchall()
@@ -588,135 +634,53 @@ class Record:
                     })
                 
                 return output
-    
+
+    # === Асинхронные версии для aiohttp handlers (не блокируют event loop) ===
+
     @staticmethod
-    def get_all_by_date_with_users_and_both_records(target_date: date) -> List[Dict[str, Any]]:
-        """
-        Получение всех пользователей с их записями arrival и departure за дату (оптимизировано с LATERAL JOIN)
-        
-        Args:
-            target_date: Целевая дата (MSK)
-            
-        Returns:
-            Список словарей с пользователями, их arrival_record и departure_record
-        """
-        start_utc, end_utc = msk_date_range_utc(target_date)
-        
-        with get_db_connection() as conn:
-            with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
-                users_table = qualified_table_name('users')
-                records_table = qualified_table_name('records')
-                addresses_table = qualified_table_name('addresses')
-                
-                # Формируем условие фильтрации админов
-                admin_filter = ""
-                if TELEGRAM_ADMIN_IDS:
-                    # Исключаем пользователей с telegram_id из списка админов
-                    admin_ids_str = ','.join(map(str, TELEGRAM_ADMIN_IDS))
-                    admin_filter = f"WHERE (u.telegram_id IS NULL OR u.telegram_id NOT IN ({admin_ids_str}))"
-                
-                cursor.execute(
-                    f"""
-                    SELECT 
-                        u.id as user_id,
-                        u.name as user_name,
-                        u.email as user_email,
-                        u.telegram_handle as user_telegram_handle,
-                        u.telegram_id as user_telegram_id,
-                        u.phone as user_phone,
-                        u.avatar_url as user_avatar_url,
-                        u.created_at as user_created_at,
-                        u.updated_at as user_updated_at,
-                        -- Arrival record
-                        arr.id as arrival_id,
-                        arr.timestamp as arrival_timestamp,
-                        arr.comment as arrival_comment,
-                        arr.latitude as arrival_latitude,
-                        arr.longitude as arrival_longitude,
-                        arr.photo_url as arrival_photo_url,
-                        arr_addr.formatted_address as arrival_address,
-                        -- Departure record
-                        dep.id as departure_id,
-                        dep.timestamp as departure_timestamp,
-                        dep.comment as departure_comment,
-                        dep.latitude as departure_latitude,
-                        dep.longitude as departure_longitude,
-                        dep.photo_url as departure_photo_url,
-                        dep_addr.formatted_address as departure_address
-                    FROM {users_table} u
-                    LEFT JOIN LATERAL (
-                        SELECT * FROM {records_table} 
-                        WHERE user_id = u.id 
-                        AND timestamp >= %s AND timestamp <= %s
-                        AND record_type = 'arrival'
-                        ORDER BY timestamp DESC 
-                        LIMIT 1
-                    ) arr ON true
-                    LEFT JOIN {addresses_table} arr_addr ON arr.address_id = arr_addr.id
-                    LEFT JOIN LATERAL (
-                        SELECT * FROM {records_table} 
-                        WHERE user_id = u.id 
-                        AND timestamp >= %s AND timestamp <= %s
-                        AND record_type = 'departure'
-                        ORDER BY timestamp DESC 
-                        LIMIT 1
-                    ) dep ON true
-                    LEFT JOIN {addresses_table} dep_addr ON dep.address_id = dep_addr.id
-                    {admin_filter}
-                    ORDER BY u.name
-                    """,
-                    (start_utc, end_utc, start_utc, end_utc)
-                )
-                results = cursor.fetchall()
-                
-                output = []
-                for row in results:
-                    user_data = {
-                        'id': row['user_id'],
-                        'name': row['user_name'],
-                        'email': row['user_email'],
-                        'telegram_handle': row['user_telegram_handle'],
-                        'telegram_id': row['user_telegram_id'],
-                        'phone': row['user_phone'],
-                        'avatar_url': row['user_avatar_url'],
-                        'created_at': row['user_created_at'].isoformat() if row['user_created_at'] else None,
-                        'updated_at': row['user_updated_at'].isoformat() if row['user_updated_at'] else None
-                    }
-                    
-                    arrival_record = None
-                    if row['arrival_id']:
-                        arrival_record = {
-                            'id': row['arrival_id'],
-                            'record_type': 'arrival',
-                            'timestamp': row['arrival_timestamp'].isoformat() if row['arrival_timestamp'] else None,
-                            'comment': row['arrival_comment'],
-                            'latitude': row['arrival_latitude'],
-                            'longitude': row['arrival_longitude'],
-                            'address': row['arrival_address'],
-                            'photo_url': row['arrival_photo_url'],
-                            'has_photo': bool(row['arrival_photo_url'])
-                        }
-                    
-                    departure_record = None
-                    if row['departure_id']:
-                        departure_record = {
-                            'id': row['departure_id'],
-                            'record_type': 'departure',
-                            'timestamp': row['departure_timestamp'].isoformat() if row['departure_timestamp'] else None,
-                            'comment': row['departure_comment'],
-                            'latitude': row['departure_latitude'],
-                            'longitude': row['departure_longitude'],
-                            'address': row['departure_address'],
-                            'photo_url': row['departure_photo_url'],
-                            'has_photo': bool(row['departure_photo_url'])
-                        }
-                    
-                    output.append({
-                        'user': user_data,
-                        'arrival_record': arrival_record,
-                        'departure_record': departure_record
-                    })
-                
-                return output
+    async def create_async(
+        user_id: int,
+        record_type: str,
+        latitude: float,
+        longitude: float,
+        address_id: Optional[int] = None,
+        comment: Optional[str] = None,
+        timestamp: Optional[datetime] = None,
+        geocode_pending: bool = False
+    ) -> 'Record':
+        """Асинхронное создание новой записи"""
+        return await run_db(
+            Record.create,
+            user_id=user_id,
+            record_type=record_type,
+            latitude=latitude,
+            longitude=longitude,
+            address_id=address_id,
+            comment=comment,
+            timestamp=timestamp,
+            geocode_pending=geocode_pending
+        )
+
+    @staticmethod
+    async def get_by_id_async(record_id: int) -> Optional['Record']:
+        """Асинхронное получение записи по ID"""
+        return await run_db(Record.get_by_id, record_id)
+
+    async def update_async(self) -> 'Record':
+        """Асинхронное обновление записи в базе данных"""
+        return await run_db(self.update)
 
+    @staticmethod
+    async def get_by_id_with_details_async(record_id: int) -> Optional[Dict[str, Any]]:
+        """Асинхронное получение записи с деталями пользователя и адреса"""
+        return await run_db(Record.get_by_id_with_details, record_id)
+
+    @staticmethod
+    async def get_by_user_with_addresses_async(user_id: int, limit: int = 100) -> List[Dict[str, Any]]:
+        """Асинхронное получение записей пользователя с адресами"""
+        return await run_db(Record.get_by_user_with_addresses, user_id, limit)
+
+    @staticmethod
+    async def get_by_user_and_date_with_addresses_async(user_id: int, target_date: date) -> List[Dict[str, Any]]:
+        """Асинхронное получение записей пользователя за дату с адресами"""
+        return await run_db(Record.get_by_user_and_date_with_addresses, user_id, target_date)
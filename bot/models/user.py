@@ -1,6 +1,22 @@
 """Модель пользователя"""
 from typing import Optional, List, Dict, Any
-from bot.utils.database import get_db_connection, get_db_cursor, set_search_path, qualified_table_name
+from bot.utils.database import (
+    get_db_connection, get_db_cursor, qualified_table_name, run_db,
+    prepared_statement, execute_prepared, mark_primary_write
+)
+from bot.utils.identity_cache import identity_cache
+
+# Prepared statements для горячих запросов (PREPARE один раз на соединение)
+_GET_BY_ID = prepared_statement(
+    'user_get_by_id',
+    f"SELECT * FROM {qualified_table_name('users')} WHERE id = $1",
+    ('integer',)
+)
+_GET_BY_TELEGRAM_ID = prepared_statement(
+    'user_get_by_telegram_id',
+    f"SELECT * FROM {qualified_table_name('users')} WHERE telegram_id = $1",
+    ('bigint',)
+)
 
 
 class User:
@@ -59,7 +75,6 @@ class User:
         """Создание нового пользователя"""
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 users_table = qualified_table_name('users')
                 cursor.execute(
                     f"""
@@ -70,16 +85,16 @@ class User:
                     (name, telegram_handle, email, telegram_id, phone, avatar_url)
                 )
                 result = cursor.fetchone()
-                return User.from_dict(dict(result))
+        # Отметка «неизвестный telegram_id» больше не верна
+        identity_cache.invalidate_user(result['id'], telegram_id)
+        return User.from_dict(dict(result))
     
     @staticmethod
     def get_by_id(user_id: int) -> Optional['User']:
         """Получение пользователя по ID"""
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
-                users_table = qualified_table_name('users')
-                cursor.execute(f"SELECT * FROM {users_table} WHERE id = %s", (user_id,))
+                execute_prepared(cursor, _GET_BY_ID, (user_id,))
                 result = cursor.fetchone()
                 return User.from_dict(dict(result)) if result else None
     
@@ -88,9 +103,7 @@ class User:
         """Получение пользователя по Telegram ID"""
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
-                users_table = qualified_table_name('users')
-                cursor.execute(f"SELECT * FROM {users_table} WHERE telegram_id = %s", (telegram_id,))
+                execute_prepared(cursor, _GET_BY_TELEGRAM_ID, (telegram_id,))
                 result = cursor.fetchone()
                 return User.from_dict(dict(result)) if result else None
     
@@ -107,7 +120,6 @@ class User:
 
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 users_table = qualified_table_name('users')
                 # Убираем @ из обеих сторон и сравниваем в нижнем регистре
                 # LTRIM убирает @ слева, LOWER приводит к нижнему регистру
@@ -121,9 +133,8 @@ class User:
     @staticmethod
     def get_all(exclude_admins: bool = False, admin_ids: List[int] = None) -> List['User']:
         """Получение всех пользователей"""
-        with get_db_connection() as conn:
+        with get_db_connection(read_only=True) as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 users_table = qualified_table_name('users')
                 if exclude_admins and admin_ids:
                     cursor.execute(
@@ -139,7 +150,6 @@ class User:
         """Обновление пользователя"""
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 users_table = qualified_table_name('users')
                 cursor.execute(
                     f"""
@@ -153,17 +163,21 @@ class User:
                      self.name, self.phone, self.avatar_url, self.id)
                 )
                 result = cursor.fetchone()
-                return User.from_dict(dict(result))
+                mark_primary_write()
+        # После фиксации транзакции: следующий запрос прочитает новую строку
+        identity_cache.invalidate_user(self.id, self.telegram_id)
+        return User.from_dict(dict(result))
     
     @staticmethod
     def delete(user_id: int) -> bool:
         """Удаление пользователя"""
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 users_table = qualified_table_name('users')
                 cursor.execute(f"DELETE FROM {users_table} WHERE id = %s", (user_id,))
-                return cursor.rowcount > 0
+                deleted = cursor.rowcount > 0
+        identity_cache.invalidate_user(user_id)
+        return deleted
 
     @staticmethod
     def get_all_as_dict() -> Dict[str, 'User']:
@@ -173,7 +187,6 @@ class User:
         """
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 users_table = qualified_table_name('users')
                 cursor.execute(f"SELECT * FROM {users_table}")
                 results = cursor.fetchall()
@@ -194,7 +207,6 @@ class User:
         """
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 users_table = qualified_table_name('users')
                 cursor.execute(f"SELECT LOWER(name) as name FROM {users_table}")
                 results = cursor.fetchall()
@@ -217,7 +229,6 @@ class User:
 
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 users_table = qualified_table_name('users')
 
                 # Подготовка данных для batch insert
@@ -258,7 +269,6 @@ class User:
 
         with get_db_connection() as conn:
             with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
                 users_table = qualified_table_name('users')
 
                 # Используем CASE для batch update
@@ -275,3 +285,28 @@ class User:
                 cursor.execute(query, names + [ids])
                 return cursor.rowcount
 
+    # === Асинхронные версии для aiohttp handlers (не блокируют event loop) ===
+
+    @staticmethod
+    async def get_by_id_async(user_id: int) -> Optional['User']:
+        """Асинхронное получение пользователя по ID"""
+        return await run_db(User.get_by_id, user_id)
+
+    @staticmethod
+    async def get_by_telegram_id_async(telegram_id: int) -> Optional['User']:
+        """Асинхронное получение пользователя по Telegram ID"""
+        return await run_db(User.get_by_telegram_id, telegram_id)
+
+    @staticmethod
+    async def get_by_telegram_handle_async(telegram_handle: str) -> Optional['User']:
+        """Асинхронное получение пользователя по Telegram handle"""
+        return await run_db(User.get_by_telegram_handle, telegram_handle)
+
+    @staticmethod
+    async def get_all_async(exclude_admins: bool = False, admin_ids: List[int] = None) -> List['User']:
+        """Асинхронное получение всех пользователей"""
+        return await run_db(User.get_all, exclude_admins=exclude_admins, admin_ids=admin_ids)
+
+    async def update_async(self) -> 'User':
+        """Асинхронное обновление пользователя"""
+        return await run_db(self.update)
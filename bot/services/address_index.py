@@ -0,0 +1,157 @@
+"""In-memory пространственный индекс адресов (поиск ближайшего без БД и геокодера)"""
+import logging
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+
+from bot.config import ADDRESS_INDEX_RADIUS_M, ADDRESS_INDEX_MAX_ENTRIES
+from bot.models.address import Address
+from bot.utils import metrics
+from bot.utils.database import get_db_connection, get_db_cursor, qualified_table_name
+
+logger = logging.getLogger(__name__)
+
+# Метров в градусе широты (и долготы на экваторе)
+_METERS_PER_DEGREE = 111_320
+
+_lookups = metrics.counter(
+    'address_index_lookups',
+    'In-memory address index lookups (result=hit|miss)'
+)
+
+
+class AddressIndex:
+    """
+    Сетка (grid hash) адресов в памяти процесса
+
+    Ячейка сетки по широте равна радиусу поиска, поэтому точка ищется в своей
+    ячейке и соседних. Количество адресов ограничено max_entries: при
+    переполнении вытесняются давно не использованные (LRU) - офисы, с которых
+    приходят почти все отметки, остаются в индексе.
+    """
+
+    def __init__(self, radius_m: float = ADDRESS_INDEX_RADIUS_M, max_entries: int = ADDRESS_INDEX_MAX_ENTRIES):
+        self.radius_m = radius_m
+        self.max_entries = max_entries
+        self._cell_deg = radius_m / _METERS_PER_DEGREE
+        self._lock = threading.Lock()
+        # {address_id: Address} в порядке использования (справа - недавние)
+        self._addresses: 'OrderedDict[int, Address]' = OrderedDict()
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return math.floor(latitude / self._cell_deg), math.floor(longitude / self._cell_deg)
+
+    def _distance_m(self, latitude: float, longitude: float, address: Address) -> float:
+        """Расстояние в метрах (равнопромежуточная проекция - точна на масштабе радиуса)"""
+        d_lat = (address.latitude - latitude) * _METERS_PER_DEGREE
+        d_lon = (address.longitude - longitude) * _METERS_PER_DEGREE * math.cos(math.radians(latitude))
+        return math.hypot(d_lat, d_lon)
+
+    def add(self, address: Address) -> None:
+        """Добавление адреса (или отметка об использовании, если уже есть)"""
+        if address is None or address.id is None:
+            return
+        with self._lock:
+            if address.id in self._addresses:
+                self._addresses.move_to_end(address.id)
+                return
+            self._addresses[address.id] = address
+            self._cells.setdefault(self._cell(address.latitude, address.longitude), set()).add(address.id)
+            while len(self._addresses) > self.max_entries:
+                self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        """Вытеснение давно не использованного адреса (вызывается под блокировкой)"""
+        address_id, address = self._addresses.popitem(last=False)
+        cell = self._cell(address.latitude, address.longitude)
+        cell_ids = self._cells.get(cell)
+        if cell_ids is not None:
+            cell_ids.discard(address_id)
+            if not cell_ids:
+                del self._cells[cell]
+
+    def nearest(self, latitude: float, longitude: float) -> Optional[Address]:
+        """
+        Ближайший известный адрес в пределах радиуса
+
+        Args:
+            latitude: Широта
+            longitude: Долгота
+
+        Returns:
+            Address или None
+        """
+        lat_cell, lon_cell = self._cell(latitude, longitude)
+        # По долготе градус короче, поэтому радиус покрывает больше ячеек
+        cos_lat = max(math.cos(math.radians(latitude)), 0.01)
+        lon_steps = math.ceil(1 / cos_lat)
+
+        best, best_distance = None, self.radius_m
+        with self._lock:
+            for d_lat in (-1, 0, 1):
+                for d_lon in range(-lon_steps, lon_steps + 1):
+                    for address_id in self._cells.get((lat_cell + d_lat, lon_cell + d_lon), ()):
+                        address = self._addresses[address_id]
+                        distance = self._distance_m(latitude, longitude, address)
+                        if distance <= best_distance:
+                            best, best_distance = address, distance
+            if best is not None:
+                self._addresses.move_to_end(best.id)
+
+        _lookups.inc(result='hit' if best is not None else 'miss')
+        return best
+
+    def load(self) -> int:
+        """
+        Загрузка адресов из БД (последние созданные, не больше max_entries)
+
+        Returns:
+            Количество загруженных адресов
+        """
+        with get_db_connection(read_only=True) as conn:
+            with get_db_cursor(conn) as cursor:
+                cursor.execute(
+                    f"""
+                    SELECT * FROM {qualified_table_name('addresses')}
+                    WHERE geo_cell IS NOT NULL
+                    ORDER BY id DESC
+                    LIMIT %s
+                    """,
+                    (self.max_entries,)
+                )
+                addresses: List[Address] = [Address.from_dict(dict(row)) for row in cursor.fetchall()]
+
+        # Самые новые добавляются последними - они вытесняются позже
+        for address in reversed(addresses):
+            self.add(address)
+        logger.info(f"Address index loaded: {len(addresses)} addresses")
+        return len(addresses)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._addresses)
+
+
+# Индекс процесса
+address_index = AddressIndex()
+
+metrics.gauge(
+    'address_index_size',
+    'Addresses held in the in-memory address index',
+    lambda: {'entries': len(address_index), 'max_entries': address_index.max_entries}
+)
+
+
+async def find_known_address(latitude: float, longitude: float) -> Optional[Address]:
+    """
+    Уже известный адрес рядом с координатами (без геокодера)
+
+    Сначала in-memory индекс, затем БД; найденный в БД адрес добавляется в индекс.
+    """
+    address = address_index.nearest(latitude, longitude)
+    if not address:
+        address = await Address.get_by_coordinates_async(latitude, longitude)
+        address_index.add(address)
+    return address
@@ -0,0 +1,94 @@
+"""Кэш дашборда сотрудников за день с точечным обновлением при записи"""
+import logging
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from bot.config import EMPLOYEES_BOARD_TTL, RESPONSE_CACHE_STALE_TTL
+from bot.models.daily_attendance import DailyAttendance
+from bot.utils.response_cache import ResponseCache, day_tag, invalidate_tags
+from bot.utils.shared_state import broadcast, get_shared_state, on_broadcast
+from bot.services.today_board import today_board
+
+logger = logging.getLogger(__name__)
+
+# Дашборд за день (ключ - дата MSK). Записи сотрудников обновляют свою строку
+# в кэше, поэтому полная пересборка нужна только при холодном старте, смене
+# состава сотрудников (тег 'users') или по истечении EMPLOYEES_BOARD_TTL
+_board_cache = ResponseCache(
+    'employees', ttl=EMPLOYEES_BOARD_TTL, stale_ttl=RESPONSE_CACHE_STALE_TTL, max_size=31
+)
+
+
+async def get_board(target_date: date) -> List[Dict[str, Any]]:
+    """
+    Сотрудники с первым приходом и последним уходом за дату (MSK), из кэша
+
+    Args:
+        target_date: Целевая дата
+
+    Returns:
+        Список словарей с user, arrival_record и departure_record
+    """
+    return await _board_cache.get_or_load(
+        target_date,
+        lambda: DailyAttendance.get_board_by_date_async(target_date),
+        tags=(day_tag(target_date), 'users')
+    )
+
+
+def _replace_entry(board: List[Dict[str, Any]], entry: Optional[Dict[str, Any]], user_id: int):
+    """
+    Замена строки сотрудника в закэшированном дашборде
+
+    entry None - пользователя нет на дашборде (админ или удален): его строка
+    убирается, если была. Новый сотрудник (строки нет) - None, дашборд
+    пересобирается целиком, чтобы сохранить порядок по имени.
+    """
+    for index, current in enumerate(board):
+        if current['user']['id'] == user_id:
+            if entry is None:
+                del board[index]
+            else:
+                board[index] = entry
+            return board
+    return board if entry is None else None
+
+
+async def refresh_board_entry(user_id: int, target_date: date) -> None:
+    """
+    Обновление строки сотрудника в дашборде после изменения его записей
+
+    Строка читается из дневной сводки по первичному ключу и применяется к
+    кэшу дашборда за дату и к доске текущего дня - в этом процессе и, через
+    рассылку, в остальных. Рассылка нужна, даже если в этом процессе дашборда
+    за дату нет: он может быть закэширован в другом. Чтение пропускается,
+    только если процесс один и строка ему не нужна.
+
+    Args:
+        user_id: ID пользователя
+        target_date: Дата (MSK) измененных записей
+    """
+    needed_locally = _board_cache.has(target_date) or today_board.tracks(target_date)
+    if not needed_locally and not get_shared_state().shared:
+        return
+    try:
+        entry = await DailyAttendance.get_board_entry_async(user_id, target_date)
+    except Exception as e:
+        logger.warning(f"Board entry refresh failed for user {user_id} on {target_date}: {e}")
+        invalidate_tags(day_tag(target_date))
+        return
+    await _apply_entry(user_id, target_date, entry)
+    # Остальные процессы применяют ту же строку без чтения из БД (реплика может отставать)
+    broadcast('board_entry', {'user_id': user_id, 'day': target_date.isoformat(), 'entry': entry})
+
+
+async def _apply_entry(user_id: int, target_date: date, entry: Optional[Dict[str, Any]]) -> None:
+    _board_cache.patch(target_date, lambda board: _replace_entry(board, entry, user_id))
+    await today_board.update_entry(user_id, target_date, entry)
+
+
+def _on_board_entry(data: Dict[str, Any]):
+    return _apply_entry(data['user_id'], date.fromisoformat(data['day']), data['entry'])
+
+
+on_broadcast('board_entry', _on_board_entry)
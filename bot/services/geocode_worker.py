@@ -0,0 +1,153 @@
+"""Фоновое геокодирование записей из очереди geocode_queue"""
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from bot.config import (
+    GEOCODE_QUEUE_BATCH_SIZE, GEOCODE_QUEUE_MAX_ATTEMPTS,
+    GEOCODE_QUEUE_RETRY_BASE, GEOCODE_QUEUE_RETRY_MAX
+)
+from bot.models.address import Address
+from bot.models.daily_attendance import attendance_day
+from bot.models.geocode_queue import GeocodeQueue
+from bot.services.address_index import address_index, find_known_address
+from bot.services.employees_board import refresh_board_entry
+from bot.services.yandex_maps import YandexMapsService
+from bot.utils import metrics
+from bot.utils.response_cache import invalidate_tags
+
+logger = logging.getLogger(__name__)
+
+_jobs = metrics.counter(
+    'geocode_queue_jobs',
+    'Background geocoding jobs (result=resolved|retry|failed)'
+)
+
+# Сигнал о новой задаче: обработчик не ждет конца интервала опроса
+_wakeup: Optional[asyncio.Event] = None
+
+
+def notify_geocode_worker() -> None:
+    """Разбудить обработчик очереди (вызывается после постановки записи в очередь)"""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def retry_delay(attempts: int) -> float:
+    """Задержка перед следующей попыткой: экспоненциальный рост до GEOCODE_QUEUE_RETRY_MAX"""
+    return min(GEOCODE_QUEUE_RETRY_BASE * 2 ** (attempts - 1), GEOCODE_QUEUE_RETRY_MAX)
+
+
+async def resolve_address(latitude: float, longitude: float) -> Optional[Address]:
+    """
+    Адрес по координатам: уже известный адрес рядом или ответ геокодера
+
+    Returns:
+        Address или None, если геокодер не вернул адрес
+    """
+    address = await find_known_address(latitude, longitude)
+    if address:
+        return address
+
+    # Получаем адрес из Яндекс.Карт
+    address_data = await YandexMapsService.get_address_by_coordinates(latitude, longitude)
+    if not address_data:
+        return None
+
+    address = await Address.create_async(
+        formatted_address=address_data['formatted_address'],
+        latitude=latitude,
+        longitude=longitude,
+        country=address_data.get('country'),
+        city=address_data.get('city'),
+        street=address_data.get('street'),
+        building=address_data.get('building')
+    )
+    address_index.add(address)
+    return address
+
+
+async def _process_job(job: Dict[str, Any]) -> None:
+    """Обработка одной задачи: адрес в запись, иначе повтор с задержкой или отказ"""
+    record_id = job['record_id']
+    error = None
+    try:
+        address = await resolve_address(job['latitude'], job['longitude'])
+    except Exception as e:
+        address, error = None, str(e)
+    else:
+        if address is None:
+            error = 'Геокодер не вернул адрес'
+
+    if address is not None:
+        user_id = await GeocodeQueue.complete_async(record_id, job['record_timestamp'], address.id)
+        if user_id is not None:
+            await refresh_board_entry(user_id, attendance_day(job['record_timestamp']))
+            invalidate_tags(f"record:{record_id}", f"user:{user_id}")
+        _jobs.inc(result='resolved')
+        return
+
+    if job['attempts'] >= GEOCODE_QUEUE_MAX_ATTEMPTS:
+        # Запись остается с координатами без адреса
+        await GeocodeQueue.complete_async(record_id, job['record_timestamp'], None)
+        _jobs.inc(result='failed')
+        logger.warning(f"Geocoding of record {record_id} abandoned after {job['attempts']} attempts: {error}")
+        return
+
+    delay = retry_delay(job['attempts'])
+    await GeocodeQueue.retry_async(record_id, delay, error)
+    _jobs.inc(result='retry')
+    logger.info(f"Geocoding of record {record_id} failed (attempt {job['attempts']}), retry in {delay:.0f}s: {error}")
+
+
+async def process_geocode_queue(batch_size: int = GEOCODE_QUEUE_BATCH_SIZE) -> int:
+    """
+    Обработка одной пачки задач очереди
+
+    Задачи пачки обрабатываются параллельно: одинаковые координаты
+    схлопываются в один запрос к геокодеру (single-flight в YandexMapsService).
+
+    Returns:
+        Количество взятых задач
+    """
+    jobs = await GeocodeQueue.claim_batch_async(batch_size)
+    if not jobs:
+        return 0
+
+    results = await asyncio.gather(*(_process_job(job) for job in jobs), return_exceptions=True)
+    for job, result in zip(jobs, results):
+        if isinstance(result, Exception):
+            # Задача вернется в очередь по истечении аренды
+            logger.warning(f"Geocode job for record {job['record_id']} failed: {result}")
+    return len(jobs)
+
+
+async def geocode_worker_loop(interval_seconds: float):
+    """
+    Фоновая задача разбора очереди геокодирования
+
+    Пока пачки приходят полными, следующая берется сразу; иначе обработчик
+    ждет интервал опроса или сигнала notify_geocode_worker().
+
+    Args:
+        interval_seconds: Интервал опроса очереди
+    """
+    global _wakeup
+    _wakeup = asyncio.Event()
+
+    while True:
+        # Сигнал, пришедший во время обработки, не теряется
+        _wakeup.clear()
+        try:
+            processed = await process_geocode_queue()
+        except Exception as e:
+            logger.warning(f"Geocode queue processing failed: {e}")
+            processed = 0
+
+        if processed >= GEOCODE_QUEUE_BATCH_SIZE:
+            continue
+
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout=interval_seconds)
+        except asyncio.TimeoutError:
+            pass
@@ -5,10 +5,14 @@ from typing import List, Optional, Dict, Any
 from datetime import datetime, date
 from bot.models.record import Record
 from bot.models.address import Address
-from bot.services.yandex_maps import YandexMapsService
+from bot.models.daily_attendance import DailyAttendance, attendance_day
+from bot.services.address_index import find_known_address
+from bot.services.geocode_worker import notify_geocode_worker
+from bot.services.employees_board import refresh_board_entry
 from bot.services.s3_service import S3Service
 from bot.services.image_processor import ImageProcessor
 from bot.utils.timezone import now_msk
+from bot.utils.response_cache import invalidate_tags
 import logging
 
 logger = logging.getLogger(__name__)
@@ -41,40 +45,36 @@ class RecordService:
         Returns:
             Созданная запись
         """
-        # Получаем или создаем адрес
-        address = Address.get_by_coordinates(latitude, longitude)
-        
-        if not address:
-            # Получаем адрес из Яндекс.Карт
-            address_data = await YandexMapsService.get_address_by_coordinates(latitude, longitude)
-            
-            if address_data:
-                address = Address.create(
-                    formatted_address=address_data['formatted_address'],
-                    latitude=latitude,
-                    longitude=longitude,
-                    country=address_data.get('country'),
-                    city=address_data.get('city'),
-                    street=address_data.get('street'),
-                    building=address_data.get('building')
-                )
+        # Известный адрес рядом (память, затем БД). Геокодер здесь не вызывается:
+        # запись без адреса создается сразу и ставится в очередь geocode_queue,
+        # адрес проставит фоновый обработчик (bot/services/geocode_worker.py)
+        address = await find_known_address(latitude, longitude)
         
         # Создаем запись
-        record = Record.create(
+        record = await Record.create_async(
             user_id=user_id,
             record_type=record_type,
             latitude=latitude,
             longitude=longitude,
             address_id=address.id if address else None,
-            comment=comment
+            comment=comment,
+            geocode_pending=address is None
         )
         
+        if address is None:
+            notify_geocode_worker()
+        
+        # В кэше дашборда обновляется только строка этого сотрудника
+        await refresh_board_entry(user_id, attendance_day(record.timestamp))
+        invalidate_tags(f"user:{user_id}")
+        
         return record
     
     @staticmethod
-    def get_records_by_date(target_date: date) -> List[Dict[str, Any]]:
+    async def get_records_by_date(target_date: date) -> List[Dict[str, Any]]:
         """
-        Получение записей за определенную дату с обеими записями arrival/departure (оптимизировано с LATERAL JOIN)
+        Получение записей за определенную дату с первым приходом и последним уходом
+        (из дневной сводки daily_attendance - поиск по первичным ключам)
         
         Args:
             target_date: Целевая дата
@@ -82,11 +82,10 @@ class RecordService:
         Returns:
             Список словарей с информацией о пользователях, их arrival_record и departure_record
         """
-        # Используем новый оптимизированный метод с LATERAL JOIN для получения обеих записей
-        return Record.get_all_by_date_with_users_and_both_records(target_date)
+        return await DailyAttendance.get_board_by_date_async(target_date)
     
     @staticmethod
-    def get_record_details(record_id: int) -> Optional[Dict[str, Any]]:
+    async def get_record_details(record_id: int) -> Optional[Dict[str, Any]]:
         """
         Получение детальной информации о записи (оптимизировано с JOIN)
         
@@ -97,10 +96,10 @@ class RecordService:
             Словарь с информацией о записи или None
         """
         # Используем оптимизированный метод с JOIN вместо 3 отдельных запросов
-        return Record.get_by_id_with_details(record_id)
+        return await Record.get_by_id_with_details_async(record_id)
     
     @staticmethod
-    def get_user_records(user_id: int, limit: int = 100) -> List[Dict[str, Any]]:
+    async def get_user_records(user_id: int, limit: int = 100) -> List[Dict[str, Any]]:
         """
         Получение записей пользователя (оптимизировано с JOIN)
         
@@ -112,10 +111,10 @@ class RecordService:
             Список записей с адресами
         """
         # Используем оптимизированный метод с JOIN вместо N+1 запросов
-        return Record.get_by_user_with_addresses(user_id, limit)
+        return await Record.get_by_user_with_addresses_async(user_id, limit)
     
     @staticmethod
-    def get_user_records_by_date(user_id: int, target_date: date) -> List[Dict[str, Any]]:
+    async def get_user_records_by_date(user_id: int, target_date: date) -> List[Dict[str, Any]]:
         """
         Получение записей конкретного пользователя за определенную дату (оптимизировано с JOIN)
         
@@ -127,7 +126,7 @@ class RecordService:
             Список записей с адресами
         """
         # Используем оптимизированный метод с JOIN
-        return Record.get_by_user_and_date_with_addresses(user_id, target_date)
+        return await Record.get_by_user_and_date_with_addresses_async(user_id, target_date)
     
     @staticmethod
     async def upload_photo(record_id: int, photo_data: bytes, user_id: int) -> Dict[str, Any]:
@@ -147,7 +146,7 @@ class RecordService:
             Exception: При ошибке загрузки
         """
         # Получаем запись
-        record = Record.get_by_id(record_id)
+        record = await Record.get_by_id_async(record_id)
         if not record:
             raise ValueError('Запись не найдена')
         
@@ -181,7 +180,9 @@ class RecordService:
         # Обновление записи в БД
         record.photo_url = photo_url
         record.photo_uploaded_at = now_msk()  # Используем московское время
-        record = record.update()
+        record = await record.update_async()
+        await refresh_board_entry(record.user_id, attendance_day(record.timestamp))
+        invalidate_tags(f"record:{record_id}", f"user:{record.user_id}")
         
         logger.info(f"Photo uploaded for record {record_id}: {photo_url}")
         
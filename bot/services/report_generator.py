@@ -5,9 +5,9 @@ from io import BytesIO
 
 from weasyprint import HTML
 
-from bot.utils.database import get_db_connection, get_db_cursor, set_search_path, qualified_table_name
-from bot.utils.timezone import now_msk, msk_date_range_utc
-from bot.config import TELEGRAM_ADMIN_IDS, WORK_START_HOUR, WORK_END_HOUR
+from bot.models.daily_attendance import DailyAttendance
+from bot.utils.timezone import now_msk, to_msk
+from bot.config import WORK_START_HOUR, WORK_END_HOUR
 
 
 class DisciplineReportGenerator:
@@ -37,76 +37,31 @@ class DisciplineReportGenerator:
         return count
     
     def _get_employees_data(self) -> List[Dict[str, Any]]:
-        """Получение данных о сотрудниках"""
-        with get_db_connection() as conn:
-            with get_db_cursor(conn) as cursor:
-                set_search_path(cursor)
-                users_table = qualified_table_name('users')
-                records_table = qualified_table_name('records')
-                
-                admin_filter = ""
-                if TELEGRAM_ADMIN_IDS:
-                    admin_filter = f"AND (u.telegram_id IS NULL OR u.telegram_id NOT IN ({','.join(map(str, TELEGRAM_ADMIN_IDS))}))"
-                
-                query = f"""
-                    SELECT 
-                        u.id, u.name, u.telegram_id,
-                        r.id as record_id, r.record_type, r.timestamp, r.comment, r.photo_url
-                    FROM {users_table} u
-                    LEFT JOIN {records_table} r ON r.user_id = u.id
-                        AND DATE(r.timestamp) BETWEEN %s AND %s
-                    WHERE 1=1 {admin_filter}
-                    ORDER BY u.name, r.timestamp
-                """
-                
-                cursor.execute(query, (self.date_from, self.date_to))
-                results = cursor.fetchall()
-                
-                employees = {}
-                for row in results:
-                    user_id = row['id']
-                    if user_id not in employees:
-                        employees[user_id] = {'id': user_id, 'name': row['name'], 'records': []}
-                    
-                    if row['record_id']:
-                        employees[user_id]['records'].append({
-                            'type': row['record_type'],
-                            'timestamp': row['timestamp'],
-                            'comment': row['comment'],
-                            'has_photo': bool(row['photo_url'])
-                        })
-                
-                return list(employees.values())
+        """
+        Получение данных о сотрудниках из дневной сводки daily_attendance
+        (только чтение - может выполняться на реплике)
+        """
+        return DailyAttendance.get_by_period(self.date_from, self.date_to)
     
     def _calculate_employee_stats(self, employee: Dict[str, Any]) -> Dict[str, Any]:
-        """Расчет статистики сотрудника"""
-        records = employee['records']
-        daily_records = {}
-        
-        for record in records:
-            record_date = record['timestamp'].date()
-            if record_date not in daily_records:
-                daily_records[record_date] = {'arrival': None, 'departure': None}
-            
-            if record['type'] == 'arrival' and daily_records[record_date]['arrival'] is None:
-                daily_records[record_date]['arrival'] = record
-            elif record['type'] == 'departure' and daily_records[record_date]['departure'] is None:
-                daily_records[record_date]['departure'] = record
+        """Расчет статистики сотрудника по дневной сводке (первый приход / последний уход)"""
+        days = employee['days']
         
         arrivals, departures = [], []
         late_count, early_leave_count = 0, 0
-        photo_count = sum(1 for r in records if r['has_photo'])
-        comment_count = sum(1 for r in records if r['comment'])
+        photo_count = sum(day['photo_count'] for day in days)
+        comment_count = sum(day['comment_count'] for day in days)
         
-        for day_data in daily_records.values():
-            if day_data['arrival']:
-                arrival_time = day_data['arrival']['timestamp'].time()
+        for day in days:
+            # В БД время хранится в UTC, статистика считается по MSK
+            if day['arrival_at']:
+                arrival_time = to_msk(day['arrival_at']).time()
                 arrivals.append(arrival_time)
                 if arrival_time > self.WORK_START:
                     late_count += 1
             
-            if day_data['departure']:
-                departure_time = day_data['departure']['timestamp'].time()
+            if day['departure_at']:
+                departure_time = to_msk(day['departure_at']).time()
                 departures.append(departure_time)
                 if departure_time < self.WORK_END:
                     early_leave_count += 1
@@ -117,7 +72,7 @@ class DisciplineReportGenerator:
         
         return {
             'name': employee['name'],
-            'total_records': len(records),
+            'total_records': sum(day['records_count'] for day in days),
             'avg_arrival': self._calculate_average_time(arrivals) if arrivals else None,
             'avg_departure': self._calculate_average_time(departures) if departures else None,
             'late_count': late_count,
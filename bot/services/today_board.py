@@ -0,0 +1,391 @@
+"""Колоночная in-memory доска текущего дня (MSK): дашборд без запросов к БД"""
+import asyncio
+import json
+import logging
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bot.models.address import Address
+from bot.models.daily_attendance import DailyAttendance
+from bot.utils import metrics
+from bot.utils.geo import coordinates_label
+from bot.utils.response_cache import add_invalidation_listener, day_tag
+from bot.utils.timezone import MSK, now_msk, today_msk
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+_RECORD_TYPES = ('arrival', 'departure')
+# Код последней записи в колонке last_type
+_LAST_TYPE_CODES = {None: 0, 'arrival': 1, 'departure': 2}
+_LAST_TYPE_NAMES = {code: name for name, code in _LAST_TYPE_CODES.items()}
+
+_reads = metrics.counter(
+    'today_board_reads',
+    'Reads answered by the in-memory today board (endpoint, result=hit|fallback)'
+)
+
+
+def _to_micros(timestamp) -> int:
+    """Время записи (UTC без tz, datetime или ISO-строка) в микросекунды от эпохи; 0 - нет записи"""
+    if timestamp is None:
+        return 0
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return (timestamp - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(micros: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+class _Columns:
+    """Колонки одного типа записи (приход или уход); индекс - слот сотрудника"""
+
+    __slots__ = ('record_id', 'timestamp', 'latitude', 'longitude', 'address_id',
+                 'has_photo', 'photo_url', 'comment')
+
+    def __init__(self, size: int):
+        self.record_id = array('q', bytes(8 * size))
+        self.timestamp = array('q', bytes(8 * size))
+        self.latitude = array('d', bytes(8 * size))
+        self.longitude = array('d', bytes(8 * size))
+        self.address_id = array('q', bytes(8 * size))
+        self.has_photo = bytearray(size)
+        # Редкие строковые поля - в списках
+        self.photo_url: List[Optional[str]] = [None] * size
+        self.comment: List[Optional[str]] = [None] * size
+
+    def set(self, slot: int, record: Optional[Dict[str, Any]]) -> None:
+        """Запись прихода/ухода из строки дашборда в слот (None - очистка)"""
+        if record is None:
+            self.record_id[slot] = 0
+            self.timestamp[slot] = 0
+            self.latitude[slot] = 0.0
+            self.longitude[slot] = 0.0
+            self.address_id[slot] = 0
+            self.has_photo[slot] = 0
+            self.photo_url[slot] = None
+            self.comment[slot] = None
+            return
+        self.record_id[slot] = record['id']
+        self.timestamp[slot] = _to_micros(record['timestamp'])
+        self.latitude[slot] = record['latitude'] or 0.0
+        self.longitude[slot] = record['longitude'] or 0.0
+        self.address_id[slot] = record['address_id'] or 0
+        self.has_photo[slot] = 1 if record['photo_url'] else 0
+        self.photo_url[slot] = record['photo_url']
+        self.comment[slot] = record['comment']
+
+
+class TodayBoard:
+    """
+    Дашборд текущего дня MSK в памяти процесса
+
+    Данные сотрудников хранятся по колонкам (array/bytearray), слот сотрудника
+    находится по user_id через словарь. Доска загружается один раз за день из
+    дневной сводки, затем обновляется точечно при записи (create_record,
+    upload_photo, фоновое геокодирование) и перезагружается в полночь MSK и
+    при смене состава сотрудников. Готовые JSON-ответы кэшируются до
+    следующего изменения.
+    """
+
+    def __init__(self):
+        self.day: Optional[date] = None
+        self._slots: Dict[int, int] = {}
+        self._users: List[Dict[str, Any]] = []
+        self._columns: Dict[str, _Columns] = {}
+        self._last_type = bytearray()
+        # Адреса, на которые ссылаются записи дня: {address_id: Address.to_dict()}
+        self._addresses: Dict[int, Dict[str, Any]] = {}
+        self._version = 0
+        self._bodies: Dict[str, Tuple[int, bytes]] = {}
+        self._stale = True
+        self._loading: Optional[asyncio.Task] = None
+        # Строки, обновленные во время загрузки: применяются к новой доске
+        self._pending: Dict[int, Optional[Dict[str, Any]]] = {}
+
+    # === Загрузка ===
+
+    def is_ready(self, target_date: Optional[date] = None) -> bool:
+        """Доска загружена и относится к target_date (по умолчанию - к сегодняшнему дню MSK)"""
+        day = today_msk()
+        if self.day != day:
+            self._stale = True
+            self.schedule_reload()
+            return False
+        if self._stale:
+            self.schedule_reload()
+        return target_date is None or target_date == day
+
+    def schedule_reload(self) -> None:
+        """Фоновая перезагрузка (если еще не идет); без event loop - ничего"""
+        if self._is_loading():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._loading = loop.create_task(self._load())
+        self._loading.add_done_callback(self._on_loaded)
+
+    def _on_loaded(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Today board load failed: {task.exception()}")
+
+    async def reload(self) -> None:
+        """Загрузка доски за сегодня (MSK) с ожиданием результата"""
+        self.schedule_reload()
+        if self._loading is not None:
+            await asyncio.shield(self._loading)
+
+    async def _load(self) -> int:
+        """
+        Загрузка доски за сегодня (MSK)
+
+        Returns:
+            Количество сотрудников на доске
+        """
+        day = today_msk()
+        self._pending = {}
+        board = await DailyAttendance.get_board_by_date_async(day)
+        address_ids = {
+            entry[f'{record_type}_record']['address_id']
+            for entry in board for record_type in _RECORD_TYPES
+            if entry[f'{record_type}_record'] and entry[f'{record_type}_record']['address_id']
+        }
+        addresses = await Address.get_by_ids_async(address_ids)
+
+        size = len(board)
+        slots: Dict[int, int] = {}
+        users: List[Dict[str, Any]] = []
+        columns = {record_type: _Columns(size) for record_type in _RECORD_TYPES}
+        last_type = bytearray(size)
+        for slot, entry in enumerate(board):
+            slots[entry['user']['id']] = slot
+            users.append(entry['user'])
+            for record_type in _RECORD_TYPES:
+                columns[record_type].set(slot, entry[f'{record_type}_record'])
+            last_type[slot] = _LAST_TYPE_CODES.get(entry['last_record_type'], 0)
+
+        # Переключение без await: читатели видят либо старую, либо новую доску.
+        # Адреса за тот же день объединяются - их могли добавить обновления во время загрузки
+        if day != self.day:
+            self._addresses = {}
+        self._addresses.update((address.id, address.to_dict()) for address in addresses)
+        self.day = day
+        self._slots, self._users, self._columns, self._last_type = slots, users, columns, last_type
+        self._stale = False
+        self._touch()
+
+        pending, self._pending = self._pending, {}
+        for user_id, entry in pending.items():
+            if not self._apply(user_id, entry):
+                # Новый сотрудник появился во время загрузки
+                self._stale = True
+        logger.info(f"Today board loaded for {day}: {size} employees")
+        return size
+
+    def tracks(self, target_date: date) -> bool:
+        """Относятся ли изменения за target_date к доске (загруженной или загружающейся)"""
+        return target_date == self.day or (self._is_loading() and target_date == today_msk())
+
+    def _is_loading(self) -> bool:
+        return self._loading is not None and not self._loading.done()
+
+    def _touch(self) -> None:
+        self._version += 1
+        self._bodies.clear()
+
+    # === Обновление ===
+
+    async def update_entry(self, user_id: int, target_date: date, entry: Optional[Dict[str, Any]]) -> None:
+        """
+        Точечное обновление строки сотрудника после изменения его записей
+
+        Args:
+            user_id: ID пользователя
+            target_date: День (MSK) изменения
+            entry: Строка дашборда (DailyAttendance.get_board_entry) или None
+        """
+        if not self.tracks(target_date):
+            return
+        for record_type in _RECORD_TYPES:
+            record = entry and entry[f'{record_type}_record']
+            address_id = record and record['address_id']
+            if address_id and address_id not in self._addresses:
+                address = await Address.get_by_id_async(address_id)
+                if address:
+                    self._addresses[address.id] = address.to_dict()
+        if self._is_loading():
+            self._pending[user_id] = entry
+        if target_date != self.day:
+            return
+        if not self._apply(user_id, entry):
+            # Сотрудника нет на доске - состав изменился
+            self._stale = True
+            self.schedule_reload()
+
+    def _apply(self, user_id: int, entry: Optional[Dict[str, Any]]) -> bool:
+        slot = self._slots.get(user_id)
+        if slot is None:
+            # Админов (entry None) на доске нет - обновлять нечего
+            return entry is None
+        if entry is None:
+            # Пользователь больше не показывается на дашборде
+            self._stale = True
+            self.schedule_reload()
+            return True
+        self._users[slot] = entry['user']
+        for record_type in _RECORD_TYPES:
+            self._columns[record_type].set(slot, entry[f'{record_type}_record'])
+        self._last_type[slot] = _LAST_TYPE_CODES.get(entry['last_record_type'], 0)
+        self._touch()
+        return True
+
+    def _on_invalidate(self, tags) -> None:
+        """Смена состава сотрудников или массовое изменение дня - перезагрузка"""
+        if 'users' in tags or (self.day is not None and day_tag(self.day) in tags):
+            self._stale = True
+            self.schedule_reload()
+
+    # === Чтение ===
+
+    def _record(self, slot: int, record_type: str) -> Optional[Dict[str, Any]]:
+        """Запись прихода/ухода в формате дашборда"""
+        columns = self._columns[record_type]
+        if not columns.record_id[slot]:
+            return None
+        latitude, longitude = columns.latitude[slot], columns.longitude[slot]
+        address_id = columns.address_id[slot] or None
+        address = self._addresses.get(address_id) if address_id else None
+        formatted_address = address['formatted_address'] if address else None
+        photo_url = columns.photo_url[slot]
+        return {
+            'id': columns.record_id[slot],
+            'record_type': record_type,
+            'timestamp': _from_micros(columns.timestamp[slot]).isoformat(),
+            'comment': columns.comment[slot],
+            'latitude': latitude,
+            'longitude': longitude,
+            'address': formatted_address if formatted_address is not None else coordinates_label(latitude, longitude),
+            'address_pending': formatted_address is None,
+            'address_id': address_id,
+            'photo_url': photo_url,
+            'has_photo': bool(columns.has_photo[slot])
+        }
+
+    def _body(self, name: str, build) -> bytes:
+        cached = self._bodies.get(name)
+        if cached is not None and cached[0] == self._version:
+            return cached[1]
+        body = json.dumps(build()).encode('utf-8')
+        self._bodies[name] = (self._version, body)
+        return body
+
+    def employees_body(self) -> bytes:
+        """JSON-ответ /api/employees за сегодня"""
+        def build():
+            return {
+                'date': self.day.isoformat(),
+                'employees': [
+                    {
+                        'user': self._users[slot],
+                        'arrival_record': self._record(slot, 'arrival'),
+                        'departure_record': self._record(slot, 'departure'),
+                        'last_record_type': _LAST_TYPE_NAMES[self._last_type[slot]]
+                    }
+                    for slot in range(len(self._users))
+                ]
+            }
+        return self._body('employees', build)
+
+    def current_locations_body(self) -> bytes:
+        """JSON-ответ /api/current-locations: последняя отметка каждого отметившегося"""
+        def build():
+            locations = []
+            arrival, departure = self._columns['arrival'], self._columns['departure']
+            for slot in range(len(self._users)):
+                record_type = 'departure' if departure.record_id[slot] else 'arrival'
+                columns = departure if record_type == 'departure' else arrival
+                if not columns.record_id[slot] or not columns.latitude[slot] or not columns.longitude[slot]:
+                    continue
+                record = self._record(slot, record_type)
+                locations.append({
+                    'user': self._users[slot],
+                    'latitude': record['latitude'],
+                    'longitude': record['longitude'],
+                    'timestamp': record['timestamp'],
+                    'address': record['address'],
+                    'record_type': record_type
+                })
+            return {'locations': locations}
+        return self._body('current_locations', build)
+
+    def user_status(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Статус пользователя за сегодня в формате /api/user/today-status
+
+        Returns:
+            Словарь ответа или None, если пользователя нет на доске (например, админ)
+        """
+        slot = self._slots.get(user_id)
+        if slot is None:
+            return None
+        response_data = {
+            'has_arrival': False,
+            'has_departure': False,
+            'last_record_type': _LAST_TYPE_NAMES[self._last_type[slot]],
+            'arrival_record': None,
+            'departure_record': None
+        }
+        for record_type in _RECORD_TYPES:
+            columns = self._columns[record_type]
+            if not columns.record_id[slot]:
+                continue
+            address_id = columns.address_id[slot]
+            response_data[f'has_{record_type}'] = True
+            response_data[f'{record_type}_record'] = {
+                # Время в формате HH:MM
+                'time': _from_micros(columns.timestamp[slot]).strftime('%H:%M'),
+                'address': self._addresses.get(address_id) if address_id else None
+            }
+        return response_data
+
+    def stats(self) -> Dict[str, Any]:
+        """Размер доски для метрик"""
+        return {
+            'day': self.day.isoformat() if self.day else None,
+            'employees': len(self._users),
+            'addresses': len(self._addresses),
+            'version': self._version
+        }
+
+
+def _seconds_until_midnight_msk() -> float:
+    now = now_msk()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=MSK)
+    return max((midnight - now).total_seconds(), 0)
+
+
+async def today_board_rollover_loop():
+    """Фоновая задача: перезагрузка доски на новый день сразу после полуночи MSK"""
+    while True:
+        await asyncio.sleep(_seconds_until_midnight_msk() + 1)
+        try:
+            await today_board.reload()
+        except Exception as e:
+            logger.warning(f"Today board rollover failed: {e}")
+
+
+def record_read(endpoint: str, hit: bool) -> None:
+    """Учет чтения доски в метриках"""
+    _reads.inc(endpoint=endpoint, result='hit' if hit else 'fallback')
+
+
+# Доска процесса
+today_board = TodayBoard()
+add_invalidation_listener(today_board._on_invalidate)
+
+metrics.gauge('today_board_size', 'In-memory today board size', today_board.stats)
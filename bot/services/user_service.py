@@ -1,8 +1,12 @@
 """Сервис для работы с пользователями"""
+import logging
 from typing import List, Optional
 import openpyxl
 from bot.models.user import User
 from bot.config import TELEGRAM_ADMIN_IDS
+from bot.utils.identity_cache import identity_cache, UserSnapshot
+
+logger = logging.getLogger(__name__)
 
 
 class UserService:
@@ -151,6 +155,73 @@ class UserService:
         """
         return User.get_by_telegram_handle(telegram_handle)
     
+    @staticmethod
+    async def get_user_by_telegram_id_async(telegram_id: int) -> Optional[User]:
+        """
+        Асинхронное получение пользователя по Telegram ID (для aiohttp handlers)
+        
+        Args:
+            telegram_id: Telegram ID пользователя
+            
+        Returns:
+            Пользователь или None
+        """
+        return await User.get_by_telegram_id_async(telegram_id)
+    
+    @staticmethod
+    async def get_user_by_telegram_handle_async(telegram_handle: str) -> Optional[User]:
+        """
+        Асинхронное получение пользователя по Telegram handle (для aiohttp handlers)
+        
+        Args:
+            telegram_handle: Telegram handle пользователя
+            
+        Returns:
+            Пользователь или None
+        """
+        return await User.get_by_telegram_handle_async(telegram_handle)
+    
+    @staticmethod
+    async def resolve_telegram_user_async(telegram_id: int, username: Optional[str] = None) -> Optional[UserSnapshot]:
+        """
+        Пользователь, от имени которого пришел запрос (через кэш идентификации)
+
+        Сначала ищет по telegram_id, затем по username; пользователю, найденному
+        по handle без telegram_id, telegram_id записывается. Неизвестные id
+        кэшируются отрицательно, чтобы запросы посторонних не шли в БД.
+
+        Args:
+            telegram_id: Telegram ID пользователя
+            username: Telegram username (без @ или с @)
+
+        Returns:
+            Снимок пользователя или None
+        """
+        snapshot = identity_cache.get(telegram_id)
+        if snapshot is not None or identity_cache.is_unknown(telegram_id):
+            return snapshot
+
+        version = identity_cache.version
+        user = await User.get_by_telegram_id_async(telegram_id)
+        if not user and username:
+            telegram_handle = username if username.startswith('@') else f"@{username}"
+            user = await User.get_by_telegram_handle_async(telegram_handle)
+            if user and not user.telegram_id:
+                user.telegram_id = telegram_id
+                user = await user.update_async()
+                version = identity_cache.version
+                logger.info(f"Updated telegram_id for user {user.name} (handle: {telegram_handle})")
+
+        if not user:
+            identity_cache.put_unknown(telegram_id, version)
+            return None
+
+        snapshot = UserSnapshot.from_user(user)
+        # Пользователь, найденный по handle с другим telegram_id, не кэшируется
+        if user.telegram_id == telegram_id:
+            identity_cache.put(snapshot, version)
+        return snapshot
+
     @staticmethod
     def update_user_telegram_id(user_id: int, telegram_id: int) -> Optional[User]:
         """
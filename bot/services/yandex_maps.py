@@ -1,17 +1,45 @@
 """Сервис для работы с Яндекс.Картами"""
+import asyncio
 import time
 import logging
-import aiohttp
-from typing import Optional, Dict, Any
-from bot.config import YANDEX_MAPS_API_KEY
+from typing import Optional, Dict, Any, Set
+from bot.config import (
+    YANDEX_MAPS_API_KEY, GEOCODE_NEGATIVE_TTL, GEOCODE_CACHE_TTL, GEOCODE_CACHE_MAX_SIZE,
+    GEOCODER_BREAKER_FAILURES, GEOCODER_BREAKER_RESET_SECONDS, GEOCODER_SLOW_CALL_MS
+)
+from bot.models.geocode_cache import GeocodeCacheStore
+from bot.utils import metrics
+from bot.utils.lru_cache import TTLCache
+from bot.utils.circuit_breaker import CircuitBreaker
+from bot.utils.http_client import get_http_session, track_upstream
 
 logger = logging.getLogger(__name__)
 
-# Кэш для геокодирования (координаты -> адрес)
-# Формат: {rounded_coords: (address_data, timestamp)}
-_geocode_cache: Dict[str, tuple] = {}
-_GEOCODE_CACHE_TTL = 86400  # 24 часа - адреса редко меняются
-_GEOCODE_CACHE_MAX_SIZE = 1000  # Максимум 1000 записей
+# Кэш для геокодирования (округленные координаты -> адрес).
+# Дублируется в таблицу geocode_cache и загружается из нее при старте
+_geocode_cache = TTLCache('geocode', max_size=GEOCODE_CACHE_MAX_SIZE, ttl=GEOCODE_CACHE_TTL)
+
+# Кэш неудач: пустой ответ или ошибка не повторяются раньше GEOCODE_NEGATIVE_TTL
+_negative_cache = TTLCache('geocode_negative', max_size=GEOCODE_CACHE_MAX_SIZE, ttl=GEOCODE_NEGATIVE_TTL)
+
+# Фоновые сохранения в geocode_cache (ссылки, чтобы задачи не собрал GC)
+_persist_tasks: Set[asyncio.Task] = set()
+
+# Запросы в полете: параллельные вызовы для тех же координат ждут один запрос
+_inflight: Dict[str, asyncio.Future] = {}
+
+_breaker = CircuitBreaker(
+    'yandex_geocoder',
+    failure_threshold=GEOCODER_BREAKER_FAILURES,
+    reset_timeout=GEOCODER_BREAKER_RESET_SECONDS,
+    slow_call_ms=GEOCODER_SLOW_CALL_MS
+)
+
+_geocode_requests = metrics.counter(
+    'geocode_requests',
+    'Reverse geocode calls (result=cache_hit|negative_hit|coalesced|breaker_open|upstream)'
+)
+metrics.gauge('geocoder_breaker_state', 'Yandex geocoder circuit breaker state', lambda: _breaker.state)
 
 
 def _round_coords(latitude: float, longitude: float) -> str:
@@ -22,6 +50,36 @@ def _round_coords(latitude: float, longitude: float) -> str:
     return f"{latitude:.4f},{longitude:.4f}"
 
 
+def _remember_failure(cache_key: str) -> None:
+    """Запоминаем неудачу для координат на GEOCODE_NEGATIVE_TTL"""
+    _negative_cache.set(cache_key, True)
+
+
+async def _persist(cache_key: str, data: Dict[str, Any]) -> None:
+    try:
+        await GeocodeCacheStore.save_async(cache_key, data)
+    except Exception as e:
+        logger.warning(f"Failed to persist geocode cache entry {cache_key}: {e}")
+
+
+def warm_geocode_cache() -> int:
+    """
+    Загрузка кэша геокодирования из таблицы geocode_cache (при старте)
+
+    Просроченные записи удаляются из таблицы, свежие загружаются в память
+    от старых к новым, чтобы новые дольше оставались в LRU.
+
+    Returns:
+        Количество загруженных записей
+    """
+    GeocodeCacheStore.purge_expired(GEOCODE_CACHE_TTL)
+    entries = GeocodeCacheStore.load_recent(GEOCODE_CACHE_TTL, GEOCODE_CACHE_MAX_SIZE)
+    for cache_key, data, stored_at in reversed(entries):
+        _geocode_cache.set(cache_key, data, stored_at=stored_at)
+    logger.info(f"Geocode cache warmed: {len(entries)} entries")
+    return len(entries)
+
+
 class YandexMapsService:
     """Сервис для работы с Яндекс.Картами"""
 
@@ -32,6 +90,11 @@ class YandexMapsService:
         """
         Получение адреса по координатам с кэшированием
 
+        Параллельные вызовы для тех же (округленных) координат объединяются в
+        один запрос к API. Неудачи кэшируются ненадолго, а при серии ошибок или
+        медленных ответов circuit breaker временно отключает запросы - тогда
+        сразу возвращается None и вызывающий код показывает координаты.
+
         Args:
             latitude: Широта
             longitude: Долгота
@@ -41,12 +104,42 @@ class YandexMapsService:
         """
         # Проверяем кэш
         cache_key = _round_coords(latitude, longitude)
-        if cache_key in _geocode_cache:
-            data, timestamp = _geocode_cache[cache_key]
-            if time.time() - timestamp < _GEOCODE_CACHE_TTL:
-                logger.debug(f"Geocode cache hit for {cache_key}")
-                return data
+        data = _geocode_cache.get(cache_key)
+        if data is not None:
+            logger.debug(f"Geocode cache hit for {cache_key}")
+            _geocode_requests.inc(result='cache_hit')
+            return data
+
+        # Недавняя неудача для этих координат
+        if _negative_cache.get(cache_key):
+            _geocode_requests.inc(result='negative_hit')
+            return None
 
+        # Запрос для этих координат уже выполняется - ждем его результат
+        inflight = _inflight.get(cache_key)
+        if inflight is not None:
+            _geocode_requests.inc(result='coalesced')
+            return await asyncio.shield(inflight)
+
+        if not _breaker.allow_request():
+            _geocode_requests.inc(result='breaker_open')
+            return None
+
+        _geocode_requests.inc(result='upstream')
+        future = asyncio.get_running_loop().create_future()
+        _inflight[cache_key] = future
+        result = None
+        try:
+            result = await YandexMapsService._fetch_address(latitude, longitude, cache_key)
+        finally:
+            _inflight.pop(cache_key, None)
+            # При отмене ведущего вызова ожидающие получают None (запасной вариант)
+            future.set_result(result)
+        return result
+
+    @staticmethod
+    async def _fetch_address(latitude: float, longitude: float, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Запрос к API геокодера с учетом в кэшах и circuit breaker"""
         params = {
             'apikey': YANDEX_MAPS_API_KEY,
             'geocode': f"{longitude},{latitude}",
@@ -55,67 +148,78 @@ class YandexMapsService:
             'lang': 'ru_RU'
         }
 
+        started = time.monotonic()
         try:
-            async with aiohttp.ClientSession() as session:
+            session = get_http_session()
+            async with track_upstream('yandex_geocoder') as outcome:
                 async with session.get(YandexMapsService.GEOCODE_URL, params=params) as response:
                     if response.status != 200:
+                        outcome['value'] = 'http_error'
+                        logger.warning(f"Geocoder returned HTTP {response.status} for {cache_key}")
+                        _breaker.record_failure()
+                        _remember_failure(cache_key)
                         return None
                     
                     data = await response.json()
-                    
-                    # Извлекаем информацию об адресе
-                    geo_objects = data.get('response', {}).get('GeoObjectCollection', {}).get('featureMember', [])
-                    
-                    if not geo_objects:
-                        return None
-                    
-                    geo_object = geo_objects[0].get('GeoObject', {})
-                    formatted_address = geo_object.get('metaDataProperty', {}).get('GeocoderMetaData', {}).get('text', '')
-                    
-                    # Парсим компоненты адреса
-                    address_components = geo_object.get('metaDataProperty', {}).get('GeocoderMetaData', {}).get('Address', {}).get('Components', [])
-                    
-                    country = None
-                    city = None
-                    street = None
-                    building = None
-                    
-                    for component in address_components:
-                        kind = component.get('kind')
-                        name = component.get('name')
-                        
-                        if kind == 'country':
-                            country = name
-                        elif kind in ['province', 'locality']:
-                            city = name
-                        elif kind == 'street':
-                            street = name
-                        elif kind == 'house':
-                            building = name
-                    
-                    result = {
-                        'formatted_address': formatted_address,
-                        'country': country,
-                        'city': city,
-                        'street': street,
-                        'building': building,
-                        'latitude': latitude,
-                        'longitude': longitude
-                    }
-
-                    # Сохраняем в кэш
-                    _geocode_cache[cache_key] = (result, time.time())
-                    logger.debug(f"Geocode cache miss for {cache_key}, saved to cache")
-
-                    # Очищаем старые записи если кэш переполнен
-                    if len(_geocode_cache) > _GEOCODE_CACHE_MAX_SIZE:
-                        # Удаляем самую старую запись
-                        oldest_key = min(_geocode_cache.keys(), key=lambda k: _geocode_cache[k][1])
-                        del _geocode_cache[oldest_key]
-
-                    return result
-
+        except asyncio.CancelledError:
+            _breaker.record_cancelled()
+            raise
         except Exception as e:
             logger.error(f"Ошибка при получении адреса: {e}")
+            _breaker.record_failure()
+            _remember_failure(cache_key)
             return None
 
+        _breaker.record_success((time.monotonic() - started) * 1000)
+
+        # Извлекаем информацию об адресе
+        geo_objects = data.get('response', {}).get('GeoObjectCollection', {}).get('featureMember', [])
+        
+        if not geo_objects:
+            # Пустой ответ - не ошибка сервиса, но повторять запрос сразу бессмысленно
+            _remember_failure(cache_key)
+            return None
+        
+        geo_object = geo_objects[0].get('GeoObject', {})
+        formatted_address = geo_object.get('metaDataProperty', {}).get('GeocoderMetaData', {}).get('text', '')
+        
+        # Парсим компоненты адреса
+        address_components = geo_object.get('metaDataProperty', {}).get('GeocoderMetaData', {}).get('Address', {}).get('Components', [])
+        
+        country = None
+        city = None
+        street = None
+        building = None
+        
+        for component in address_components:
+            kind = component.get('kind')
+            name = component.get('name')
+            
+            if kind == 'country':
+                country = name
+            elif kind in ['province', 'locality']:
+                city = name
+            elif kind == 'street':
+                street = name
+            elif kind == 'house':
+                building = name
+        
+        result = {
+            'formatted_address': formatted_address,
+            'country': country,
+            'city': city,
+            'street': street,
+            'building': building,
+            'latitude': latitude,
+            'longitude': longitude
+        }
+
+        # Сохраняем в кэш (LRU вытесняет давно не использованные записи за O(1))
+        # и в фоне - в таблицу geocode_cache, чтобы кэш пережил перезапуск
+        _geocode_cache.set(cache_key, result)
+        logger.debug(f"Geocode cache miss for {cache_key}, saved to cache")
+        task = asyncio.create_task(_persist(cache_key, result))
+        _persist_tasks.add(task)
+        task.add_done_callback(_persist_tasks.discard)
+
+        return result
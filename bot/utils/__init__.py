@@ -1,4 +1,4 @@
 """Утилиты"""
-from bot.utils.timezone import now_msk, today_msk, to_msk, ensure_msk, msk_date_range_utc, MSK
+from bot.utils.timezone import now_msk, today_msk, to_msk, ensure_msk, msk_date_range_utc, msk_period_range_utc, MSK
 
-__all__ = ['now_msk', 'today_msk', 'to_msk', 'ensure_msk', 'msk_date_range_utc', 'MSK']
+__all__ = ['now_msk', 'today_msk', 'to_msk', 'ensure_msk', 'msk_date_range_utc', 'msk_period_range_utc', 'MSK']
@@ -0,0 +1,160 @@
+"""Снимок горячих кэшей процесса на диске и восстановление после перезапуска"""
+import asyncio
+import json
+import logging
+import os
+import pickle
+import time
+import zlib
+from typing import Any, Dict, Optional
+
+from bot.config import CACHE_SNAPSHOT_PATH, CACHE_SNAPSHOT_MAX_AGE
+from bot.migrations.run import get_migration_files
+from bot.utils import lru_cache, metrics, response_cache
+
+logger = logging.getLogger(__name__)
+
+# Формат файла: сигнатура, строка JSON-заголовка, затем zlib(pickle(кэши)).
+# Заголовок проверяется до распаковки, поэтому снимок чужой версии не читается
+_MAGIC = b'ISTRA-CACHE-SNAPSHOT\n'
+# Увеличивается при изменении формата файла или структуры кэшируемых значений
+_FORMAT_VERSION = 1
+
+_snapshots = metrics.counter(
+    'cache_snapshots',
+    'Cache snapshot operations (op=save|restore, result=ok|skipped|failed)'
+)
+
+
+def _schema_version() -> str:
+    """Последняя миграция: значения кэшей повторяют строки БД этой схемы"""
+    migrations = get_migration_files()
+    return migrations[-1] if migrations else ''
+
+
+def _collect() -> Dict[str, Any]:
+    """Записи всех кэшей процесса по именам (вызывается в потоке event loop)"""
+    return {
+        'response': {cache.name: cache.export_entries() for cache in response_cache._caches},
+        'ttl': {cache.name: cache.export_entries() for cache in lru_cache._caches if cache.snapshot},
+    }
+
+
+def _write(path: str, header: Dict[str, Any], payload: bytes) -> int:
+    """Атомарная запись файла снимка: временный файл и rename"""
+    data = _MAGIC + json.dumps(header).encode() + b'\n' + zlib.compress(payload, 6)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+async def save_cache_snapshot(path: str = CACHE_SNAPSHOT_PATH) -> Optional[int]:
+    """
+    Сохранение снимка кэшей
+
+    Записи собираются и сериализуются в event loop (кэши ответов не
+    потокобезопасны), сжатие и запись на диск идут в executor.
+
+    Args:
+        path: Путь к файлу снимка (пустой - снимки отключены)
+
+    Returns:
+        Размер файла в байтах или None, если снимок не сохранен
+    """
+    if not path:
+        return None
+    try:
+        payload = pickle.dumps(_collect(), protocol=pickle.HIGHEST_PROTOCOL)
+        header = {
+            'format': _FORMAT_VERSION,
+            'schema': _schema_version(),
+            'created_at': time.time(),
+        }
+        loop = asyncio.get_running_loop()
+        size = await loop.run_in_executor(None, _write, path, header, payload)
+    except Exception as e:
+        _snapshots.inc(op='save', result='failed')
+        logger.warning(f"Cache snapshot save failed: {e}")
+        return None
+    _snapshots.inc(op='save', result='ok')
+    logger.debug(f"Cache snapshot saved: {path} ({size} bytes)")
+    return size
+
+
+def restore_cache_snapshot(path: str = CACHE_SNAPSHOT_PATH, max_age: float = CACHE_SNAPSHOT_MAX_AGE) -> int:
+    """
+    Восстановление кэшей из снимка при запуске
+
+    Снимок пропускается, если он другой версии формата, снят на другой схеме
+    БД или старше max_age. Записи кэшей ответов восстанавливаются с пометкой
+    проверки (первое чтение перезагружает их в фоне), записи TTL-кэшей
+    (геокодирование: координаты -> адрес) - с исходным временем сохранения.
+    Кэши, которых нет в текущей версии, игнорируются.
+
+    Args:
+        path: Путь к файлу снимка
+        max_age: Максимальный возраст снимка (секунды)
+
+    Returns:
+        Количество восстановленных записей
+    """
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(_MAGIC):
+            raise ValueError("unknown file signature")
+        header_line, _, body = data[len(_MAGIC):].partition(b'\n')
+        header = json.loads(header_line)
+
+        age = time.time() - header.get('created_at', 0)
+        reason = None
+        if header.get('format') != _FORMAT_VERSION:
+            reason = f"format {header.get('format')}"
+        elif header.get('schema') != _schema_version():
+            reason = f"schema {header.get('schema')}"
+        elif not 0 <= age <= max_age:
+            reason = f"age {age:.0f}s"
+        if reason:
+            _snapshots.inc(op='restore', result='skipped')
+            logger.info(f"Cache snapshot skipped ({reason})")
+            return 0
+
+        caches = pickle.loads(zlib.decompress(body))
+        restored = 0
+        for cache in response_cache._caches:
+            restored += cache.import_entries(caches['response'].get(cache.name, ()), extra_age=age)
+        for cache in lru_cache._caches:
+            if cache.snapshot:
+                restored += cache.import_entries(caches['ttl'].get(cache.name, ()))
+    except Exception as e:
+        _snapshots.inc(op='restore', result='failed')
+        logger.warning(f"Cache snapshot restore failed: {e}")
+        return 0
+
+    _snapshots.inc(op='restore', result='ok')
+    logger.info(f"Cache snapshot restored: {restored} entries (snapshot age {age:.0f}s)")
+    return restored
+
+
+async def cache_snapshot_loop(interval_seconds: float):
+    """
+    Фоновая задача периодического сохранения снимка
+
+    Снимок при остановке сохраняется отдельно (on_shutdown); периодический
+    нужен на случай аварийного завершения процесса.
+
+    Args:
+        interval_seconds: Интервал между сохранениями
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        await save_cache_snapshot()
@@ -0,0 +1,84 @@
+"""Circuit breaker для вызовов внешних сервисов"""
+import logging
+import threading
+import time
+
+from bot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_state_changes = metrics.counter(
+    'circuit_breaker_transitions',
+    'Circuit breaker state transitions (breaker, state=open|half_open|closed)'
+)
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи для внешнего сервиса
+
+    После failure_threshold неудач подряд (ошибки и слишком медленные ответы)
+    цепь размыкается на reset_timeout секунд: вызовы сразу отклоняются и
+    вызывающий код использует запасной вариант. По истечении времени один
+    пробный вызов (half-open) решает, замкнуть цепь снова или нет.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, slow_call_ms: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call_ms = slow_call_ms
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            self.state = state
+            _state_changes.inc(breaker=self.name, state=state)
+            logger.warning(f"Circuit breaker '{self.name}' is now {state}")
+
+    def allow_request(self) -> bool:
+        """Можно ли выполнить вызов сейчас"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._set_state(self.HALF_OPEN)
+            # Half-open: пропускаем только один пробный вызов
+            if self._trial_in_progress:
+                return False
+            self._trial_in_progress = True
+            return True
+
+    def record_success(self, duration_ms: float) -> None:
+        """Учет успешного вызова (медленный вызов считается неудачей)"""
+        if duration_ms > self.slow_call_ms:
+            self.record_failure()
+            return
+        with self._lock:
+            self._failures = 0
+            self._trial_in_progress = False
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        """Учет неудачного вызова"""
+        with self._lock:
+            self._failures += 1
+            self._trial_in_progress = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                self._set_state(self.OPEN)
+
+    def record_cancelled(self) -> None:
+        """Вызов отменен до ответа: результат неизвестен, пробный слот освобождается"""
+        with self._lock:
+            self._trial_in_progress = False
@@ -1,59 +1,462 @@
 """Утилиты для работы с базой данных"""
+import asyncio
+import contextvars
+import functools
+import threading
 import psycopg2
-from psycopg2 import pool
+import psycopg2.errors
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Generator, Optional
+from typing import Any, Callable, Dict, Generator, Hashable, Optional, Sequence, Tuple, TypeVar
 import logging
 import os
+import time
 import sys
 import importlib.util
 from pathlib import Path
-from bot.config import DATABASE_URL, DB_SCHEMA
+from bot.config import (
+    DATABASE_URL, DATABASE_REPLICA_URL, DB_SCHEMA, DB_POOL_ACQUIRE_TIMEOUT, DB_REPLICA_RYW_SECONDS,
+    DB_REPLICA_ACQUIRE_TIMEOUT, DB_SLOW_QUERY_MS, DB_SLOW_QUERY_EXPLAIN
+)
+from bot.utils import metrics
+from bot.utils.db_pool import BoundedConnectionPool, PoolTimeoutError
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar('T')
+
 # Глобальный пул соединений
-_connection_pool: Optional[pool.ThreadedConnectionPool] = None
+_connection_pool: Optional[BoundedConnectionPool] = None
+
+# Пул соединений с read-only репликой (если задан DB_REPLICA_HOST)
+_replica_pool: Optional[BoundedConnectionPool] = None
+
+# Автор запросов текущего контекста для read-your-writes (пользователь запроса
+# API; None - фоновые задачи и бот). run_db передает контекст в executor
+_db_writer: contextvars.ContextVar[Optional[Hashable]] = contextvars.ContextVar('db_writer', default=None)
+
+# Время последней записи в primary по авторам: {writer: time.monotonic()}
+_recent_writes: Dict[Optional[Hashable], float] = {}
+_recent_writes_lock = threading.Lock()
+
+# Executor для синхронных DB вызовов из async кода (aiohttp handlers)
+# Размер совпадает с maxconn пула: каждый поток держит не более одного соединения,
+# поэтому потоки не конкурируют за соединения сверх размера пула
+_db_executor: Optional[ThreadPoolExecutor] = None
+
+
+class ConfiguredConnection(psycopg2.extensions.connection):
+    """
+    Соединение, настроенное при создании
+
+    search_path передается в параметрах запуска сессии (options), поэтому
+    отдельный SET search_path на каждый запрос не нужен.
+    Также хранит имена prepared statements, подготовленных в этой сессии.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Соединение уже выдавалось из пула (без него checkout проверял бы его SELECT 1)
+        self.checked_out = False
+        self.prepared_statements = set()
+        # Устаревшие statements, которые нужно удалить перед повторным PREPARE
+        self.stale_statements = set()
+
+
+# Параметры, с которыми создается каждое соединение (пул и прямые соединения)
+CONNECTION_KWARGS = {
+    'options': f"-c search_path={DB_SCHEMA},public",
+    'connection_factory': ConfiguredConnection,
+}
+
+# Счетчик сэкономленных round trip к БД (по видам: liveness_probe)
+db_round_trips_saved = metrics.counter(
+    'db_round_trips_saved',
+    'Round trips skipped thanks to per-connection setup (no SELECT 1 when reusing a pooled connection)'
+)
+_dead_connections = metrics.counter(
+    'db_dead_connections',
+    'Dead connections discarded (by background check or on first failure)'
+)
+_direct_connections = metrics.counter(
+    'db_direct_connections',
+    'Direct connections opened outside the pool (pool not initialized)'
+)
+_read_routing = metrics.counter(
+    'db_read_routing',
+    'Read-only checkouts by target (replica, primary_ryw, primary_fallback, primary)'
+)
+metrics.gauge(
+    'db_pool',
+    'Connection pool state per pool: checked_out, idle, size, maxconn, waiters',
+    lambda: {
+        'primary': _connection_pool.stats() if _connection_pool else None,
+        'replica': _replica_pool.stats() if _replica_pool else None,
+    }
+)
+
+
+class PreparedStatement:
+    """
+    Серверный prepared statement
+
+    SQL использует позиционные параметры $1, $2, ... PREPARE выполняется один
+    раз на соединение при первом использовании, дальше запрос выполняется
+    через EXECUTE по имени без повторного разбора и планирования.
+    """
+
+    def __init__(self, name: str, sql: str, param_types: Tuple[str, ...] = ()):
+        self.name = name
+        self.sql = sql
+        self.param_types = param_types
+
+    @property
+    def prepare_sql(self) -> str:
+        types = f" ({', '.join(self.param_types)})" if self.param_types else ''
+        return f"PREPARE {self.name}{types} AS {self.sql}"
+
+    @property
+    def execute_sql(self) -> str:
+        if not self.param_types:
+            return f"EXECUTE {self.name}"
+        return f"EXECUTE {self.name} ({', '.join(['%s'] * len(self.param_types))})"
+
+
+# Реестр prepared statements: {имя: PreparedStatement}
+_prepared_statements: Dict[str, PreparedStatement] = {}
+
+_prepared_events = metrics.counter(
+    'db_prepared_statements',
+    'Prepared statement events (event=prepare|execute|reprepare)'
+)
+
+
+def prepared_statement(name: str, sql: str, param_types: Tuple[str, ...] = ()) -> PreparedStatement:
+    """
+    Регистрация prepared statement (вызывается на уровне модуля модели)
+
+    Args:
+        name: Уникальное имя statement (идентификатор SQL)
+        sql: Текст запроса с параметрами $1, $2, ...
+        param_types: Типы параметров PostgreSQL
+
+    Returns:
+        Зарегистрированный PreparedStatement
+    """
+    existing = _prepared_statements.get(name)
+    if existing is not None and existing.sql != sql:
+        raise ValueError(f"Prepared statement {name} already registered with different SQL")
+    statement = PreparedStatement(name, sql, tuple(param_types))
+    _prepared_statements[name] = statement
+    return statement
+
+
+def _is_stale_prepared(error: Exception) -> bool:
+    """
+    Prepared statement сессии больше нельзя выполнить, но можно подготовить заново
+
+    InvalidSqlStatementName - сессия потеряла statements (DISCARD ALL и т.п.),
+    "cached plan must not change result type" - изменилась структура таблицы
+    (миграция добавила столбец в SELECT *).
+    """
+    if isinstance(error, psycopg2.errors.InvalidSqlStatementName):
+        return True
+    return (
+        isinstance(error, psycopg2.errors.FeatureNotSupported)
+        and 'cached plan must not change result type' in str(error)
+    )
+
+
+def _forget_stale(connection, statement: PreparedStatement, error: Exception) -> None:
+    """Сброс учета устаревших prepared statements соединения"""
+    if isinstance(error, psycopg2.errors.InvalidSqlStatementName):
+        # Сессия потеряла все prepared statements
+        connection.prepared_statements.clear()
+    else:
+        # Statement остался на сервере: перед новым PREPARE его нужно удалить
+        connection.prepared_statements.discard(statement.name)
+        connection.stale_statements.add(statement.name)
+    _prepared_events.inc(event='reprepare')
+
+
+def _execute_prepared_once(cursor, statement: PreparedStatement, params: tuple) -> None:
+    connection = cursor.connection
+    if statement.name not in connection.prepared_statements:
+        sql = statement.prepare_sql
+        if statement.name in connection.stale_statements:
+            # DEALLOCATE в том же round trip, что и PREPARE
+            sql = f"DEALLOCATE {statement.name}; {sql}"
+        cursor.execute(sql)
+        connection.stale_statements.discard(statement.name)
+        connection.prepared_statements.add(statement.name)
+        _prepared_events.inc(event='prepare')
+    cursor.execute(statement.execute_sql, params)
+
+
+def execute_prepared(cursor, statement: PreparedStatement, params: Sequence[Any] = ()) -> None:
+    """
+    Выполнение prepared statement на соединении курсора
+
+    Если statement сессии устарел (_is_stale_prepared), учет соединения
+    сбрасывается. Вне транзакции неудачная попытка откатывается и запрос
+    сразу повторяется с новым PREPARE. Внутри начатой транзакции ошибка
+    прерывает ее, и всю единицу работы повторяет run_db: savepoint вокруг
+    каждого запроса стоил бы двух лишних round trip.
+
+    Args:
+        cursor: Курсор базы данных
+        statement: Зарегистрированный PreparedStatement
+        params: Значения параметров
+    """
+    connection = cursor.connection
+    params = tuple(params)
+    in_transaction = connection.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    try:
+        _execute_prepared_once(cursor, statement, params)
+    except psycopg2.Error as e:
+        if not _is_stale_prepared(e):
+            raise
+        _forget_stale(connection, statement, e)
+        if in_transaction:
+            raise
+        connection.rollback()
+        _execute_prepared_once(cursor, statement, params)
+    _prepared_events.inc(event='execute')
 
 
-def init_connection_pool(minconn: int = 1, maxconn: int = 20):
+def _retry_stale_prepared(func: Callable[..., T], *args: Any) -> T:
+    """
+    Вызов единицы работы с одним повтором после устаревшего prepared statement
+
+    Транзакция прерванной попытки уже откачена get_db_connection, учет
+    statements соединения сброшен execute_prepared.
+    """
+    try:
+        return func(*args)
+    except psycopg2.Error as e:
+        if not _is_stale_prepared(e):
+            raise
+        logger.info(f"Retrying after stale prepared statement: {e}")
+        return func(*args)
+
+
+def _connect():
+    """Создание прямого соединения с теми же параметрами, что и в пуле"""
+    return psycopg2.connect(DATABASE_URL, **CONNECTION_KWARGS)
+
+
+def _is_connection_error(error: Exception) -> bool:
+    """Ошибка означает, что соединение непригодно для дальнейшего использования"""
+    return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
+def init_connection_pool(minconn: int = 1, maxconn: int = 20, acquire_timeout: float = DB_POOL_ACQUIRE_TIMEOUT):
     """
     Инициализация пула соединений с БД
     
     Args:
         minconn: Минимальное количество соединений
         maxconn: Максимальное количество соединений
+        acquire_timeout: Максимальное время ожидания свободного соединения (секунды)
     """
-    global _connection_pool
+    global _connection_pool, _replica_pool, _db_executor
     try:
-        _connection_pool = pool.ThreadedConnectionPool(
+        _connection_pool = BoundedConnectionPool(
             minconn,
             maxconn,
-            DATABASE_URL
+            DATABASE_URL,
+            acquire_timeout=acquire_timeout,
+            **CONNECTION_KWARGS
+        )
+        logger.info(
+            f"Connection pool initialized: {minconn}-{maxconn} connections, "
+            f"acquire timeout {acquire_timeout}s"
         )
-        logger.info(f"Connection pool initialized: {minconn}-{maxconn} connections")
     except Exception as e:
         logger.error(f"Failed to initialize connection pool: {e}")
         raise
 
+    executor_workers = maxconn
+    if DATABASE_REPLICA_URL:
+        try:
+            _replica_pool = BoundedConnectionPool(
+                minconn,
+                maxconn,
+                DATABASE_REPLICA_URL,
+                acquire_timeout=DB_REPLICA_ACQUIRE_TIMEOUT,
+                name='replica',
+                **CONNECTION_KWARGS
+            )
+            executor_workers += maxconn
+            logger.info(f"Replica connection pool initialized: {minconn}-{maxconn} connections")
+        except Exception as e:
+            # Реплика опциональна: без нее все чтения идут в primary
+            _replica_pool = None
+            logger.error(f"Failed to initialize replica pool, reads will use primary: {e}")
+
+    _db_executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix='db')
+
 
 def close_connection_pool():
     """Закрытие пула соединений"""
-    global _connection_pool
+    global _connection_pool, _replica_pool, _db_executor
+    if _db_executor:
+        _db_executor.shutdown(wait=True)
+        _db_executor = None
+    if _replica_pool:
+        _replica_pool.closeall()
+        _replica_pool = None
+        logger.info("Replica connection pool closed")
     if _connection_pool:
         _connection_pool.closeall()
         _connection_pool = None
         logger.info("Connection pool closed")
 
 
+async def close_connection_pool_async():
+    """
+    Закрытие пула соединений из event loop
+
+    Ожидание оставшихся запросов исполнителя и закрытие соединений выполняются
+    в отдельном потоке, чтобы не блокировать event loop при остановке.
+    """
+    await asyncio.get_running_loop().run_in_executor(None, close_connection_pool)
+
+
+def _ping(conn) -> bool:
+    """Проверка живости соединения"""
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def check_idle_connections(min_idle_seconds: float = 0) -> int:
+    """
+    Проверка простаивающих соединений пула (вызывается в фоне)
+
+    Мертвые соединения удаляются из пула, чтобы запросы не получали их
+    при checkout.
+
+    Args:
+        min_idle_seconds: Проверять только соединения, простаивающие дольше
+
+    Returns:
+        Количество удаленных мертвых соединений
+    """
+    removed = 0
+    for connection_pool in (_connection_pool, _replica_pool):
+        if connection_pool is not None:
+            removed += connection_pool.check_idle(_ping, min_idle_seconds)
+    if removed:
+        _dead_connections.inc(removed, source='background')
+        logger.warning(f"Removed {removed} dead connections from pool")
+    return removed
+
+
+async def pool_health_check_loop(interval_seconds: float):
+    """
+    Фоновая задача периодической проверки простаивающих соединений
+
+    Args:
+        interval_seconds: Интервал между проверками
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_db(check_idle_connections, interval_seconds)
+        except Exception as e:
+            logger.warning(f"Pool health check failed: {e}")
+
+
+def set_db_writer(writer: Optional[Hashable]) -> None:
+    """
+    Автор запросов к БД в текущем контексте (вызывается middleware)
+
+    Args:
+        writer: Ключ автора (например, telegram_id пользователя запроса)
+    """
+    _db_writer.set(writer)
+
+
+def mark_primary_write() -> None:
+    """
+    Отметка о записи в primary (вызывается моделями после INSERT/UPDATE)
+
+    В течение DB_REPLICA_RYW_SECONDS после записи read-only запросы того же
+    автора (set_db_writer) идут в primary, чтобы сразу видеть свои изменения
+    несмотря на лаг реплики. Чтения остальных пользователей остаются на реплике.
+    """
+    now = time.monotonic()
+    with _recent_writes_lock:
+        _recent_writes[_db_writer.get()] = now
+        if len(_recent_writes) > 1000:
+            for writer, written_at in list(_recent_writes.items()):
+                if now - written_at >= DB_REPLICA_RYW_SECONDS:
+                    del _recent_writes[writer]
+
+
+def _recently_wrote() -> bool:
+    """Была ли у автора текущего контекста запись за DB_REPLICA_RYW_SECONDS"""
+    written_at = _recent_writes.get(_db_writer.get())
+    return written_at is not None and time.monotonic() - written_at < DB_REPLICA_RYW_SECONDS
+
+
+def _acquire(read_only: bool):
+    """
+    Выбор пула и получение соединения
+
+    Returns:
+        Кортеж (пул, соединение)
+    """
+    if read_only:
+        if _replica_pool is None:
+            _read_routing.inc(target='primary')
+        elif _recently_wrote():
+            _read_routing.inc(target='primary_ryw')
+        else:
+            try:
+                # Короткое ожидание (DB_REPLICA_ACQUIRE_TIMEOUT): занятая реплика
+                # не должна задерживать чтение, primary его обслужит
+                conn = _replica_pool.getconn()
+                _read_routing.inc(target='replica')
+                return _replica_pool, conn
+            except PoolTimeoutError:
+                # Все соединения реплики заняты - читаем из primary
+                _read_routing.inc(target='primary_fallback')
+            except psycopg2.OperationalError as e:
+                # Реплика недоступна - читаем из primary
+                logger.warning(f"Replica unavailable, falling back to primary: {e}")
+                _read_routing.inc(target='primary_fallback')
+    return _connection_pool, _connection_pool.getconn()
+
+
 @contextmanager
-def get_db_connection() -> Generator:
-    """Контекстный менеджер для получения соединения из пула"""
+def get_db_connection(read_only: bool = False) -> Generator:
+    """
+    Контекстный менеджер для получения соединения из пула
+
+    Args:
+        read_only: Запрос только читает данные и может выполняться на реплике
+                   (если она настроена и у автора запроса не было недавней записи)
+
+    Соединение не проверяется при checkout (SELECT 1): мертвые соединения
+    удаляет фоновая проверка, а если соединение оказалось мертвым при
+    использовании, оно закрывается и не возвращается в пул.
+
+    Если все соединения заняты, запрос ждет в очереди пула не дольше
+    DB_POOL_ACQUIRE_TIMEOUT и получает PoolTimeoutError.
+    """
     if _connection_pool is None:
         # Fallback: создаем прямое соединение если пул не инициализирован
         logger.warning("Connection pool not initialized, using direct connection")
-        conn = psycopg2.connect(DATABASE_URL)
+        _direct_connections.inc()
+        conn = _connect()
         try:
             yield conn
             conn.commit()
@@ -68,67 +471,36 @@ def get_db_connection() -> Generator:
             conn.close()
         return
     
-    # Получаем соединение из пула
-    conn = _connection_pool.getconn()
-    connection_valid = True
-
-    # Проверяем живость соединения перед использованием
-    try:
-        with conn.cursor() as test_cursor:
-            test_cursor.execute("SELECT 1")
-    except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
-        logger.warning(f"Connection from pool is dead: {e}")
-        connection_valid = False
-        # Возвращаем мертвое соединение в пул с флагом close=True
-        # Это корректно удалит его из пула
-        try:
-            _connection_pool.putconn(conn, close=True)
-        except Exception as put_error:
-            logger.warning(f"Failed to return dead connection to pool: {put_error}")
-
-        # Пытаемся получить новое соединение из пула (до 3 попыток)
-        for attempt in range(3):
-            try:
-                conn = _connection_pool.getconn()
-                with conn.cursor() as test_cursor:
-                    test_cursor.execute("SELECT 1")
-                connection_valid = True
-                logger.info(f"Got valid connection from pool on attempt {attempt + 1}")
-                break
-            except (psycopg2.OperationalError, psycopg2.InterfaceError) as retry_error:
-                logger.warning(f"Connection attempt {attempt + 1} failed: {retry_error}")
-                try:
-                    _connection_pool.putconn(conn, close=True)
-                except Exception:
-                    pass
-
-        # Если все попытки из пула неудачны, создаем прямое соединение
-        if not connection_valid:
-            logger.warning("All pool connections dead, creating direct connection")
-            conn = psycopg2.connect(DATABASE_URL)
-            connection_valid = True
+    connection_pool, conn = _acquire(read_only)
+    # Только что открытое соединение проверять было не нужно - экономия лишь на повторной выдаче
+    if conn.checked_out:
+        db_round_trips_saved.inc(kind='liveness_probe')
+    conn.checked_out = True
+    broken = False
 
     try:
         yield conn
         conn.commit()
-    except Exception:
+    except Exception as e:
+        if _is_connection_error(e):
+            broken = True
         # Безопасная обработка rollback на возможно мертвом соединении
         try:
             if not conn.closed:
                 conn.rollback()
         except Exception as rollback_error:
+            broken = True
             logger.warning(f"Failed to rollback: {rollback_error}")
         raise
     finally:
-        # Всегда пытаемся вернуть соединение в пул
+        broken = broken or bool(conn.closed)
+        if broken:
+            _dead_connections.inc(source='on_failure')
+            logger.warning("Discarding broken connection from pool")
         try:
-            if conn.closed:
-                # Соединение закрыто, ничего не делаем
-                logger.debug("Connection already closed, skipping putconn")
-            else:
-                _connection_pool.putconn(conn)
+            # close=True удаляет соединение из пула, следующий checkout получит новое
+            connection_pool.putconn(conn, close=broken)
         except Exception as put_error:
-            # Если не удалось вернуть в пул, закрываем соединение
             logger.warning(f"Failed to return connection to pool: {put_error}")
             try:
                 conn.close()
@@ -136,24 +508,185 @@ def get_db_connection() -> Generator:
                 pass
 
 
+_query_duration_ms = metrics.histogram(
+    'db_query_ms',
+    'SQL statement duration by calling model method, ms'
+)
+_query_rows = metrics.histogram(
+    'db_query_rows',
+    'Rows returned/affected by calling model method',
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000)
+)
+_query_errors = metrics.counter(
+    'db_query_errors',
+    'Failed SQL statements by calling model method'
+)
+_slow_queries = metrics.counter(
+    'db_slow_queries',
+    'Statements slower than DB_SLOW_QUERY_MS by calling model method'
+)
+
+# Команды, для которых можно безопасно получить план (EXPLAIN без ANALYZE не выполняет запрос)
+_EXPLAINABLE_COMMANDS = ('SELECT', 'WITH', 'EXECUTE', 'INSERT', 'UPDATE', 'DELETE')
+
+
+def _query_tag() -> str:
+    """
+    Имя метода, выполнившего запрос (например Record.get_by_id)
+
+    Пропускает кадры этого модуля (курсор, execute_prepared) и берет
+    первый внешний кадр.
+    """
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_globals.get('__name__') == __name__:
+        frame = frame.f_back
+    if frame is None:
+        return 'unknown'
+    code = frame.f_code
+    return getattr(code, 'co_qualname', code.co_name)
+
+
+class InstrumentedCursor(RealDictCursor):
+    """
+    Курсор с замером времени выполнения запросов
+
+    Каждый запрос помечается методом модели, который его выполнил.
+    Длительность и количество строк пишутся в гистограммы, запросы
+    медленнее DB_SLOW_QUERY_MS логируются (опционально с планом EXPLAIN).
+    """
+
+    def execute(self, query, vars=None):
+        tag = _query_tag()
+        started = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception:
+            _query_errors.inc(query=tag)
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            _query_duration_ms.observe(elapsed_ms, query=tag)
+
+        rows = max(self.rowcount, 0)
+        _query_rows.observe(rows, query=tag)
+        if elapsed_ms >= DB_SLOW_QUERY_MS:
+            self._log_slow_query(tag, query, vars, elapsed_ms, rows)
+        return result
+
+    def _log_slow_query(self, tag: str, query, vars, elapsed_ms: float, rows: int) -> None:
+        """Логирование медленного запроса (без значений параметров)"""
+        _slow_queries.inc(query=tag)
+        query_text = query.decode() if isinstance(query, bytes) else str(query)
+        message = f"Slow query {tag}: {elapsed_ms:.1f}ms, rows={rows}\n{query_text.strip()[:2000]}"
+
+        if DB_SLOW_QUERY_EXPLAIN and query_text.lstrip().upper().startswith(_EXPLAINABLE_COMMANDS):
+            try:
+                plan = self._explain(query_text, vars)
+                message += f"\nPlan:\n{plan}"
+            except Exception as e:
+                message += f"\nPlan unavailable: {e}"
+
+        logger.warning(message)
+
+    def _explain(self, query_text: str, vars) -> str:
+        """
+        План запроса в транзакции вызывающего кода
+
+        EXPLAIN выполняется внутри savepoint: ошибка (например, таймаут) не
+        переводит транзакцию вызывающего в aborted состояние.
+        """
+        # Отдельный курсор, чтобы не затереть результат исходного запроса
+        with self.connection.cursor() as explain_cursor:
+            in_transaction = not self.connection.autocommit
+            if in_transaction:
+                explain_cursor.execute("SAVEPOINT slow_query_explain")
+            try:
+                explain_cursor.execute(f"EXPLAIN {query_text}", vars)
+                plan = '\n'.join(row[0] for row in explain_cursor.fetchall())
+            except Exception:
+                if in_transaction:
+                    explain_cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+                raise
+            if in_transaction:
+                explain_cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+        return plan
+
+
+async def run_db(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Выполнение синхронного DB вызова вне event loop
+
+    Синхронные методы моделей (psycopg2) блокируют поток, поэтому из aiohttp
+    handlers они вызываются через отдельный executor, размер которого
+    ограничен размером пула соединений. Функция выполняется в копии
+    контекста вызывающего (автор запросов для read-your-writes) и
+    повторяется один раз, если ее прервал устаревший prepared statement.
+
+    Args:
+        func: Синхронная функция, работающая с БД
+        *args: Позиционные аргументы функции
+        **kwargs: Именованные аргументы функции
+
+    Returns:
+        Результат вызова func
+    """
+    loop = asyncio.get_running_loop()
+    if kwargs:
+        func = functools.partial(func, **kwargs)
+    # Если пул не инициализирован (скрипты, тесты) используем executor по умолчанию
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        _db_executor, functools.partial(context.run, _retry_stale_prepared, func, *args)
+    )
+
+
 @contextmanager
 def get_db_cursor(conn=None) -> Generator:
     """Контекстный менеджер для получения курсора БД"""
     if conn is None:
         with get_db_connection() as connection:
-            cursor = connection.cursor(cursor_factory=RealDictCursor)
+            cursor = connection.cursor(cursor_factory=InstrumentedCursor)
             try:
                 yield cursor
             finally:
                 cursor.close()
     else:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor(cursor_factory=InstrumentedCursor)
         try:
             yield cursor
         finally:
             cursor.close()
 
 
+@contextmanager
+def get_autocommit_cursor() -> Generator:
+    """
+    Курсор на соединении в режиме autocommit
+
+    Нужен для команд, которые нельзя выполнять внутри транзакции
+    (CREATE/DROP INDEX CONCURRENTLY). После использования соединение
+    возвращается в обычный транзакционный режим.
+    """
+    with get_db_connection() as connection:
+        connection.autocommit = True
+        try:
+            with get_db_cursor(connection) as cursor:
+                yield cursor
+        finally:
+            if not connection.closed:
+                connection.autocommit = False
+
+
+def is_transactional(migration_module) -> bool:
+    """
+    Выполняется ли миграция в транзакции
+
+    Миграция может объявить TRANSACTIONAL = False, тогда up/down выполняются
+    в режиме autocommit (например для CREATE INDEX CONCURRENTLY на больших таблицах).
+    """
+    return getattr(migration_module, 'TRANSACTIONAL', True)
+
+
 def get_schema() -> str:
     """
     Получение имени схемы из конфигурации
@@ -177,16 +710,6 @@ def qualified_table_name(table_name: str) -> str:
     return f"{DB_SCHEMA}.{table_name}"
 
 
-def set_search_path(cursor) -> None:
-    """
-    Установка search_path для схемы
-    
-    Args:
-        cursor: Курсор базы данных
-    """
-    cursor.execute(f"SET search_path TO {DB_SCHEMA}, public")
-
-
 def check_schema_exists() -> bool:
     """
     Проверка существования схемы
@@ -230,7 +753,6 @@ def ensure_migrations_table():
     """Создание таблицы миграций, если она не существует"""
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             migrations_table = qualified_table_name('migrations')
             cursor.execute(f"""
                 CREATE TABLE IF NOT EXISTS {migrations_table} (
@@ -246,7 +768,6 @@ def get_applied_migrations():
     ensure_migrations_table()
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             migrations_table = qualified_table_name('migrations')
             cursor.execute(f"SELECT name FROM {migrations_table} ORDER BY name")
             return [row['name'] for row in cursor.fetchall()]
@@ -254,9 +775,22 @@ def get_applied_migrations():
 
 def apply_migration(migration_name, migration_module):
     """Применение миграции"""
+    if not is_transactional(migration_module):
+        # Нетранзакционная миграция: up в autocommit, затем запись о применении
+        logger.info(f"Применение миграции (без транзакции): {migration_name}")
+        with get_autocommit_cursor() as cursor:
+            migration_module.up(cursor)
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                cursor.execute(
+                    f"INSERT INTO {qualified_table_name('migrations')} (name) VALUES (%s)",
+                    (migration_name,)
+                )
+        logger.info(f"✓ Миграция {migration_name} применена")
+        return
+
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             logger.info(f"Применение миграции: {migration_name}")
             migration_module.up(cursor)
             migrations_table = qualified_table_name('migrations')
@@ -0,0 +1,274 @@
+"""Пул соединений с БД с ограниченным размером и FIFO очередью ожидания"""
+import collections
+import logging
+import threading
+import time
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+import psycopg2
+import psycopg2.extensions
+from psycopg2 import pool
+
+from bot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_wait_time_ms = metrics.histogram(
+    'db_pool_wait_ms',
+    'Time spent waiting for a pooled connection, ms'
+)
+_connection_events = metrics.counter(
+    'db_pool_connections',
+    'Pool connection churn (event=opened|closed)'
+)
+_acquire_timeouts = metrics.counter(
+    'db_pool_acquire_timeouts',
+    'Connection requests that timed out waiting for the pool'
+)
+
+
+class PoolTimeoutError(pool.PoolError):
+    """Не удалось получить соединение из пула за отведенное время"""
+
+
+class _Waiter:
+    """Поток, ожидающий соединение в очереди"""
+    __slots__ = ('event', 'conn', 'may_open', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.conn = None
+        self.may_open = False
+        self.error: Optional[Exception] = None
+
+
+class BoundedConnectionPool:
+    """
+    Потокобезопасный пул соединений psycopg2
+
+    В отличие от ThreadedConnectionPool, при исчерпании соединений запрос не
+    падает сразу с PoolError, а встает в FIFO очередь. Освободившееся
+    соединение передается первому ожидающему напрямую, поэтому новые запросы
+    не могут обогнать очередь. Ожидание ограничено acquire_timeout.
+    """
+
+    def __init__(
+        self,
+        minconn: int,
+        maxconn: int,
+        dsn: str,
+        acquire_timeout: float = 10.0,
+        name: str = 'primary',
+        **connect_kwargs: Any
+    ):
+        """
+        Args:
+            minconn: Количество соединений, открываемых сразу
+            maxconn: Максимальное количество соединений
+            dsn: Строка подключения
+            acquire_timeout: Максимальное время ожидания соединения (секунды)
+            name: Имя пула (метка в метриках)
+            **connect_kwargs: Дополнительные параметры psycopg2.connect
+        """
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.dsn = dsn
+        self.acquire_timeout = acquire_timeout
+        self.name = name
+        self.closed = False
+        self._connect_kwargs = connect_kwargs
+
+        self._lock = threading.Lock()
+        # Свободные соединения: (conn, время возврата в пул); справа - самые свежие
+        self._idle: Deque[Tuple[Any, float]] = collections.deque()
+        self._used: Dict[int, Any] = {}
+        self._waiters: Deque[_Waiter] = collections.deque()
+        # Открытые соединения + резервы под открываемые прямо сейчас
+        self._size = 0
+
+        for _ in range(minconn):
+            self._size += 1
+            self._idle.append((self._open(), time.monotonic()))
+
+    def _open(self):
+        """Открытие нового соединения (вызывается без блокировки)"""
+        conn = psycopg2.connect(self.dsn, **self._connect_kwargs)
+        _connection_events.inc(pool=self.name, event='opened')
+        return conn
+
+    def _close(self, conn) -> None:
+        """Закрытие соединения (вызывается без блокировки)"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        _connection_events.inc(pool=self.name, event='closed')
+
+    def getconn(self, timeout: Optional[float] = None):
+        """
+        Получение соединения из пула
+
+        Args:
+            timeout: Время ожидания (по умолчанию acquire_timeout)
+
+        Returns:
+            Соединение psycopg2
+
+        Raises:
+            PoolTimeoutError: Если соединение не освободилось за timeout
+            PoolError: Если пул закрыт
+        """
+        if timeout is None:
+            timeout = self.acquire_timeout
+        started = time.monotonic()
+        must_open = False
+
+        with self._lock:
+            if self.closed:
+                raise pool.PoolError("connection pool is closed")
+            # Пока есть очередь, новые запросы встают в ее конец
+            if not self._waiters and self._idle:
+                conn, _ = self._idle.pop()
+                self._used[id(conn)] = conn
+                _wait_time_ms.observe(0, pool=self.name)
+                return conn
+            if not self._waiters and self._size < self.maxconn:
+                self._size += 1
+                must_open = True
+            else:
+                waiter = _Waiter()
+                self._waiters.append(waiter)
+
+        if not must_open:
+            waiter.event.wait(timeout)
+            with self._lock:
+                if not waiter.event.is_set():
+                    self._waiters.remove(waiter)
+                    _acquire_timeouts.inc(pool=self.name)
+                    _wait_time_ms.observe((time.monotonic() - started) * 1000, pool=self.name)
+                    raise PoolTimeoutError(
+                        f"Timed out after {timeout:.1f}s waiting for a connection "
+                        f"from pool '{self.name}' ({self.maxconn} in use)"
+                    )
+            _wait_time_ms.observe((time.monotonic() - started) * 1000, pool=self.name)
+            if waiter.error is not None:
+                raise waiter.error
+            if waiter.conn is not None:
+                return waiter.conn
+            must_open = waiter.may_open
+
+        # Слот зарезервирован - открываем соединение вне блокировки
+        try:
+            conn = self._open()
+        except Exception:
+            self._release_slot()
+            raise
+        with self._lock:
+            self._used[id(conn)] = conn
+        return conn
+
+    def putconn(self, conn, close: bool = False) -> None:
+        """
+        Возврат соединения в пул
+
+        Args:
+            conn: Соединение, полученное через getconn
+            close: Закрыть соединение вместо возврата в пул
+        """
+        if not close and not conn.closed:
+            # Соединение должно вернуться в пул вне транзакции
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    close = True
+
+        with self._lock:
+            if self._used.pop(id(conn), None) is None:
+                raise pool.PoolError("trying to put unkeyed connection")
+            if not (close or conn.closed or self.closed):
+                if self._waiters:
+                    # Передаем соединение первому в очереди
+                    waiter = self._waiters.popleft()
+                    waiter.conn = conn
+                    self._used[id(conn)] = conn
+                    waiter.event.set()
+                else:
+                    self._idle.append((conn, time.monotonic()))
+                return
+
+        self._close(conn)
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        """Освобождение слота закрытого соединения: первый в очереди может открыть новое"""
+        with self._lock:
+            if self._waiters and not self.closed:
+                waiter = self._waiters.popleft()
+                waiter.may_open = True
+                waiter.event.set()
+            else:
+                self._size -= 1
+
+    def check_idle(self, ping: Callable[[Any], bool], min_idle_seconds: float = 0) -> int:
+        """
+        Проверка свободных соединений, простаивающих дольше min_idle_seconds
+
+        На время проверки соединения считаются занятыми, мертвые закрываются.
+
+        Args:
+            ping: Функция проверки соединения
+            min_idle_seconds: Минимальное время простоя для проверки
+
+        Returns:
+            Количество закрытых мертвых соединений
+        """
+        threshold = time.monotonic() - min_idle_seconds
+        with self._lock:
+            candidates = [conn for conn, idle_since in self._idle if idle_since <= threshold]
+            if not candidates:
+                return 0
+            candidate_ids = {id(conn) for conn in candidates}
+            self._idle = collections.deque(
+                item for item in self._idle if id(item[0]) not in candidate_ids
+            )
+            for conn in candidates:
+                self._used[id(conn)] = conn
+
+        removed = 0
+        for conn in candidates:
+            alive = ping(conn)
+            if not alive:
+                removed += 1
+            self.putconn(conn, close=not alive)
+        return removed
+
+    def closeall(self) -> None:
+        """Закрытие всех соединений пула"""
+        with self._lock:
+            self.closed = True
+            connections = [conn for conn, _ in self._idle] + list(self._used.values())
+            self._idle.clear()
+            self._used.clear()
+            waiters = list(self._waiters)
+            self._waiters.clear()
+            self._size = 0
+        for waiter in waiters:
+            waiter.error = pool.PoolError("connection pool is closed")
+            waiter.event.set()
+        for conn in connections:
+            self._close(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        """Текущее состояние пула для метрик"""
+        with self._lock:
+            return {
+                'checked_out': len(self._used),
+                'idle': len(self._idle),
+                'size': self._size,
+                'maxconn': self.maxconn,
+                'waiters': len(self._waiters),
+            }
@@ -0,0 +1,62 @@
+"""Сетка географических ячеек для индексируемого поиска адресов"""
+import math
+from typing import List
+
+# Размер ячейки в градусах (~11 м по широте) - совпадает с точностью поиска адреса
+GEO_CELL_SIZE = 0.0001
+# Количество ячеек по долготе (-180..180)
+_LON_CELLS = round(360 / GEO_CELL_SIZE)
+
+# То же вычисление ячейки на стороне SQL (для заполнения существующих строк)
+GEO_CELL_SQL = (
+    f"floor((latitude + 90) / {GEO_CELL_SIZE})::bigint * {_LON_CELLS}"
+    f" + floor((longitude + 180) / {GEO_CELL_SIZE})::bigint"
+)
+
+
+def _cell_indexes(latitude: float, longitude: float):
+    return (
+        math.floor((latitude + 90) / GEO_CELL_SIZE),
+        math.floor((longitude + 180) / GEO_CELL_SIZE)
+    )
+
+
+def geo_cell(latitude: float, longitude: float) -> int:
+    """
+    Ключ ячейки сетки для координат
+
+    Args:
+        latitude: Широта
+        longitude: Долгота
+
+    Returns:
+        Целочисленный ключ ячейки (BIGINT в БД)
+    """
+    lat_index, lon_index = _cell_indexes(latitude, longitude)
+    return lat_index * _LON_CELLS + lon_index
+
+
+def neighbour_cells(latitude: float, longitude: float, precision: float = GEO_CELL_SIZE) -> List[int]:
+    """
+    Ячейка точки и соседние ячейки, покрывающие квадрат ±precision
+
+    Args:
+        latitude: Широта
+        longitude: Долгота
+        precision: Допустимое отклонение координат (градусы)
+
+    Returns:
+        Список ключей ячеек (3x3 при precision <= GEO_CELL_SIZE)
+    """
+    lat_index, lon_index = _cell_indexes(latitude, longitude)
+    radius = max(1, math.ceil(precision / GEO_CELL_SIZE))
+    return [
+        (lat_index + d_lat) * _LON_CELLS + (lon_index + d_lon)
+        for d_lat in range(-radius, radius + 1)
+        for d_lon in range(-radius, radius + 1)
+    ]
+
+
+def coordinates_label(latitude: float, longitude: float) -> str:
+    """Подпись вместо адреса, пока он не определен (или если геокодер его не нашел)"""
+    return f'Координаты: {latitude:.6f}, {longitude:.6f}'
@@ -0,0 +1,96 @@
+"""Общая HTTP-сессия приложения для запросов к внешним API"""
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import aiohttp
+
+from bot.config import (
+    HTTP_POOL_LIMIT, HTTP_POOL_LIMIT_PER_HOST, HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_DNS_CACHE_TTL, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_TOTAL_TIMEOUT
+)
+from bot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_http_session: Optional[aiohttp.ClientSession] = None
+
+_upstream_latency = metrics.histogram(
+    'upstream_request_ms',
+    'Upstream HTTP request latency, ms (service, outcome=ok|http_error|timeout|error)'
+)
+
+
+def _create_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT,
+        limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        use_dns_cache=True,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=HTTP_TOTAL_TIMEOUT,
+        connect=HTTP_CONNECT_TIMEOUT,
+        sock_read=HTTP_READ_TIMEOUT
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+
+async def init_http_session() -> None:
+    """
+    Создание общей HTTP-сессии (вызывается в on_startup)
+
+    Соединения с внешними API переиспользуются (keep-alive), DNS кэшируется,
+    количество соединений и время ожидания ограничены.
+    """
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = _create_session()
+        logger.info(f"HTTP session initialized (pool limit {HTTP_POOL_LIMIT})")
+
+
+async def close_http_session() -> None:
+    """Закрытие общей HTTP-сессии (вызывается в on_shutdown)"""
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+        logger.info("HTTP session closed")
+    _http_session = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Общая HTTP-сессия
+
+    Если приложение не инициализировало сессию (скрипты), она создается
+    при первом обращении.
+    """
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        _http_session = _create_session()
+    return _http_session
+
+
+@asynccontextmanager
+async def track_upstream(service: str):
+    """
+    Замер времени запроса к внешнему сервису
+
+    Результат по умолчанию 'ok'; исключения учитываются как timeout/error.
+    Внутри блока можно переопределить результат: outcome['value'] = 'http_error'.
+    """
+    outcome = {'value': 'ok'}
+    started = time.monotonic()
+    try:
+        yield outcome
+    except Exception as e:
+        outcome['value'] = 'timeout' if isinstance(e, (TimeoutError, aiohttp.ServerTimeoutError)) else 'error'
+        raise
+    finally:
+        _upstream_latency.observe(
+            (time.monotonic() - started) * 1000,
+            service=service,
+            outcome=outcome['value']
+        )
@@ -0,0 +1,135 @@
+"""Кэш идентификации: telegram_id -> неизменяемый снимок пользователя"""
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from bot.config import IDENTITY_CACHE_TTL, IDENTITY_CACHE_NEGATIVE_TTL, IDENTITY_CACHE_MAX_SIZE
+from bot.utils.lru_cache import TTLCache
+from bot.utils.response_cache import add_invalidation_listener
+from bot.utils.shared_state import broadcast, on_broadcast
+
+
+def _isoformat(value: Any) -> Optional[str]:
+    if not value:
+        return None
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """
+    Неизменяемый снимок строки users для обработчиков запросов
+
+    Снимок разделяется между запросами, поэтому изменять его нельзя: для
+    обновления создается модель User.from_dict(dataclasses.asdict(snapshot)).
+    """
+    id: int
+    name: Optional[str] = None
+    email: Optional[str] = None
+    telegram_handle: Optional[str] = None
+    telegram_id: Optional[int] = None
+    phone: Optional[str] = None
+    avatar_url: Optional[str] = None
+    created_at: Any = None
+    updated_at: Any = None
+
+    @classmethod
+    def from_user(cls, user) -> 'UserSnapshot':
+        """Снимок модели User"""
+        return cls(
+            id=user.id,
+            name=user.name,
+            email=user.email,
+            telegram_handle=user.telegram_handle,
+            telegram_id=user.telegram_id,
+            phone=user.phone,
+            avatar_url=user.avatar_url,
+            created_at=user.created_at,
+            updated_at=user.updated_at
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Словарь в формате User.to_dict()"""
+        return {
+            'id': self.id,
+            'email': self.email,
+            'telegram_handle': self.telegram_handle,
+            'telegram_id': self.telegram_id,
+            'name': self.name,
+            'phone': self.phone,
+            'avatar_url': self.avatar_url,
+            'created_at': _isoformat(self.created_at),
+            'updated_at': _isoformat(self.updated_at)
+        }
+
+
+class IdentityCache:
+    """
+    Снимки пользователей по telegram_id и отрицательный кэш неизвестных id
+
+    Записи живут не дольше ttl; User.create/update/delete удаляют записи
+    пользователя сразу, инвалидация тега 'users' (импорт Excel) очищает кэш
+    целиком. Версия защищает от гонки: результат запроса к БД, начатого до
+    инвалидации, не сохраняется.
+    """
+
+    def __init__(self, ttl: float = IDENTITY_CACHE_TTL, negative_ttl: float = IDENTITY_CACHE_NEGATIVE_TTL,
+                 max_size: int = IDENTITY_CACHE_MAX_SIZE):
+        self._users = TTLCache('identity', max_size=max_size, ttl=ttl)
+        self._unknown = TTLCache('identity_negative', max_size=max_size, ttl=negative_ttl)
+        self._lock = threading.Lock()
+        # {user_id: telegram_id} - для инвалидации по ID пользователя
+        self._telegram_ids: Dict[int, int] = {}
+        self.version = 0
+
+    def get(self, telegram_id: int) -> Optional[UserSnapshot]:
+        """Снимок пользователя или None (промах)"""
+        return self._users.get(telegram_id)
+
+    def is_unknown(self, telegram_id: int) -> bool:
+        """Недавно проверенный telegram_id без пользователя в БД"""
+        return self._unknown.get(telegram_id) is not None
+
+    def put(self, snapshot: UserSnapshot, version: int) -> None:
+        """Сохранение снимка, если с начала его загрузки (version) не было инвалидаций"""
+        with self._lock:
+            if version != self.version or snapshot.telegram_id is None:
+                return
+            self._telegram_ids[snapshot.id] = snapshot.telegram_id
+            self._users.set(snapshot.telegram_id, snapshot)
+
+    def put_unknown(self, telegram_id: int, version: int) -> None:
+        """Запоминание telegram_id, для которого пользователь не найден"""
+        with self._lock:
+            if version == self.version:
+                self._unknown.set(telegram_id, True)
+
+    def invalidate_user(self, user_id: Optional[int], telegram_id: Optional[int] = None) -> None:
+        """Удаление записей пользователя (после создания, изменения или удаления) во всех процессах"""
+        self._invalidate_local(user_id, telegram_id)
+        broadcast('identity', [user_id, telegram_id])
+
+    def _invalidate_local(self, user_id: Optional[int], telegram_id: Optional[int] = None) -> None:
+        with self._lock:
+            self.version += 1
+            for key in {self._telegram_ids.pop(user_id, None), telegram_id} - {None}:
+                self._users.delete(key)
+                self._unknown.delete(key)
+
+    def clear(self) -> None:
+        """Очистка кэша (массовое изменение пользователей)"""
+        with self._lock:
+            self.version += 1
+            self._telegram_ids.clear()
+            self._users.clear()
+            self._unknown.clear()
+
+    def _on_invalidate(self, tags) -> None:
+        if 'users' in tags:
+            self.clear()
+
+
+# Кэш процесса
+identity_cache = IdentityCache()
+add_invalidation_listener(identity_cache._on_invalidate)
+on_broadcast('identity', lambda ids: identity_cache._invalidate_local(*ids))
@@ -0,0 +1,126 @@
+"""LRU-кэш с TTL и вытеснением за O(1)"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+from bot.utils import metrics
+
+_requests = metrics.counter('cache_requests', 'In-process cache lookups (cache, result=hit|miss)')
+_evictions = metrics.counter('cache_evictions', 'In-process cache evictions (cache, reason=capacity|expired)')
+
+# Все кэши процесса (для gauge размера и доли попаданий)
+_caches: List['TTLCache'] = []
+
+
+class TTLCache:
+    """
+    LRU-кэш с ограничением размера и временем жизни записей
+
+    Записи хранятся в OrderedDict в порядке использования: попадание переносит
+    запись в конец, при переполнении удаляется первая - обе операции O(1).
+    Просроченная запись удаляется при обращении к ней.
+    """
+
+    def __init__(self, name: str, max_size: int, ttl: float, snapshot: bool = True):
+        """
+        Args:
+            name: Имя кэша (метка в метриках)
+            max_size: Максимальное количество записей
+            ttl: Время жизни записи (секунды)
+            snapshot: Сохранять ли записи в снимок кэшей (bot.utils.cache_snapshot)
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.snapshot = snapshot
+        self._data: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        _caches.append(self)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Значение по ключу или None (промах или запись просрочена)"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and time.time() - item[1] >= self.ttl:
+                del self._data[key]
+                _evictions.inc(cache=self.name, reason='expired')
+                item = None
+            if item is None:
+                self.misses += 1
+                _requests.inc(cache=self.name, result='miss')
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        _requests.inc(cache=self.name, result='hit')
+        return item[0]
+
+    def set(self, key: Hashable, value: Any, stored_at: Optional[float] = None) -> None:
+        """
+        Сохранение значения
+
+        Args:
+            key: Ключ
+            value: Значение
+            stored_at: Время сохранения (unix time) - для записей из постоянного хранилища
+        """
+        with self._lock:
+            self._data[key] = (value, stored_at if stored_at is not None else time.time())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                _evictions.inc(cache=self.name, reason='capacity')
+
+    def delete(self, key: Hashable) -> None:
+        """Удаление записи"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Очистка кэша"""
+        with self._lock:
+            self._data.clear()
+
+    def export_entries(self) -> List[tuple]:
+        """Непросроченные записи (ключ, значение, stored_at) от давно не использованных к недавним"""
+        now = time.time()
+        with self._lock:
+            return [(key, value, stored_at) for key, (value, stored_at) in self._data.items()
+                    if now - stored_at < self.ttl]
+
+    def import_entries(self, entries) -> int:
+        """
+        Восстановление записей из export_entries() с исходным временем сохранения
+
+        Returns:
+            Количество восстановленных (еще не просроченных) записей
+        """
+        now = time.time()
+        restored = 0
+        for key, value, stored_at in entries:
+            if now - stored_at < self.ttl:
+                self.set(key, value, stored_at=stored_at)
+                restored += 1
+        return restored
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Размер и доля попаданий для метрик"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self),
+            'max_size': self.max_size,
+            'hit_rate': round(self.hits / total, 4) if total else None
+        }
+
+
+metrics.gauge(
+    'cache_stats',
+    'In-process cache size and hit rate',
+    lambda: {cache.name: cache.stats() for cache in _caches}
+)
@@ -0,0 +1,156 @@
+"""Метрики приложения в памяти процесса (счетчики, gauge, гистограммы)"""
+import bisect
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Ключ набора меток: отсортированный кортеж пар (имя, значение)
+LabelsKey = Tuple[Tuple[str, str], ...]
+
+# Границы бакетов по умолчанию (в миллисекундах) - от быстрых запросов до таймаутов
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def _labels_key(labels: Dict[str, Any]) -> LabelsKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+class Counter:
+    """Монотонный счетчик с опциональными метками"""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[LabelsKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """Увеличение счетчика"""
+        key = _labels_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        """Текущее значение счетчика для набора меток"""
+        with self._lock:
+            return self._values.get(_labels_key(labels), 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            values = [{'labels': dict(key), 'value': value} for key, value in self._values.items()]
+        return {'type': 'counter', 'description': self.description, 'values': values}
+
+
+class Gauge:
+    """Мгновенное значение, вычисляемое при чтении метрик"""
+
+    def __init__(self, name: str, description: str, callback: Callable[[], Any]):
+        self.name = name
+        self.description = description
+        self.callback = callback
+
+    def snapshot(self) -> Dict[str, Any]:
+        try:
+            value = self.callback()
+        except Exception as e:
+            value = f"error: {e}"
+        return {'type': 'gauge', 'description': self.description, 'value': value}
+
+
+class Histogram:
+    """Гистограмма с фиксированными бакетами и оценкой перцентилей"""
+
+    def __init__(self, name: str, description: str, buckets: Iterable[float] = DEFAULT_BUCKETS_MS):
+        self.name = name
+        self.description = description
+        self.buckets: List[float] = sorted(buckets)
+        # Для каждого набора меток: [counts по бакетам + overflow, sum, count, max]
+        self._series: Dict[LabelsKey, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        """Добавление наблюдения"""
+        key = _labels_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0, 0.0]
+                self._series[key] = series
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+            if value > series[3]:
+                series[3] = value
+
+    def _percentile(self, counts: List[int], total: int, q: float) -> Optional[Any]:
+        """Верхняя граница бакета, в который попадает перцентиль q"""
+        if not total:
+            return None
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            cumulative += count
+            if cumulative >= rank:
+                return self.buckets[index] if index < len(self.buckets) else '+Inf'
+        return '+Inf'
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            series_copy = [(dict(key), list(s[0]), s[1], s[2], s[3]) for key, s in self._series.items()]
+        values = []
+        for labels, counts, total_sum, count, max_value in series_copy:
+            values.append({
+                'labels': labels,
+                'count': count,
+                'sum': round(total_sum, 3),
+                'max': round(max_value, 3),
+                'p50': self._percentile(counts, count, 0.50),
+                'p95': self._percentile(counts, count, 0.95),
+                'p99': self._percentile(counts, count, 0.99),
+                'buckets': {
+                    (str(bound) if index < len(self.buckets) else '+Inf'): bucket_count
+                    for index, (bound, bucket_count) in enumerate(zip(self.buckets + [None], counts))
+                }
+            })
+        return {'type': 'histogram', 'description': self.description, 'values': values}
+
+
+# Глобальный реестр метрик процесса
+_registry: Dict[str, Any] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(name: str, factory: Callable[[], Any]):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = factory()
+            _registry[name] = metric
+        return metric
+
+
+def counter(name: str, description: str) -> Counter:
+    """Получение (или создание) счетчика по имени"""
+    return _register(name, lambda: Counter(name, description))
+
+
+def gauge(name: str, description: str, callback: Callable[[], Any]) -> Gauge:
+    """Регистрация gauge с функцией вычисления значения"""
+    return _register(name, lambda: Gauge(name, description, callback))
+
+
+def histogram(name: str, description: str, buckets: Iterable[float] = DEFAULT_BUCKETS_MS) -> Histogram:
+    """Получение (или создание) гистограммы по имени"""
+    return _register(name, lambda: Histogram(name, description, buckets))
+
+
+def get_metrics_snapshot() -> Dict[str, Any]:
+    """
+    Снимок всех зарегистрированных метрик
+
+    Returns:
+        Словарь {имя_метрики: данные}
+    """
+    with _registry_lock:
+        metrics = list(_registry.items())
+    return {name: metric.snapshot() for name, metric in sorted(metrics)}
@@ -0,0 +1,383 @@
+"""Управление месячными партициями таблицы records"""
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional, Tuple
+
+from bot.config import RECORDS_PARTITIONS_AHEAD, RECORDS_RETENTION_MONTHS, RECORDS_RETENTION_DROP
+from bot.utils.database import get_db_connection, get_db_cursor, get_schema, qualified_table_name, run_db
+from bot.utils.timezone import MSK, today_msk
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLE = 'records'
+# Строки вне месячных партиций (миграция 014); переносятся обслуживанием
+DEFAULT_PARTITION = f"{PARTITIONED_TABLE}_default"
+# История до перехода на партиции (миграция 010): диапазон (MINVALUE, граница)
+LEGACY_PARTITION = f"{PARTITIONED_TABLE}_legacy"
+
+_BOUND_RE = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+
+def add_months(month: date, months: int) -> date:
+    """Первое число месяца, отстоящего от month на months месяцев"""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_bound(month: date) -> datetime:
+    """
+    Граница партиции: полночь первого числа месяца по MSK в UTC (без tz)
+
+    Время в records хранится в UTC, а сутки считаются по MSK. Границы по MSK
+    гарантируют, что любой день MSK целиком лежит в одной партиции.
+    """
+    start_msk = datetime(month.year, month.month, 1, tzinfo=MSK)
+    return start_msk.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def format_bound(bound: datetime) -> str:
+    """Литерал границы партиции (в границах допустимы только константы)"""
+    return bound.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def partition_name(month: date) -> str:
+    """Имя партиции за месяц: records_YYYY_MM"""
+    return f"{PARTITIONED_TABLE}_{month.year:04d}_{month.month:02d}"
+
+
+def has_default_partition(cursor) -> bool:
+    """Есть ли DEFAULT-партиция records"""
+    cursor.execute(
+        "SELECT to_regclass(%s) IS NOT NULL AS exists",
+        (qualified_table_name(DEFAULT_PARTITION),)
+    )
+    return cursor.fetchone()['exists']
+
+
+def create_partition(cursor, month: date) -> str:
+    """
+    Создание партиции за месяц
+
+    Индексы партиции создаются автоматически по индексам родительской таблицы.
+    PostgreSQL не создает партицию, пока строки ее диапазона лежат в
+    DEFAULT-партиции, поэтому они переносятся в новую партицию в той же
+    транзакции.
+    """
+    name = partition_name(month)
+    lower = partition_bound(month)
+    upper = partition_bound(add_months(month, 1))
+    default = qualified_table_name(DEFAULT_PARTITION)
+
+    in_default = False
+    if has_default_partition(cursor):
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {default} WHERE timestamp >= %s AND timestamp < %s) AS found",
+            (lower, upper)
+        )
+        in_default = cursor.fetchone()['found']
+    if in_default:
+        cursor.execute(f"""
+            CREATE TEMPORARY TABLE records_default_moved
+            (LIKE {qualified_table_name(PARTITIONED_TABLE)}) ON COMMIT DROP;
+            WITH moved AS (
+                DELETE FROM {default} WHERE timestamp >= %(lower)s AND timestamp < %(upper)s
+                RETURNING *
+            )
+            INSERT INTO records_default_moved SELECT * FROM moved;
+        """, {'lower': lower, 'upper': upper})
+        rows = cursor.rowcount
+
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {qualified_table_name(name)}
+        PARTITION OF {qualified_table_name(PARTITIONED_TABLE)}
+        FOR VALUES FROM ('{format_bound(lower)}')
+        TO ('{format_bound(upper)}')
+    """)
+
+    if in_default:
+        cursor.execute(f"""
+            INSERT INTO {qualified_table_name(name)} SELECT * FROM records_default_moved;
+            DROP TABLE records_default_moved;
+        """)
+        logger.warning(f"Moved {rows} records from {DEFAULT_PARTITION} to new partition {name}")
+    return name
+
+
+def _parse_bound(value: str) -> Optional[datetime]:
+    """Значение границы из pg_get_expr (MINVALUE/MAXVALUE -> None)"""
+    value = value.strip()
+    if value in ('MINVALUE', 'MAXVALUE'):
+        return None
+    return datetime.fromisoformat(value.strip("'"))
+
+
+def is_partitioned(cursor) -> bool:
+    """Является ли records партиционированной таблицей"""
+    cursor.execute(
+        """
+        SELECT c.relkind
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = %s
+        """,
+        (get_schema(), PARTITIONED_TABLE)
+    )
+    result = cursor.fetchone()
+    return bool(result) and result['relkind'] == 'p'
+
+
+def get_partitions(cursor) -> List[Tuple[str, Optional[datetime], Optional[datetime]]]:
+    """
+    Партиции records с границами
+
+    Returns:
+        Список (имя, нижняя граница, верхняя граница) по возрастанию;
+        None означает MINVALUE/MAXVALUE
+    """
+    cursor.execute(
+        """
+        SELECT child.relname AS name, pg_get_expr(child.relpartbound, child.oid) AS bound
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = parent.relnamespace
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE n.nspname = %s AND parent.relname = %s
+        """,
+        (get_schema(), PARTITIONED_TABLE)
+    )
+    partitions = []
+    for row in cursor.fetchall():
+        match = _BOUND_RE.search(row['bound'])
+        if not match:
+            continue
+        partitions.append((row['name'], _parse_bound(match.group(1)), _parse_bound(match.group(2))))
+    partitions.sort(key=lambda p: p[1] or datetime.min)
+    return partitions
+
+
+def _is_covered(partitions, bound: datetime) -> bool:
+    """Попадает ли граница в диапазон одной из партиций"""
+    return any(
+        (lower is None or lower <= bound) and (upper is None or bound < upper)
+        for _, lower, upper in partitions
+    )
+
+
+def ensure_future_partitions(months_ahead: int = RECORDS_PARTITIONS_AHEAD) -> List[str]:
+    """
+    Создание недостающих партиций с текущего месяца (MSK) до текущего + months_ahead
+
+    Строки прошедших месяцев без партиции лежат в DEFAULT-партиции и
+    переносятся split_default_partition.
+
+    Returns:
+        Имена созданных партиций
+    """
+    created = []
+    with get_db_connection() as conn:
+        with get_db_cursor(conn) as cursor:
+            if not is_partitioned(cursor):
+                return created
+
+            partitions = get_partitions(cursor)
+            month = today_msk().replace(day=1)
+            last_month = add_months(month, months_ahead)
+            while month <= last_month:
+                if not _is_covered(partitions, partition_bound(month)):
+                    created.append(create_partition(cursor, month))
+                month = add_months(month, 1)
+
+    if created:
+        logger.info(f"Created record partitions: {', '.join(created)}")
+    return created
+
+
+def split_default_partition(keep_months: int = RECORDS_RETENTION_MONTHS) -> List[str]:
+    """
+    Перенос строк из DEFAULT-партиции в месячные партиции
+
+    Строки попадают в DEFAULT-партицию, если партиция их месяца не создана
+    (время устройства ушло вперед, обслуживание не запускалось). Для каждого
+    такого месяца создается партиция, строки переносятся в нее. Месяцы
+    старше политики хранения не восстанавливаются, их строки остаются в
+    DEFAULT-партиции.
+
+    Returns:
+        Имена созданных партиций
+    """
+    with get_db_connection() as conn:
+        with get_db_cursor(conn) as cursor:
+            if not is_partitioned(cursor) or not has_default_partition(cursor):
+                return []
+            cursor.execute(f"""
+                SELECT DISTINCT
+                    date_trunc('month', timestamp AT TIME ZONE 'UTC' AT TIME ZONE 'Europe/Moscow')::date AS month
+                FROM {qualified_table_name(DEFAULT_PARTITION)}
+                ORDER BY month
+            """)
+            months = [row['month'] for row in cursor.fetchall()]
+
+    oldest_kept = add_months(today_msk().replace(day=1), -keep_months) if keep_months > 0 else None
+    created = []
+    for month in months:
+        if oldest_kept is not None and month < oldest_kept:
+            logger.warning(f"Records for {month:%Y-%m} stay in {DEFAULT_PARTITION}: older than retention policy")
+            continue
+        # Каждый месяц в отдельной транзакции: блокировка DEFAULT-партиции короткая
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                created.append(create_partition(cursor, month))
+    return created
+
+
+def _split_legacy_month(cursor) -> Optional[str]:
+    """
+    Вынос самого раннего месяца records_legacy в отдельную партицию
+
+    Returns:
+        Имя созданной партиции или None, если выносить нечего (в
+        records_legacy остался один месяц)
+    """
+    legacy = next((p for p in get_partitions(cursor) if p[0] == LEGACY_PARTITION), None)
+    if legacy is None:
+        return None
+    _, lower, upper = legacy
+    legacy_table = qualified_table_name(LEGACY_PARTITION)
+    records = qualified_table_name(PARTITIONED_TABLE)
+
+    cursor.execute(f"SELECT MIN(timestamp) AS first FROM {legacy_table}")
+    first = cursor.fetchone()['first']
+    if first is None:
+        return None
+    month = first.replace(tzinfo=timezone.utc).astimezone(MSK).date().replace(day=1)
+    split_at = partition_bound(add_months(month, 1))
+    if upper is None or split_at >= upper:
+        return None
+
+    name = partition_name(month)
+    lower_sql = 'MINVALUE' if lower is None else f"'{format_bound(lower)}'"
+    # Отсоединение блокирует records до конца транзакции
+    cursor.execute(f"ALTER TABLE {records} DETACH PARTITION {legacy_table}")
+    cursor.execute(f"""
+        CREATE TABLE {qualified_table_name(name)} PARTITION OF {records}
+        FOR VALUES FROM ({lower_sql}) TO ('{format_bound(split_at)}')
+    """)
+    cursor.execute(f"""
+        WITH moved AS (
+            DELETE FROM {legacy_table} WHERE timestamp < %s RETURNING *
+        )
+        INSERT INTO {qualified_table_name(name)} SELECT * FROM moved
+    """, (split_at,))
+    moved = cursor.rowcount
+    # Проверенный CHECK избавляет ATTACH от повторной проверки строк
+    cursor.execute(f"""
+        ALTER TABLE {legacy_table} ADD CONSTRAINT records_legacy_bound
+        CHECK (timestamp >= '{format_bound(split_at)}' AND timestamp < '{format_bound(upper)}')
+    """)
+    cursor.execute(f"""
+        ALTER TABLE {records} ATTACH PARTITION {legacy_table}
+        FOR VALUES FROM ('{format_bound(split_at)}') TO ('{format_bound(upper)}')
+    """)
+    cursor.execute(f"ALTER TABLE {legacy_table} DROP CONSTRAINT records_legacy_bound")
+    logger.info(f"Moved {moved} records from {LEGACY_PARTITION} to new partition {name}")
+    return name
+
+
+def split_legacy_partition(max_months: Optional[int] = None) -> List[str]:
+    """
+    Разбиение истории records_legacy на месячные партиции
+
+    Миграция 010 подключает всю историю до переключения одной партицией, и
+    политика хранения могла бы отсоединить ее только целиком. Каждый шаг в
+    отдельной транзакции выносит самый ранний месяц (как split_default_partition):
+    records_legacy отсоединяется, строки месяца переносятся в новую партицию,
+    records_legacy подключается обратно с сокращенным диапазоном. Последний
+    месяц остается в records_legacy.
+
+    Шаг блокирует запись в records на время переноса месяца и проверки
+    оставшихся строк records_legacy, поэтому разбиение не входит в фоновое
+    обслуживание и запускается вручную (scripts/split_legacy_partition.py).
+
+    Args:
+        max_months: Максимум месяцев за запуск (None - все)
+
+    Returns:
+        Имена созданных партиций
+    """
+    created = []
+    while max_months is None or len(created) < max_months:
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                if not is_partitioned(cursor):
+                    break
+                name = _split_legacy_month(cursor)
+        if name is None:
+            break
+        created.append(name)
+    return created
+
+
+def apply_retention(
+    keep_months: int = RECORDS_RETENTION_MONTHS,
+    drop: bool = RECORDS_RETENTION_DROP
+) -> List[str]:
+    """
+    Отсоединение (и опционально удаление) партиций старше keep_months месяцев
+
+    DETACH/DROP партиции - операция над метаданными вместо DELETE миллионов
+    строк. Дневная сводка daily_attendance не затрагивается, отчеты за
+    старые периоды продолжают работать.
+
+    Returns:
+        Имена отсоединенных партиций
+    """
+    if keep_months <= 0:
+        return []
+
+    cutoff = partition_bound(add_months(today_msk().replace(day=1), -keep_months))
+    with get_db_connection() as conn:
+        with get_db_cursor(conn) as cursor:
+            if not is_partitioned(cursor):
+                return []
+            expired = [
+                name for name, _, upper in get_partitions(cursor)
+                if upper is not None and upper <= cutoff
+            ]
+
+    for name in expired:
+        # Каждая партиция в отдельной транзакции: блокировка records короткая
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                cursor.execute(
+                    f"ALTER TABLE {qualified_table_name(PARTITIONED_TABLE)} "
+                    f"DETACH PARTITION {qualified_table_name(name)}"
+                )
+                if drop:
+                    cursor.execute(f"DROP TABLE {qualified_table_name(name)}")
+        logger.info(f"Record partition {name} {'dropped' if drop else 'detached'} by retention policy")
+
+    return expired
+
+
+def maintain_record_partitions() -> None:
+    """Обслуживание партиций: строки DEFAULT-партиции, будущие месяцы и политика хранения"""
+    split_default_partition()
+    ensure_future_partitions()
+    apply_retention()
+
+
+async def partition_maintenance_loop(interval_seconds: float):
+    """
+    Фоновая задача периодического обслуживания партиций
+
+    Args:
+        interval_seconds: Интервал между запусками
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_db(maintain_record_partitions)
+        except Exception as e:
+            logger.warning(f"Record partition maintenance failed: {e}")
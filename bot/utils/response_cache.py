@@ -0,0 +1,375 @@
+"""Асинхронный кэш ответов API: single-flight, stale-while-revalidate, инвалидация по тегам"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set, Union
+
+from bot.utils import metrics
+from bot.utils.shared_state import add_resync_handler, broadcast, on_broadcast
+
+logger = logging.getLogger(__name__)
+
+_requests = metrics.counter(
+    'response_cache_requests',
+    'Response cache lookups (cache, result=hit|stale|miss|coalesced)'
+)
+_evictions = metrics.counter(
+    'response_cache_evictions',
+    'Response cache evictions (cache, reason=capacity|expired|invalidated)'
+)
+
+_patches = metrics.counter(
+    'response_cache_patches',
+    'Cached values updated in place instead of being reloaded (cache)'
+)
+
+# Метка загрузки, во время которой значение ключа обновлялось через patch()
+_PATCHED = object()
+
+# Все кэши процесса: инвалидация тега действует на каждый
+_caches: List['ResponseCache'] = []
+# Прочие in-memory структуры, которым нужны инвалидации (callback(tags))
+_listeners: List[Callable[[Set[str]], None]] = []
+
+Tags = Union[Iterable[str], Callable[[Any], Iterable[str]]]
+
+
+class _Entry:
+    __slots__ = ('value', 'stored_at', 'tags', 'needs_validation')
+
+    def __init__(self, value: Any, stored_at: float, tags: Set[str], needs_validation: bool = False):
+        self.value = value
+        self.stored_at = stored_at
+        self.tags = tags
+        # Запись восстановлена из снимка: инвалидации, пришедшие, пока процесс
+        # не работал, потеряны, поэтому значение перепроверяется при первом чтении
+        self.needs_validation = needs_validation
+
+
+class ResponseCache:
+    """
+    Кэш результатов асинхронных загрузчиков (тяжелых запросов к БД)
+
+    - single-flight: при промахе загрузчик выполняется один раз, параллельные
+      запросы того же ключа ждут его результата;
+    - stale-while-revalidate: в течение stale_ttl после истечения ttl отдается
+      прежнее значение, а обновление идет в фоне;
+    - LRU с ограничением размера (OrderedDict, вытеснение за O(1));
+    - теги: invalidate_tags('day:2025-01-31') удаляет все записи с этим тегом;
+    - patch(): точечное обновление значения после записи вместо перезагрузки;
+    - export_entries()/import_entries(): перенос записей через снимок на диске
+      (bot.utils.cache_snapshot).
+
+    Кэш рассчитан на один event loop и не использует блокировок.
+    """
+
+    def __init__(self, name: str, ttl: float, stale_ttl: float = 0, max_size: int = 1000):
+        """
+        Args:
+            name: Имя кэша (метка в метриках)
+            ttl: Время свежести записи (секунды)
+            stale_ttl: Сколько секунд после ttl можно отдавать запись, обновляя ее в фоне
+            max_size: Максимальное количество записей
+        """
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_size = max_size
+        self._entries: 'OrderedDict[Hashable, _Entry]' = OrderedDict()
+        self._tag_index: Dict[str, Set[Hashable]] = {}
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        # Для каждой идущей загрузки - теги, инвалидированные за время загрузки:
+        # такой результат отдается ожидающим, но не сохраняется
+        self._loading_invalidations: Dict[asyncio.Future, Set[str]] = {}
+        # Теги идущих загрузок, если известны заранее (None - теги вычисляются по значению)
+        self._loading_tags: Dict[asyncio.Future, Optional[Set[str]]] = {}
+        self._refresh_tasks: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.misses = 0
+        _caches.append(self)
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        tags: Tags = ()
+    ) -> Any:
+        """
+        Значение из кэша или результат loader()
+
+        Args:
+            key: Ключ
+            loader: Асинхронный загрузчик значения
+            tags: Теги записи или функция значение -> теги
+
+        Returns:
+            Значение
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.stored_at
+            if age < self.ttl and not entry.needs_validation:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                _requests.inc(cache=self.name, result='hit')
+                return entry.value
+            if age < self.ttl + self.stale_ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                _requests.inc(cache=self.name, result='stale')
+                self._refresh_in_background(key, loader, tags)
+                return entry.value
+            self._remove(key)
+            _evictions.inc(cache=self.name, reason='expired')
+
+        future = self._inflight.get(key)
+        if future is not None:
+            _requests.inc(cache=self.name, result='coalesced')
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        _requests.inc(cache=self.name, result='miss')
+        return await asyncio.shield(self._start_load(key, loader, tags))
+
+    def _start_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], tags: Tags) -> asyncio.Future:
+        """Запуск единственной загрузки ключа (результат получают все ожидающие)"""
+        invalidated: Set[str] = set()
+        future = asyncio.ensure_future(self._load(key, loader, tags, invalidated))
+        self._inflight[key] = future
+        self._loading_invalidations[future] = invalidated
+        self._loading_tags[future] = None if callable(tags) else set(tags)
+
+        def _done(finished: asyncio.Future) -> None:
+            if self._inflight.get(key) is finished:
+                del self._inflight[key]
+            self._loading_invalidations.pop(finished, None)
+            self._loading_tags.pop(finished, None)
+
+        future.add_done_callback(_done)
+        return future
+
+    async def _load(self, key: Hashable, loader, tags: Tags, invalidated: Set[str]) -> Any:
+        value = await loader()
+        entry_tags = set(tags(value) if callable(tags) else tags)
+        if entry_tags & invalidated or _PATCHED in invalidated:
+            # Тег инвалидирован во время загрузки - значение могло устареть
+            return value
+        self._store(key, value, entry_tags)
+        return value
+
+    def _refresh_in_background(self, key: Hashable, loader, tags: Tags) -> None:
+        if key in self._inflight:
+            return
+        task = self._start_load(key, loader, tags)
+        self._refresh_tasks.add(task)
+
+        def _done(finished: asyncio.Future) -> None:
+            self._refresh_tasks.discard(finished)
+            if not finished.cancelled() and finished.exception() is not None:
+                logger.warning(f"Background refresh of {self.name}:{key} failed: {finished.exception()}")
+
+        task.add_done_callback(_done)
+
+    def _store(self, key: Hashable, value: Any, tags: Set[str], stored_at: Optional[float] = None,
+               needs_validation: bool = False) -> None:
+        self._remove(key)
+        self._entries[key] = _Entry(
+            value, stored_at if stored_at is not None else time.monotonic(), tags, needs_validation
+        )
+        for tag in tags:
+            self._tag_index.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+            _evictions.inc(cache=self.name, reason='capacity')
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_index[tag]
+
+    def has(self, key: Hashable) -> bool:
+        """Есть ли значение ключа в кэше или идет его загрузка"""
+        return key in self._entries or key in self._inflight
+
+    def invalidate(self, key: Hashable) -> None:
+        """Удаление записи по ключу (идущая загрузка ключа не сохранит результат)"""
+        future = self._inflight.pop(key, None)
+        if future is not None:
+            self._loading_invalidations[future].add(_PATCHED)
+        if key in self._entries:
+            self._remove(key)
+            _evictions.inc(cache=self.name, reason='invalidated')
+
+    def patch(self, key: Hashable, update: Callable[[Any], Any]) -> bool:
+        """
+        Точечное обновление закэшированного значения без перезагрузки
+
+        Идущая загрузка ключа могла прочитать данные до изменения, поэтому
+        ее результат не сохраняется.
+
+        Args:
+            key: Ключ
+            update: Функция значение -> новое значение; None - обновить нельзя,
+                запись удаляется и будет загружена заново
+
+        Returns:
+            True, если запись была в кэше и обновлена
+        """
+        entry = self._entries.get(key)
+        value = update(entry.value) if entry is not None else None
+        if value is None:
+            self.invalidate(key)
+            return False
+        future = self._inflight.pop(key, None)
+        if future is not None:
+            self._loading_invalidations[future].add(_PATCHED)
+        entry.value = value
+        _patches.inc(cache=self.name)
+        return True
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """
+        Удаление записей с любым из тегов
+
+        Returns:
+            Количество удаленных записей
+        """
+        tags = set(tags)
+        for invalidated in self._loading_invalidations.values():
+            invalidated.update(tags)
+        # Загрузки затронутых ключей, начатые до изменения данных, не должны
+        # подхватывать новые запросы. Остальные ключи сохраняют single-flight;
+        # загрузки с тегами по значению только не сохранят результат (см. выше)
+        for key, future in list(self._inflight.items()):
+            loading_tags = self._loading_tags.get(future)
+            if loading_tags is not None and loading_tags & tags:
+                del self._inflight[key]
+        removed = 0
+        for tag in tags:
+            for key in list(self._tag_index.get(tag, ())):
+                self._remove(key)
+                removed += 1
+        if removed:
+            _evictions.inc(removed, cache=self.name, reason='invalidated')
+        return removed
+
+    def clear(self) -> None:
+        """Очистка кэша (идущие загрузки не сохранят результат)"""
+        for invalidated in self._loading_invalidations.values():
+            invalidated.add(_PATCHED)
+        self._inflight.clear()
+        self._entries.clear()
+        self._tag_index.clear()
+
+    def export_entries(self) -> List[tuple]:
+        """
+        Записи для снимка, от давно не использованных к недавним
+
+        Returns:
+            Список (ключ, значение, возраст в секундах, теги); записи, которые
+            уже нельзя отдавать даже как устаревшие, пропускаются
+        """
+        now = time.monotonic()
+        return [
+            (key, entry.value, now - entry.stored_at, sorted(entry.tags))
+            for key, entry in self._entries.items()
+            if now - entry.stored_at < self.ttl + self.stale_ttl
+        ]
+
+    def import_entries(self, entries: Iterable[tuple], extra_age: float = 0) -> int:
+        """
+        Восстановление записей из снимка
+
+        Записи сохраняют свой возраст (плюс время, прошедшее с создания снимка)
+        и помечаются для проверки: первое чтение отдает значение по пути
+        stale-while-revalidate и перезагружает его в фоне. Ключи, уже
+        загруженные в этом процессе, не перезаписываются.
+
+        Args:
+            entries: Записи из export_entries()
+            extra_age: Секунды, прошедшие с создания снимка
+
+        Returns:
+            Количество восстановленных записей
+        """
+        now = time.monotonic()
+        restored = 0
+        for key, value, age, tags in entries:
+            age += extra_age
+            if age >= self.ttl + self.stale_ttl or key in self._entries or key in self._inflight:
+                continue
+            self._store(key, value, set(tags), stored_at=now - age, needs_validation=True)
+            restored += 1
+        return restored
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Размер и доля попаданий для метрик"""
+        total = self.hits + self.misses
+        return {
+            'size': len(self),
+            'max_size': self.max_size,
+            'hit_rate': round(self.hits / total, 4) if total else None
+        }
+
+
+def invalidate_tags(*tags: str) -> int:
+    """
+    Инвалидация тегов во всех кэшах ответов процесса и остальных процессов
+
+    Теги: 'day:<YYYY-MM-DD>' - данные за день MSK, 'record:<id>' - запись,
+    'user:<id>' - записи пользователя, 'users' - список сотрудников.
+
+    Returns:
+        Количество удаленных записей в этом процессе
+    """
+    removed = _invalidate_local(set(tags))
+    broadcast('invalidate', sorted(tags))
+    return removed
+
+
+def _invalidate_local(tags: Set[str]) -> int:
+    removed = sum(cache.invalidate_tags(tags) for cache in _caches)
+    for listener in _listeners:
+        listener(set(tags))
+    if removed:
+        logger.debug(f"Response cache invalidated {removed} entries for tags {', '.join(sorted(tags))}")
+    return removed
+
+
+def _resync() -> None:
+    """Инвалидации других процессов могли быть потеряны - сброс всех кэшей"""
+    for cache in _caches:
+        cache.clear()
+    for listener in _listeners:
+        listener({'users'})
+
+
+on_broadcast('invalidate', lambda tags: _invalidate_local(set(tags)))
+add_resync_handler(_resync)
+
+
+def add_invalidation_listener(listener: Callable[[Set[str]], None]) -> None:
+    """Подписка на инвалидации тегов (для структур, не являющихся ResponseCache)"""
+    _listeners.append(listener)
+
+
+def day_tag(day) -> str:
+    """Тег данных за день (MSK)"""
+    return f"day:{day.isoformat()}"
+
+
+metrics.gauge(
+    'response_cache_stats',
+    'Response cache size and hit rate',
+    lambda: {cache.name: cache.stats() for cache in _caches}
+)
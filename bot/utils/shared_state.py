@@ -0,0 +1,331 @@
+"""Общее состояние процессов приложения: ключи с TTL, счетчики и широковещательные сообщения"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from bot.config import SHARED_STATE_URL, SHARED_STATE_PREFIX
+from bot.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Идентификатор процесса: свои широковещательные сообщения не обрабатываются
+PROCESS_ID = uuid.uuid4().hex
+
+_messages = metrics.counter(
+    'shared_state_messages',
+    'Broadcast messages between app processes (channel, direction=sent|received|failed)'
+)
+
+
+class SharedState:
+    """
+    Хранилище состояния, общего для процессов приложения
+
+    Реализации: MemorySharedState (один процесс, тесты) и RedisSharedState
+    (любой сервер с протоколом Redis). Значения - bytes.
+    """
+
+    # Разделяется ли состояние между процессами (иначе широковещание не нужно)
+    shared = False
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Значение ключа или None"""
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        """Сохранение значения (ttl - время жизни в секундах)"""
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        """Удаление ключа"""
+        raise NotImplementedError
+
+    async def incr(self, key: str, amount: int, ttl: float) -> int:
+        """Атомарное прибавление к счетчику; время жизни ключа продлевается до ttl"""
+        raise NotImplementedError
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        """Отправка сообщения подписчикам канала"""
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str, callback: Callable[[bytes], None]) -> None:
+        """Подписка на канал"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """Освобождение соединений"""
+
+
+class MemorySharedState(SharedState):
+    """Состояние в памяти процесса: по умолчанию (один процесс) и для тестов"""
+
+    def __init__(self):
+        # {key: (value, expires_at или None)}
+        self._data: Dict[str, tuple] = {}
+        self._subscribers: Dict[str, List[Callable[[bytes], None]]] = {}
+
+    def _item(self, key: str) -> Optional[tuple]:
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    async def get(self, key: str) -> Optional[bytes]:
+        item = self._item(key)
+        return item[0] if item is not None else None
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self._data[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def incr(self, key: str, amount: int, ttl: float) -> int:
+        item = self._item(key)
+        value = (int(item[0]) if item is not None else 0) + amount
+        self._data[key] = (str(value).encode(), time.monotonic() + ttl)
+        return value
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        for callback in list(self._subscribers.get(channel, ())):
+            callback(message)
+
+    async def subscribe(self, channel: str, callback: Callable[[bytes], None]) -> None:
+        self._subscribers.setdefault(channel, []).append(callback)
+
+
+class RedisSharedState(SharedState):
+    """
+    Состояние в Redis (redis.asyncio)
+
+    Ключи и каналы получают префикс, чтобы несколько окружений могли делить
+    один сервер. Подписки обслуживает фоновая задача с переподключением:
+    сообщения, отправленные во время разрыва, потеряны, поэтому после
+    переподключения вызывается on_resync (сброс локальных кэшей).
+    """
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = '', on_resync: Optional[Callable[[], None]] = None):
+        # Опциональная зависимость: нужна только при заданном SHARED_STATE_URL
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._prefix = prefix
+        self._on_resync = on_resync
+        self._callbacks: Dict[str, List[Callable[[bytes], None]]] = {}
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+
+    def _key(self, key: str) -> str:
+        return f"{self._prefix}{key}"
+
+    async def ping(self) -> None:
+        """Проверка соединения при запуске"""
+        await self._redis.ping()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self._redis.get(self._key(key))
+
+    async def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        await self._redis.set(self._key(key), value, px=int(ttl * 1000) if ttl else None)
+
+    async def delete(self, key: str) -> None:
+        await self._redis.delete(self._key(key))
+
+    async def incr(self, key: str, amount: int, ttl: float) -> int:
+        key = self._key(key)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.incrby(key, amount)
+            pipe.pexpire(key, int(ttl * 1000))
+            value, _ = await pipe.execute()
+        return int(value)
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await self._redis.publish(self._key(channel), message)
+
+    async def subscribe(self, channel: str, callback: Callable[[bytes], None]) -> None:
+        channel = self._key(channel)
+        is_new = channel not in self._callbacks
+        self._callbacks.setdefault(channel, []).append(callback)
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+        elif is_new and self._pubsub is not None:
+            await self._pubsub.subscribe(channel)
+
+    async def _listen(self) -> None:
+        """Получение сообщений подписанных каналов (с переподключением)"""
+        reconnect = False
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(*self._callbacks)
+                self._pubsub = pubsub
+                if reconnect and self._on_resync:
+                    self._on_resync()
+                reconnect = False
+                async for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    channel = message['channel']
+                    if isinstance(channel, bytes):
+                        channel = channel.decode()
+                    for callback in self._callbacks.get(channel, ()):
+                        try:
+                            callback(message['data'])
+                        except Exception as e:
+                            logger.warning(f"Shared state message handler failed ({channel}): {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Shared state subscription lost: {e}")
+                reconnect = True
+                await asyncio.sleep(1)
+            finally:
+                self._pubsub = None
+                await pubsub.aclose()
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        await self._redis.aclose()
+
+
+# === Состояние процесса и широковещательные сообщения ===
+
+_state: SharedState = MemorySharedState()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+# Обработчики сообщений других процессов: {channel: [handler(data)]}
+_handlers: Dict[str, List[Callable[[Any], Any]]] = {}
+# Вызываются, если сообщения могли быть потеряны (разрыв подписки)
+_resync_handlers: List[Callable[[], None]] = []
+# Исходящие сообщения отправляются одной задачей - в порядке отправки
+_outbox: Optional[asyncio.Queue] = None
+_publisher: Optional[asyncio.Task] = None
+_handler_tasks = set()
+
+
+def get_shared_state() -> SharedState:
+    """Текущее общее состояние (до init_shared_state - в памяти процесса)"""
+    return _state
+
+
+def on_broadcast(channel: str, handler: Callable[[Any], Any]) -> None:
+    """
+    Обработчик сообщений канала от других процессов
+
+    Регистрируется при импорте модуля (до init_shared_state). Обработчик
+    получает данные сообщения; корутина запускается отдельной задачей.
+    """
+    _handlers.setdefault(channel, []).append(handler)
+
+
+def add_resync_handler(handler: Callable[[], None]) -> None:
+    """Обработчик возможной потери сообщений (локальные кэши нужно сбросить)"""
+    _resync_handlers.append(handler)
+
+
+def broadcast(channel: str, data: Any) -> None:
+    """
+    Отправка сообщения остальным процессам без ожидания
+
+    Можно вызывать из потоков executor. С состоянием в памяти процесса
+    (других процессов нет) ничего не делает.
+    """
+    if not _state.shared or _outbox is None:
+        return
+    message = json.dumps({'origin': PROCESS_ID, 'data': data}, default=str).encode()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is _loop:
+        _outbox.put_nowait((channel, message))
+    else:
+        _loop.call_soon_threadsafe(_outbox.put_nowait, (channel, message))
+
+
+async def _publish_loop() -> None:
+    while True:
+        channel, message = await _outbox.get()
+        try:
+            await _state.publish(channel, message)
+            _messages.inc(channel=channel, direction='sent')
+        except Exception as e:
+            _messages.inc(channel=channel, direction='failed')
+            logger.warning(f"Broadcast to {channel} failed: {e}")
+        finally:
+            _outbox.task_done()
+
+
+def _deliver(channel: str, raw: bytes) -> None:
+    """Разбор сообщения и вызов обработчиков (свои сообщения пропускаются)"""
+    message = json.loads(raw)
+    if message.get('origin') == PROCESS_ID:
+        return
+    _messages.inc(channel=channel, direction='received')
+    for handler in _handlers.get(channel, ()):
+        result = handler(message.get('data'))
+        if asyncio.iscoroutine(result):
+            task = asyncio.ensure_future(result)
+            _handler_tasks.add(task)
+            task.add_done_callback(_handler_tasks.discard)
+
+
+def _resync() -> None:
+    logger.warning("Shared state resubscribed - dropping local caches")
+    for handler in _resync_handlers:
+        handler()
+
+
+async def init_shared_state(url: str = SHARED_STATE_URL, prefix: str = SHARED_STATE_PREFIX) -> SharedState:
+    """
+    Подключение общего состояния при запуске
+
+    Без url состояние остается в памяти процесса (один процесс приложения).
+
+    Args:
+        url: URL сервера Redis (redis://host:6379/0)
+        prefix: Префикс ключей и каналов
+    """
+    global _state, _loop, _outbox, _publisher
+    if not url:
+        return _state
+
+    state = RedisSharedState(url, prefix, on_resync=_resync)
+    await state.ping()
+    _state = state
+    _loop = asyncio.get_running_loop()
+    _outbox = asyncio.Queue()
+    _publisher = asyncio.create_task(_publish_loop())
+    for channel in _handlers:
+        await state.subscribe(channel, lambda raw, channel=channel: _deliver(channel, raw))
+    logger.info(f"Shared state: Redis, {len(_handlers)} broadcast channels")
+    return _state
+
+
+async def close_shared_state(timeout: float = 5) -> None:
+    """Отправка оставшихся сообщений и закрытие соединений"""
+    global _state, _outbox, _publisher
+    if _publisher is not None:
+        try:
+            await asyncio.wait_for(_outbox.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"{_outbox.qsize()} broadcast messages not sent on shutdown")
+        _publisher.cancel()
+        try:
+            await _publisher
+        except asyncio.CancelledError:
+            pass
+        _publisher = None
+        _outbox = None
+    await _state.close()
+    _state = MemorySharedState()
@@ -93,3 +93,24 @@ def msk_date_range_utc(target_date: date) -> tuple[datetime, datetime]:
     
     return start_utc, end_utc
 
+
+def msk_period_range_utc(date_from: date, date_to: date) -> tuple[datetime, datetime]:
+    """
+    Полуоткрытый диапазон [начало date_from, начало дня после date_to) в MSK,
+    конвертированный в UTC
+    
+    Условие timestamp >= start AND timestamp < end использует индекс по
+    timestamp (в отличие от DATE(timestamp) BETWEEN ...) и не теряет записи
+    последней микросекунды дня.
+    
+    Args:
+        date_from: Первый день периода (MSK)
+        date_to: Последний день периода включительно (MSK)
+        
+    Returns:
+        Кортеж (начало_периода_utc, конец_периода_utc_не_включая)
+    """
+    start_msk = datetime.combine(date_from, datetime.min.time()).replace(tzinfo=MSK)
+    end_msk = datetime.combine(date_to + timedelta(days=1), datetime.min.time()).replace(tzinfo=MSK)
+    
+    return start_msk.astimezone(timezone.utc), end_msk.astimezone(timezone.utc)
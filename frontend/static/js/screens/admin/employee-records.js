@@ -150,7 +150,12 @@ function renderEmployeeRecords(user, records, date) {
         
         const recordType = record.record_type === 'arrival' ? 'Пришел' : 'Ушел';
         const time = formatTime(record.timestamp);
-        const addressText = address ? formatAddress(address) : 'Адрес не указан';
+        // Адрес определяется в фоне после отметки - до этого показываем координаты
+        const addressText = address
+            ? formatAddress(address)
+            : (record.latitude != null && record.longitude != null
+                ? `Координаты: ${Number(record.latitude).toFixed(6)}, ${Number(record.longitude).toFixed(6)}`
+                : 'Адрес не указан');
         
         const showLine = index < sortedRecords.length - 1;
         
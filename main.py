@@ -1,4 +1,6 @@
 """Главный файл бота"""
+import asyncio
+import contextlib
 import logging
 from aiohttp import web
 from telegram import Update
@@ -14,7 +16,11 @@ from bot.config import (
     TELEGRAM_BOT_TOKEN,
     WEBHOOK_URL,
     WEBHOOK_PATH,
-    WEBHOOK_PORT
+    WEBHOOK_PORT,
+    DB_HEALTH_CHECK_INTERVAL,
+    PARTITION_MAINTENANCE_INTERVAL,
+    GEOCODE_QUEUE_INTERVAL,
+    CACHE_SNAPSHOT_INTERVAL
 )
 from bot.handlers.start_handler import start_handler
 from bot.handlers.upload_excel_handler import (
@@ -26,7 +32,15 @@ from bot.handlers.upload_excel_handler import (
 )
 from bot.api.routes import setup_routes
 from bot.api.middleware import setup_middlewares
-from bot.utils.database import init_connection_pool, close_connection_pool, auto_migrate
+from bot.utils.database import init_connection_pool, close_connection_pool_async, auto_migrate, pool_health_check_loop
+from bot.utils.partitions import maintain_record_partitions, partition_maintenance_loop
+from bot.services.address_index import address_index
+from bot.services.yandex_maps import warm_geocode_cache
+from bot.services.geocode_worker import geocode_worker_loop
+from bot.services.today_board import today_board, today_board_rollover_loop
+from bot.utils.http_client import init_http_session, close_http_session
+from bot.utils.cache_snapshot import restore_cache_snapshot, save_cache_snapshot, cache_snapshot_loop
+from bot.utils.shared_state import init_shared_state, close_shared_state
 
 # Настройка логирования
 logging.basicConfig(
@@ -150,6 +164,58 @@ async def on_startup(app: web.Application):
     logger.info("Running database migrations...")
     auto_migrate()
     
+    # Фоновая проверка простаивающих соединений пула
+    # (вместо SELECT 1 при каждом получении соединения)
+    app['db_health_check_task'] = asyncio.create_task(
+        pool_health_check_loop(DB_HEALTH_CHECK_INTERVAL)
+    )
+    
+    # Месячные партиции records: создаем будущие и применяем политику хранения
+    # при запуске, дальше - периодически в фоне
+    try:
+        maintain_record_partitions()
+    except Exception as e:
+        logger.error(f"Record partition maintenance failed: {e}")
+    app['partition_maintenance_task'] = asyncio.create_task(
+        partition_maintenance_loop(PARTITION_MAINTENANCE_INTERVAL)
+    )
+    
+    # Общее состояние процессов (Redis, если задан SHARED_STATE_URL):
+    # rate limiting, состояние диалогов бота, рассылка инвалидаций кэшей
+    await init_shared_state()
+    
+    # Общая HTTP-сессия для внешних API (геокодер)
+    await init_http_session()
+    
+    # In-memory индекс адресов для отметок без геокодирования
+    try:
+        address_index.load()
+    except Exception as e:
+        logger.error(f"Address index load failed: {e}")
+    
+    # Снимок кэшей предыдущего процесса: первые запросы после деплоя не идут
+    # мимо кэша (восстановленные ответы перепроверяются при первом чтении)
+    restore_cache_snapshot()
+    app['cache_snapshot_task'] = asyncio.create_task(cache_snapshot_loop(CACHE_SNAPSHOT_INTERVAL))
+    
+    # Кэш геокодирования из БД - без всплеска запросов к API после перезапуска
+    try:
+        warm_geocode_cache()
+    except Exception as e:
+        logger.error(f"Geocode cache warm-up failed: {e}")
+    
+    # In-memory доска текущего дня для дашборда; на новый день - в полночь MSK
+    try:
+        await today_board.reload()
+    except Exception as e:
+        logger.error(f"Today board load failed: {e}")
+    app['today_board_task'] = asyncio.create_task(today_board_rollover_loop())
+    
+    # Фоновое геокодирование записей, созданных без адреса
+    app['geocode_worker_task'] = asyncio.create_task(
+        geocode_worker_loop(GEOCODE_QUEUE_INTERVAL)
+    )
+    
     # Создаем и настраиваем приложение бота
     application = await setup_application()
     await application.initialize()
@@ -183,9 +249,29 @@ async def on_shutdown(app: web.Application):
     await application.stop()
     await application.shutdown()
     
+    # Останавливаем фоновые задачи
+    for task_name in (
+        'cache_snapshot_task', 'geocode_worker_task', 'today_board_task',
+        'db_health_check_task', 'partition_maintenance_task'
+    ):
+        task = app.get(task_name)
+        if task:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+    
+    # Снимок кэшей для следующего процесса (после остановки фоновых задач)
+    await save_cache_snapshot()
+    
+    # Досылаем инвалидации остальным процессам и закрываем соединение
+    await close_shared_state()
+    
+    # Закрываем HTTP-сессию внешних API
+    await close_http_session()
+    
     # Закрываем пул соединений
     logger.info("Closing database connection pool...")
-    close_connection_pool()
+    await close_connection_pool_async()
     
     logger.info("✓ Application shutdown complete")
 
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Заполнение дневной сводки посещаемости (daily_attendance) по истории записей
+
+Сводка пересчитывается помесячно, повторный запуск безопасен (строки
+перезаписываются). Миграция 009 заполняет историю при создании таблицы;
+скрипт нужен для повторного пересчета периода (например, записей, созданных
+предыдущей версией во время выкладки). Новые записи обновляют сводку сами
+при создании/изменении.
+
+Использование:
+    python scripts/backfill_daily_attendance.py                          # вся история
+    python scripts/backfill_daily_attendance.py 2025-10-01 2025-10-31    # период (MSK)
+"""
+import sys
+from datetime import datetime, date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bot.models.daily_attendance import DailyAttendance, attendance_day
+from bot.utils.database import (
+    init_connection_pool, close_connection_pool,
+    get_db_connection, get_db_cursor, qualified_table_name
+)
+from bot.utils.timezone import today_msk, msk_period_range_utc
+
+
+def get_first_record_date() -> date:
+    """Дата (MSK) самой ранней записи или сегодня, если записей нет"""
+    with get_db_connection() as conn:
+        with get_db_cursor(conn) as cursor:
+            cursor.execute(f"SELECT MIN(timestamp) AS first FROM {qualified_table_name('records')}")
+            result = cursor.fetchone()
+            return attendance_day(result['first']) if result and result['first'] else today_msk()
+
+
+def month_chunks(date_from: date, date_to: date):
+    """Разбиение периода на отрезки по календарным месяцам"""
+    current = date_from
+    while current <= date_to:
+        if current.month == 12:
+            next_month = date(current.year + 1, 1, 1)
+        else:
+            next_month = date(current.year, current.month + 1, 1)
+        chunk_end = min(date_to, date.fromordinal(next_month.toordinal() - 1))
+        yield current, chunk_end
+        current = next_month
+
+
+def main():
+    """Основная функция"""
+    init_connection_pool()
+    
+    try:
+        if len(sys.argv) >= 3:
+            try:
+                date_from = datetime.strptime(sys.argv[1], '%Y-%m-%d').date()
+                date_to = datetime.strptime(sys.argv[2], '%Y-%m-%d').date()
+            except ValueError:
+                print("Неверный формат даты. Используйте YYYY-MM-DD")
+                print("Пример: python backfill_daily_attendance.py 2025-10-01 2025-10-31")
+                return
+        else:
+            date_from = get_first_record_date()
+            date_to = today_msk()
+        
+        print(f"Заполнение сводки за период: {date_from} — {date_to}")
+        
+        total = 0
+        for chunk_from, chunk_to in month_chunks(date_from, date_to):
+            start_utc, end_utc = msk_period_range_utc(chunk_from, chunk_to)
+            rows = DailyAttendance.backfill(start_utc, end_utc)
+            total += rows
+            print(f"  {chunk_from} — {chunk_to}: {rows} строк")
+        
+        print(f"✓ Готово, всего строк сводки: {total}")
+    
+    finally:
+        close_connection_pool()
+
+
+if __name__ == '__main__':
+    main()
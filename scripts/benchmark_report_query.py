@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк запроса отчета о дисциплине при росте истории
+
+Отчет читает дневную сводку (DailyAttendance.get_by_period), в которой
+одна строка на сотрудника за день: она растет вместе с таблицей записей.
+Скрипт создает отдельную схему report_bench с таблицами users и
+daily_attendance как в миграциях, наполняет сводку синтетической историей
+ступенями (по умолчанию до 3 млн строк) и на каждой ступени замеряет
+месячный отчет тем же методом модели, что использует генератор отчетов.
+
+Время отчета должно оставаться примерно постоянным: запрос читает только
+строки отчетного периода по индексу, независимо от глубины истории.
+
+Использование:
+    python scripts/benchmark_report_query.py
+    python scripts/benchmark_report_query.py --steps 100000 1000000 5000000 --keep
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+BENCH_SCHEMA = 'report_bench'
+# Модели строят имена таблиц по DB_SCHEMA при импорте - направляем их в схему бенчмарка
+os.environ['DB_SCHEMA'] = BENCH_SCHEMA
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bot.models.daily_attendance import DailyAttendance
+from bot.utils.database import init_connection_pool, close_connection_pool, get_autocommit_cursor
+
+USERS_COUNT = 1000
+REPORT_FROM = date(2025, 10, 1)
+REPORT_TO = date(2025, 10, 31)
+
+
+def create_schema(cursor):
+    """Создание схемы и таблиц с индексами как в миграциях"""
+    cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+    cursor.execute(f"""
+        CREATE TABLE {BENCH_SCHEMA}.users (
+            id SERIAL PRIMARY KEY,
+            telegram_id BIGINT UNIQUE,
+            name VARCHAR(255) NOT NULL
+        );
+        CREATE TABLE {BENCH_SCHEMA}.daily_attendance (
+            user_id INTEGER NOT NULL REFERENCES {BENCH_SCHEMA}.users(id) ON DELETE CASCADE,
+            day DATE NOT NULL,
+            arrival_record_id INTEGER,
+            arrival_at TIMESTAMP,
+            arrival_address_id INTEGER,
+            arrival_has_photo BOOLEAN NOT NULL DEFAULT FALSE,
+            departure_record_id INTEGER,
+            departure_at TIMESTAMP,
+            departure_address_id INTEGER,
+            departure_has_photo BOOLEAN NOT NULL DEFAULT FALSE,
+            last_record_type VARCHAR(20),
+            records_count INTEGER NOT NULL DEFAULT 0,
+            photo_count INTEGER NOT NULL DEFAULT 0,
+            comment_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT NOW(),
+            PRIMARY KEY (user_id, day)
+        );
+        CREATE INDEX ON {BENCH_SCHEMA}.daily_attendance(day);
+    """)
+    cursor.execute(
+        f"INSERT INTO {BENCH_SCHEMA}.users (telegram_id, name) "
+        f"SELECT 1000000 + n, 'Сотрудник ' || n FROM generate_series(1, %s) n",
+        (USERS_COUNT,)
+    )
+
+
+def fill_history(cursor, days_from, days_to):
+    """Строки сводки всех сотрудников за дни [REPORT_TO - days_to + 1, REPORT_TO - days_from]"""
+    cursor.execute(f"""
+        INSERT INTO {BENCH_SCHEMA}.daily_attendance (
+            user_id, day, arrival_at, departure_at, last_record_type,
+            records_count, photo_count, comment_count
+        )
+        SELECT
+            u.id, d::date,
+            d + interval '5 hours' + random() * interval '2 hours',
+            d + interval '14 hours' + random() * interval '3 hours',
+            'departure',
+            2 + (random() * 2)::int, (random() * 2)::int, (random() < 0.1)::int
+        FROM {BENCH_SCHEMA}.users u
+        CROSS JOIN generate_series(%s::date, %s::date, interval '1 day') d
+    """, (REPORT_TO - timedelta(days=days_to - 1), REPORT_TO - timedelta(days=days_from)))
+    cursor.execute(f"ANALYZE {BENCH_SCHEMA}.daily_attendance")
+
+
+def measure(runs):
+    """Медиана времени отчета (мс) по runs прогонам после прогрева"""
+    DailyAttendance.get_by_period(REPORT_FROM, REPORT_TO)
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        DailyAttendance.get_by_period(REPORT_FROM, REPORT_TO)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description='Бенчмарк запроса отчета о дисциплине')
+    parser.add_argument('--steps', type=int, nargs='+', default=[100_000, 1_000_000, 3_000_000],
+                        help='Размеры дневной сводки для замеров (по возрастанию)')
+    parser.add_argument('--runs', type=int, default=5, help='Количество прогонов на замер')
+    parser.add_argument('--keep', action='store_true', help='Не удалять схему после замеров')
+    args = parser.parse_args()
+
+    init_connection_pool(minconn=1, maxconn=2)
+    try:
+        with get_autocommit_cursor() as cursor:
+            print(f"Создание схемы {BENCH_SCHEMA}...")
+            create_schema(cursor)
+
+            print(f"\n{'Строк сводки':>14} | {'дней истории':>13} | {'отчет за месяц, мс':>19}")
+            print("-" * 52)
+            days = 0
+            try:
+                for step in sorted(args.steps):
+                    step_days = max(days, -(-step // USERS_COUNT))
+                    if step_days > days:
+                        fill_history(cursor, days, step_days)
+                        days = step_days
+                    report_ms = measure(args.runs)
+                    print(f"{days * USERS_COUNT:>14,} | {days:>13,} | {report_ms:>19.1f}")
+            finally:
+                if not args.keep:
+                    cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+    finally:
+        close_connection_pool()
+
+
+if __name__ == '__main__':
+    main()
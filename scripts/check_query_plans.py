@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Проверка планов горячих запросов по записям
+
+Выполняет EXPLAIN (FORMAT JSON) для запросов, под которые созданы индексы
+миграций 008-011, и проверяет, что планировщик использует ожидаемые индексы.
+Код выхода 1, если хотя бы один запрос не использует свой индекс.
+
+Использование:
+    python scripts/check_query_plans.py              # планы как есть
+    python scripts/check_query_plans.py --no-seqscan # запретить seq scan
+
+На маленьких таблицах (dev/тест) планировщик обоснованно выбирает seq scan,
+поэтому там проверку стоит запускать с --no-seqscan: она подтверждает, что
+индекс применим к запросу.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bot.config import TELEGRAM_ADMIN_IDS
+from bot.models.daily_attendance import _GET_BOARD_BY_DATE
+from bot.models.address import _GET_BY_COORDINATES as _ADDRESS_BY_COORDINATES
+from bot.utils.geo import neighbour_cells
+from bot.utils.database import (
+    init_connection_pool, close_connection_pool,
+    get_db_connection, get_db_cursor, qualified_table_name, get_schema
+)
+from bot.utils.timezone import today_msk, msk_date_range_utc
+
+
+def _index_names(plan):
+    """Имена всех индексов, встречающихся в дереве плана"""
+    names = set()
+    if 'Index Name' in plan:
+        names.add(plan['Index Name'])
+    for child in plan.get('Plans', []):
+        names |= _index_names(child)
+    return names
+
+
+def _index_family(cursor, index_name):
+    """
+    Имя индекса и имена его индексов на партициях
+
+    На партиционированной таблице в плане фигурируют индексы партиций,
+    подключенные к родительскому индексу.
+    """
+    cursor.execute("""
+        SELECT child.relname AS name
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = parent.relnamespace
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE n.nspname = %s AND parent.relname = %s
+    """, (get_schema(), index_name))
+    return {index_name} | {row['name'] for row in cursor.fetchall()}
+
+
+def _explain(cursor, sql, params):
+    """EXPLAIN (FORMAT JSON) запроса, возвращает корневой узел плана"""
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+    plan = cursor.fetchone()['QUERY PLAN']
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+def _explain_prepared(cursor, statement, params):
+    """EXPLAIN для prepared statement (PREPARE выполняется на этом соединении)"""
+    cursor.execute("DEALLOCATE ALL")
+    cursor.execute(statement.prepare_sql)
+    return _explain(cursor, statement.execute_sql, params)
+
+
+def get_checks():
+    """
+    Проверяемые запросы
+
+    Returns:
+        Список (название, функция построения плана, ожидаемый индекс)
+    """
+    start_utc, end_utc = msk_date_range_utc(today_msk())
+    records_table = qualified_table_name('records')
+
+    return [
+        (
+            'Последняя запись пользователя по типу',
+            lambda cursor: _explain(
+                cursor,
+                f"""
+                SELECT * FROM {records_table}
+                WHERE user_id = %s AND record_type = %s
+                AND timestamp >= %s AND timestamp <= %s
+                ORDER BY timestamp DESC
+                LIMIT 1
+                """,
+                (1, 'arrival', start_utc, end_utc)
+            ),
+            'idx_records_user_type_ts'
+        ),
+        (
+            'Дашборд из дневной сводки',
+            lambda cursor: _explain_prepared(
+                cursor,
+                _GET_BOARD_BY_DATE,
+                (today_msk(), list(TELEGRAM_ADMIN_IDS))
+            ),
+            'daily_attendance_pkey'
+        ),
+        (
+            'Адрес по координатам',
+            lambda cursor: _explain_prepared(
+                cursor,
+                _ADDRESS_BY_COORDINATES,
+                (neighbour_cells(55.7585, 37.6140), 55.7585, 0.0001, 37.6140)
+            ),
+            'idx_addresses_geo_cell'
+        ),
+    ]
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description='Проверка использования индексов записей')
+    parser.add_argument('--no-seqscan', action='store_true',
+                        help='Запретить seq scan (для маленьких таблиц)')
+    args = parser.parse_args()
+
+    init_connection_pool(minconn=1, maxconn=1)
+    failed = 0
+    try:
+        with get_db_connection() as conn:
+            with get_db_cursor(conn) as cursor:
+                if args.no_seqscan:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+
+                for title, explain, expected_index in get_checks():
+                    plan = explain(cursor)
+                    used = _index_names(plan)
+                    if used & _index_family(cursor, expected_index):
+                        print(f"✓ {title}: {expected_index}")
+                    else:
+                        failed += 1
+                        print(f"✗ {title}: ожидался {expected_index}, "
+                              f"используются {', '.join(sorted(used)) or 'seq scan'}")
+                        print(json.dumps(plan, indent=2, ensure_ascii=False))
+
+                # Prepared statements этого соединения сброшены
+                cursor.execute("DEALLOCATE ALL")
+                conn.prepared_statements.clear()
+    finally:
+        close_connection_pool()
+
+    if failed:
+        print(f"\nЗапросов без ожидаемого индекса: {failed}")
+        sys.exit(1)
+    print("\nВсе запросы используют ожидаемые индексы")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,7 +9,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from bot.models.user import User
 from bot.config import TELEGRAM_ADMIN_IDS, TELEGRAM_BOT_TOKEN
-from bot.utils.database import get_db_connection, get_db_cursor, set_search_path, qualified_table_name
+from bot.utils.database import get_db_connection, get_db_cursor, qualified_table_name
 
 # Список telegram handles администраторов (для идентификации админов без telegram_id)
 # Handles нормализуются автоматически (регистронезависимо, с/без @)
@@ -61,7 +61,6 @@ def get_user_records_count(user_id: int) -> int:
     """
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             records_table = qualified_table_name('records')
             
             cursor.execute(
@@ -108,7 +107,6 @@ def get_admin_users() -> List[User]:
     
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             users_table = qualified_table_name('users')
             
             # Ищем по telegram_id
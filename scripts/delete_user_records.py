@@ -8,7 +8,8 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from bot.models.user import User
 from bot.models.record import Record
-from bot.utils.database import get_db_connection, get_db_cursor, set_search_path, qualified_table_name
+from bot.models.daily_attendance import DailyAttendance
+from bot.utils.database import get_db_connection, get_db_cursor, qualified_table_name
 
 
 def find_user_by_name(name: str) -> Optional[User]:
@@ -23,7 +24,6 @@ def find_user_by_name(name: str) -> Optional[User]:
     """
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             users_table = qualified_table_name('users')
             
             # Поиск по частичному совпадению имени (регистронезависимый)
@@ -60,7 +60,6 @@ def find_users_by_name(name: str) -> List[User]:
     """
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             users_table = qualified_table_name('users')
             
             # Поиск по частичному совпадению имени (регистронезависимый)
@@ -85,7 +84,6 @@ def get_user_records_count(user_id: int) -> int:
     """
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             records_table = qualified_table_name('records')
             
             cursor.execute(
@@ -108,7 +106,6 @@ def delete_user_records(user_id: int) -> int:
     """
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             records_table = qualified_table_name('records')
             
             # Сначала получаем количество записей для отчета
@@ -127,6 +124,7 @@ def delete_user_records(user_id: int) -> int:
                 f"DELETE FROM {records_table} WHERE user_id = %s",
                 (user_id,)
             )
+            DailyAttendance.delete_by_user(cursor, user_id)
             
             return records_count
 
@@ -140,7 +138,6 @@ def show_user_records_summary(user_id: int) -> None:
     """
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             records_table = qualified_table_name('records')
             
             # Получаем статистику по типам записей
@@ -8,14 +8,13 @@ import os
 # Добавляем корневую директорию проекта в путь
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from bot.utils.database import get_db_connection, get_db_cursor, set_search_path, qualified_table_name
+from bot.utils.database import get_db_connection, get_db_cursor, qualified_table_name
 
 
 def find_duplicates():
     """Найти всех дублирующихся пользователей"""
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             users_table = qualified_table_name('users')
             
             # Ищем дубликаты по telegram_handle
@@ -61,7 +60,6 @@ def get_user_records_count(user_id):
     """Получить количество записей пользователя"""
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             records_table = qualified_table_name('records')
             cursor.execute(
                 f"SELECT COUNT(*) FROM {records_table} WHERE user_id = %s",
@@ -74,7 +72,6 @@ def delete_user(user_id):
     """Удалить пользователя по ID"""
     with get_db_connection() as conn:
         with get_db_cursor(conn) as cursor:
-            set_search_path(cursor)
             users_table = qualified_table_name('users')
             cursor.execute(
                 f"DELETE FROM {users_table} WHERE id = %s",
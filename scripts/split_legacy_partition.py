@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Разбиение records_legacy (история до партиционирования) на месячные партиции
+
+После миграции 010 вся история лежит в одной партиции records_legacy, и
+политика хранения (RECORDS_RETENTION_MONTHS) может отсоединить ее только
+целиком. Скрипт выносит месяцы, начиная с самого раннего, в отдельные
+партиции; последний месяц остается в records_legacy.
+
+Каждый месяц переносится в отдельной транзакции, которая блокирует запись в
+records на время переноса месяца и проверки оставшихся строк records_legacy.
+Запускать в период низкой нагрузки; повторный запуск продолжает с места
+остановки.
+
+Использование:
+    python scripts/split_legacy_partition.py              # все месяцы
+    python scripts/split_legacy_partition.py --months 6   # не больше 6 месяцев
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from bot.utils.database import init_connection_pool, close_connection_pool
+from bot.utils.partitions import split_legacy_partition
+
+
+def main():
+    """Основная функция"""
+    parser = argparse.ArgumentParser(description='Разбиение records_legacy на месячные партиции')
+    parser.add_argument('--months', type=int, default=None, help='Максимум месяцев за запуск')
+    args = parser.parse_args()
+
+    init_connection_pool(minconn=1, maxconn=1)
+    try:
+        created = split_legacy_partition(args.months)
+        for name in created:
+            print(f"  {name}")
+        print(f"✓ Готово, создано партиций: {len(created)}")
+    finally:
+        close_connection_pool()
+
+
+if __name__ == '__main__':
+    main()
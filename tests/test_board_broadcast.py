@@ -0,0 +1,92 @@
+"""Согласованность дашборда сотрудников между процессами через общее состояние"""
+import asyncio
+import importlib.util
+import json
+from datetime import date
+
+from bot.models.daily_attendance import DailyAttendance
+from bot.services import employees_board
+from bot.utils import response_cache, shared_state
+
+# Прошедший день: доска текущего дня его не отслеживает
+DAY = date(2025, 10, 15)
+
+
+def _entry(user_id, arrival_id):
+    return {
+        'user': {'id': user_id, 'name': f'Сотрудник {user_id}'},
+        'arrival_record': {'id': arrival_id, 'address_id': None},
+        'departure_record': None,
+    }
+
+
+def _other_process(monkeypatch):
+    """Второй процесс: отдельная копия модуля со своим кэшем дашборда и подписками"""
+    # Регистрации копии не должны пережить тест
+    monkeypatch.setattr(shared_state, '_handlers', {k: list(v) for k, v in shared_state._handlers.items()})
+    monkeypatch.setattr(response_cache, '_caches', list(response_cache._caches))
+    spec = importlib.util.spec_from_file_location('employees_board_other_process', employees_board.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class _Bus(shared_state.MemorySharedState):
+    """Шина между процессами: сообщение доставляется подписчикам как полученное от другого процесса"""
+
+    shared = True
+
+    async def publish(self, channel, message):
+        data = json.loads(message)
+        data['origin'] = 'writer-process'
+        shared_state._deliver(channel, json.dumps(data).encode())
+
+
+async def _run_with_bus(scenario):
+    """Подключение шины на время сценария (вместо init_shared_state)"""
+    saved = shared_state._state, shared_state._loop, shared_state._outbox, shared_state._publisher
+    shared_state._state = _Bus()
+    shared_state._loop = asyncio.get_running_loop()
+    shared_state._outbox = asyncio.Queue()
+    shared_state._publisher = asyncio.create_task(shared_state._publish_loop())
+    try:
+        await scenario()
+        await shared_state._outbox.join()
+        if shared_state._handler_tasks:
+            await asyncio.gather(*shared_state._handler_tasks)
+    finally:
+        shared_state._publisher.cancel()
+        shared_state._state, shared_state._loop, shared_state._outbox, shared_state._publisher = saved
+
+
+def test_board_entry_reaches_process_that_holds_the_board(monkeypatch):
+    """Запись в процессе без дашборда за день обновляет дашборд, закэшированный в другом процессе"""
+    other = _other_process(monkeypatch)
+    board_loads = []
+    entries = {7: _entry(7, arrival_id=1)}
+
+    async def get_board_by_date(target_date):
+        board_loads.append(target_date)
+        return [dict(entry) for entry in entries.values()]
+
+    async def get_board_entry(user_id, target_date):
+        return entries[user_id]
+
+    monkeypatch.setattr(DailyAttendance, 'get_board_by_date_async', get_board_by_date)
+    monkeypatch.setattr(DailyAttendance, 'get_board_entry_async', get_board_entry)
+
+    async def scenario():
+        # Дашборд за день есть только во втором процессе
+        assert (await other.get_board(DAY))[0]['arrival_record']['id'] == 1
+        assert not employees_board._board_cache.has(DAY)
+
+        # Процесс-писатель меняет запись сотрудника за этот день
+        entries[7] = _entry(7, arrival_id=2)
+        await employees_board.refresh_board_entry(7, DAY)
+
+    asyncio.run(_run_with_bus(scenario))
+
+    board = asyncio.run(other.get_board(DAY))
+    assert board[0]['arrival_record']['id'] == 2
+    # Строка применена из рассылки, без пересборки дашборда
+    assert board_loads == [DAY]